@@ -0,0 +1,3 @@
+"""
+Замеры производительности (не являются тестами и не запускаются pytest)
+"""
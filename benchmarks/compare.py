@@ -0,0 +1,43 @@
+"""
+Сравнение двух файлов с результатами benchmarks.run.
+
+Запуск из корня проекта:
+    python -m benchmarks.compare before.json after.json
+
+Для каждого замера, присутствующего в обоих файлах, печатается количество
+операций в секунду до и после и их отношение (больше 1 - ускорение).
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any
+
+Key = tuple[str, int, str]
+
+
+def read(path: Path) -> dict[Key, float]:
+    """ Операций в секунду по ключу (репозиторий, размер, замер) """
+    report: dict[str, Any] = json.loads(path.read_text(encoding='utf-8'))
+    return {(r['backend'], r['scale'], r['benchmark']): r['ops_per_sec']
+            for r in report['results']}
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('before', type=Path)
+    parser.add_argument('after', type=Path)
+    args = parser.parse_args(argv)
+
+    before, after = read(args.before), read(args.after)
+    print(f'{"backend":10} {"scale":>9} {"benchmark":18} '
+          f'{"before":>12} {"after":>12} {"ratio":>7}')
+    for key in sorted(before.keys() & after.keys()):
+        backend, scale, name = key
+        print(f'{backend:10} {scale:9d} {name:18} {before[key]:12.1f} '
+              f'{after[key]:12.1f} {after[key] / before[key]:7.2f}')
+
+
+if __name__ == '__main__':
+    main()
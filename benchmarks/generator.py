@@ -0,0 +1,146 @@
+"""
+Генератор синтетических данных для замеров производительности.
+
+Все функции принимают объект random.Random, поэтому при одинаковом seed
+данные воспроизводятся полностью.
+- дерево категорий заданной глубины и ширины (в формате create_from_tree);
+- расходы: дни распределены равномерно с повышенной частотой в выходные,
+  время - преимущественно днем и вечером, суммы - логнормально,
+  категории - по закону Ципфа (несколько категорий встречаются часто);
+- бюджеты на день, неделю и месяц, общие и для отдельных категорий.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from typing import Any, Iterator
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+
+COMMENTS = ['обед', 'такси', 'продукты', 'подарок', 'кафе', 'аптека', 'кино']
+HOURS = list(range(24))
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 12, 10, 9, 10, 14, 12, 9, 9, 10,
+                14, 18, 18, 14, 9, 5, 2]
+
+
+@dataclass
+class Scale:
+    """
+    Размер набора данных.
+    expenses - количество расходов
+    depth, fanout - глубина и ширина дерева категорий
+    budgets - количество бюджетов
+    start, end - диапазон дат расходов
+    """
+    expenses: int
+    depth: int = 3
+    fanout: int = 5
+    budgets: int = 0
+    start: date = date(2020, 1, 1)
+    end: date = date(2023, 12, 31)
+
+    def __post_init__(self) -> None:
+        if not self.budgets:
+            self.budgets = max(self.expenses // 100, 3)
+
+
+@dataclass
+class Ledger:
+    """ Репозитории, заполненные синтетическими данными """
+    exp_repo: AbstractRepository[Expense]
+    cat_repo: AbstractRepository[Category]
+    bud_repo: AbstractRepository[Budget]
+    categories: list[int] = field(default_factory=list)
+    expenses: list[int] = field(default_factory=list)
+
+
+def category_tree(depth: int, fanout: int) -> list[tuple[str, str | None]]:
+    """
+    Дерево категорий: fanout категорий верхнего уровня, у каждой
+    категории, кроме листьев, fanout подкатегорий, всего depth уровней.
+    """
+    tree: list[tuple[str, str | None]] = []
+    level: list[str | None] = [None]
+    for depth_level in range(depth):
+        next_level: list[str | None] = []
+        for parent in level:
+            for i in range(fanout):
+                name = f'{parent or "c"}.{i}' if depth_level else f'c{i}'
+                tree.append((name, parent))
+                next_level.append(name)
+        level = next_level
+    return tree
+
+
+def expenses(rnd: random.Random, n: int, categories: list[int],
+             start: date, end: date) -> Iterator[Expense]:
+    """ n случайных расходов в диапазоне дат [start, end] """
+    days = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        days.append((day, 3 if day.weekday() >= 5 else 2))
+    day_weights = list(accumulate(w for _, w in days))
+    cat_weights = list(accumulate(1 / (rank + 1) for rank in range(len(categories))))
+    hour_weights = list(accumulate(HOUR_WEIGHTS))
+    for _ in range(n):
+        day = rnd.choices(days, cum_weights=day_weights)[0][0]
+        moment = datetime(day.year, day.month, day.day,
+                          rnd.choices(HOURS, cum_weights=hour_weights)[0],
+                          rnd.randrange(60), rnd.randrange(60))
+        comment = ''
+        if rnd.random() < 0.3:
+            comment = f'{rnd.choice(COMMENTS)} {rnd.randrange(1000)}'
+        yield Expense(int(rnd.lognormvariate(6, 1.2)) + 1,
+                      rnd.choices(categories, cum_weights=cat_weights)[0],
+                      expense_date=moment,
+                      added_date=moment + timedelta(seconds=rnd.randrange(3600)),
+                      comment=comment)
+
+
+def budgets(rnd: random.Random, n: int, categories: list[int],
+            start: date, end: date) -> Iterator[Budget]:
+    """
+    n случайных бюджетов, начинающихся в диапазоне дат [start, end],
+    примерно десятая часть - общие (категория 0).
+    """
+    span = (end - start).days + 1
+    for _ in range(n):
+        length = rnd.choice([1, 7, 30])
+        day = start + timedelta(days=rnd.randrange(span))
+        if length == 7:
+            day -= timedelta(days=day.weekday())
+        elif length == 30:
+            day = day.replace(day=1)
+        category = 0 if rnd.random() < 0.1 else rnd.choice(categories)
+        yield Budget(rnd.randrange(10, 1000) * length * 10, category, length, day)
+
+
+def load(repo: AbstractRepository[Any], objects: Iterator[Any]) -> list[int]:
+    """
+    Загрузить объекты в репозиторий и вернуть список их pk
+    (для SQLiteRepository - одной транзакцией).
+    """
+    return repo.add_many(objects)
+
+
+def populate(ledger: Ledger, scale: Scale, seed: int = 0) -> Ledger:
+    """ Заполнить репозитории данными заданного размера """
+    rnd = random.Random(seed)
+    created: dict[str, int] = {}
+
+    def tree_categories() -> Iterator[Category]:
+        for name, parent in category_tree(scale.depth, scale.fanout):
+            cat = Category(name, created[parent] if parent is not None else None)
+            yield cat
+            created[name] = cat.pk
+
+    ledger.categories = load(ledger.cat_repo, tree_categories())
+    ledger.expenses = load(ledger.exp_repo, expenses(
+        rnd, scale.expenses, ledger.categories, scale.start, scale.end))
+    load(ledger.bud_repo, budgets(
+        rnd, scale.budgets, ledger.categories, scale.start, scale.end))
+    return ledger
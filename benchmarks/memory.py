@@ -0,0 +1,149 @@
+"""
+Замер потребления памяти моделями и репозиториями в оперативной памяти.
+
+Для каждой модели и ее неизменяемого варианта считается объем памяти
+на один объект (по данным tracemalloc), затем в отдельном процессе
+в репозиторий загружаются расходы, категории и бюджеты и замеряется
+прирост RSS процесса.
+
+Запуск из корня проекта:
+    python -m benchmarks.memory --expenses 1000000 --categories 100000 --budgets 10000
+
+Результат печатается в stdout в формате JSON.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+from datetime import date
+from multiprocessing import get_context
+from typing import Any, Callable, Iterator
+
+from benchmarks.generator import budgets, expenses
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+SAMPLE_SIZE = 20000
+START, END = date(2021, 1, 1), date(2023, 12, 31)
+
+
+def rss() -> int:
+    """ Текущий размер резидентной памяти процесса в байтах """
+    try:
+        with open('/proc/self/statm', encoding='ascii') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource  # pylint: disable=import-outside-toplevel
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def make_category(rnd: random.Random, i: int) -> Category:
+    """ Категория со случайным родителем среди ранее созданных """
+    return Category(f'категория {i}', rnd.randrange(1, i) if i > 1 else None)
+
+
+def bytes_per_object(factory: Callable[[int], Any], n: int = SAMPLE_SIZE) -> float:
+    """
+    Средний объем памяти на один объект, созданный factory, без учета
+    списка, в котором хранятся объекты.
+    """
+    gc.collect()
+    tracemalloc.start()
+    objects = [factory(i) for i in range(n)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (current - sys.getsizeof(objects)) / n
+
+
+def bytes_per_row(cls: type, factory: Callable[[int], Any],
+                  n: int = SAMPLE_SIZE) -> float:
+    """ Средний объем памяти на одну запись ColumnarMemoryRepository """
+    gc.collect()
+    tracemalloc.start()
+    repo = ColumnarMemoryRepository[Any](cls)
+    for i in range(n):
+        repo.add(factory(i))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / n
+
+
+def object_sizes(n_categories: int) -> dict[str, float]:
+    """ Объем памяти на объект для всех вариантов моделей """
+    rnd = random.Random(0)
+    categories = list(range(1, n_categories + 1))
+    exp = expenses(rnd, 4 * SAMPLE_SIZE, categories, START, END)
+    bud = budgets(rnd, 2 * SAMPLE_SIZE, categories, START, END)
+    return {
+        'Expense': bytes_per_object(lambda i: next(exp)),
+        'ExpenseRecord': bytes_per_object(lambda i: next(exp).freeze()),
+        'ColumnarMemoryRepository[Expense]': bytes_per_row(Expense, lambda i: next(exp)),
+        'Category': bytes_per_object(lambda i: make_category(rnd, i)),
+        'CategoryRecord': bytes_per_object(lambda i: make_category(rnd, i).freeze()),
+        'Budget': bytes_per_object(lambda i: next(bud)),
+        'BudgetRecord': bytes_per_object(lambda i: next(bud).freeze()),
+    }
+
+
+REPOSITORIES: dict[str, Callable[[type], AbstractRepository[Any]]] = {
+    'memory': lambda cls: MemoryRepository[Any](),
+    'columnar': ColumnarMemoryRepository,
+}
+
+
+def load(kind: str, n_expenses: int, n_categories: int,
+         n_budgets: int) -> dict[str, int]:
+    """
+    Загрузить данные в репозитории заданного типа и вернуть
+    прирост RSS процесса. Вызывается в отдельном процессе.
+    """
+    rnd = random.Random(1)
+    before = rss()
+    repos = {cls: REPOSITORIES[kind](cls) for cls in (Category, Expense, Budget)}
+    categories = list(range(1, n_categories + 1))
+    stream: Iterator[Any]
+    for i in categories:
+        repos[Category].add(make_category(rnd, i))
+    for stream in (expenses(rnd, n_expenses, categories, START, END),
+                   budgets(rnd, n_budgets, categories, START, END)):
+        for obj in stream:
+            repos[type(obj)].add(obj)
+    gc.collect()
+    after = rss()
+    return {'rss_before': before, 'rss_after': after, 'rss_delta': after - before}
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--expenses', type=int, default=1_000_000)
+    parser.add_argument('--categories', type=int, default=100_000)
+    parser.add_argument('--budgets', type=int, default=10_000)
+    parser.add_argument('--repo', choices=list(REPOSITORIES), action='append')
+    args = parser.parse_args(argv)
+
+    result: dict[str, Any] = {
+        'counts': {'expenses': args.expenses, 'categories': args.categories,
+                   'budgets': args.budgets},
+        'bytes_per_object': object_sizes(args.categories),
+        'load': {},
+    }
+    ctx = get_context('spawn')
+    for kind in args.repo or list(REPOSITORIES):
+        with ctx.Pool(1) as pool:
+            result['load'][kind] = pool.apply(
+                load, (kind, args.expenses, args.categories, args.budgets))
+    json.dump(result, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+
+if __name__ == '__main__':
+    main()
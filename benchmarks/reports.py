@@ -0,0 +1,96 @@
+"""
+Замер масштабирования параллельного расчета отчетов (ReportRunner).
+
+Для каждого количества процессов считаются траты по категориям за каждый
+месяц всего диапазона дат и история всех бюджетов, время сравнивается
+с расчетом в одном процессе. База данных берется готовая (--db) или
+заполняется синтетическими данными (см. benchmarks.generator).
+
+Запуск из корня проекта:
+    python -m benchmarks.reports --expenses 1000000 --workers 1 --workers 2 --workers 4
+    python -m benchmarks.reports --db bench.db --workers 1 --workers 8
+
+Результат печатается в stdout в формате JSON.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any
+
+from benchmarks.generator import Scale, populate
+from benchmarks.run import metadata, sqlite_ledger
+from bookkeeper.budgeting.reports import ReportRunner
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, close_connections
+from bookkeeper.utils import as_date
+
+
+def measure(db_file: str, workers: list[int], repeat: int) -> list[dict[str, Any]]:
+    """ Время расчета отчетов для каждого количества процессов """
+    exp_repo = SQLiteRepository[Expense](db_file, Expense)
+    parents = {cat.pk: cat.parent
+               for cat in SQLiteRepository[Category](db_file, Category).get_all()}
+    budgets = SQLiteRepository[Budget](db_file, Budget).get_all()
+    low, high = exp_repo.execute('SELECT MIN(expense_date), MAX(expense_date) '
+                                 'FROM expense')[0]
+    start = as_date(low) or date.today()
+    end = (as_date(high) or start) + timedelta(days=1)
+    results: list[dict[str, Any]] = []
+    for count in workers:
+        runner = ReportRunner(exp_repo, count)
+        timings: dict[str, list[float]] = {'spend_by_month': [], 'budget_history': []}
+        for _ in range(repeat):
+            started = time.perf_counter()
+            runner.spend_by_period(start, end, 'month', parents)
+            timings['spend_by_month'].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            runner.budget_history(budgets, parents)
+            timings['budget_history'].append(time.perf_counter() - started)
+        for report, seconds in timings.items():
+            results.append({'report': report, 'workers': count,
+                            'seconds': min(seconds)})
+        print(f'{count} workers: done', file=sys.stderr)
+    for result in results:
+        base = next(r['seconds'] for r in results
+                    if r['report'] == result['report'] and r['workers'] == workers[0])
+        result['speedup'] = base / result['seconds']
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--db', help='готовая база данных (по умолчанию - новая)')
+    parser.add_argument('--expenses', type=int, default=100_000,
+                        help='количество расходов в новой базе данных')
+    parser.add_argument('--workers', type=int, action='append',
+                        help='количество процессов (можно указать несколько раз)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    workers = args.workers or [1, 2, 4, 8]
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = args.db
+        if db_file is None:
+            populate(sqlite_ledger(Path(directory)), Scale(args.expenses), args.seed)
+            close_connections()
+            db_file = str(Path(directory) / 'bench.db')
+        results = measure(db_file, workers, args.repeat)
+        close_connections()
+    report = {'meta': {**metadata(args), 'cpu_count': os.cpu_count()},
+              'results': results}
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""
+Замеры производительности репозиториев на синтетических данных.
+
+Для каждого типа репозитория и каждого размера набора данных создаются
+и заполняются репозитории (см. benchmarks.generator), затем выполняются
+замеры: add, get, get_all с условием, update, update_many, иерархия
+категорий, расчет бюджетов, траты за периоды, расходы за последний месяц
+и delete. Результаты печатаются в формате JSON и могут
+быть сравнены с предыдущим запуском: python -m benchmarks.compare old new
+
+Запуск из корня проекта:
+    python -m benchmarks.run --backend sqlite --scale 1000 --scale 100000 -o out.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmarks.generator import Ledger, Scale, populate
+from bookkeeper.budgeting.evaluation import BudgetEvaluator, period_start
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import Between
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def memory_ledger(_: Path) -> Ledger:
+    """ Репозитории MemoryRepository """
+    return Ledger(MemoryRepository(), MemoryRepository(), MemoryRepository())
+
+
+def columnar_ledger(_: Path) -> Ledger:
+    """ Репозитории ColumnarMemoryRepository """
+    return Ledger(ColumnarMemoryRepository(Expense), ColumnarMemoryRepository(Category),
+                  ColumnarMemoryRepository(Budget))
+
+
+def sqlite_ledger(directory: Path) -> Ledger:
+    """ Репозитории SQLiteRepository в новом файле базы данных """
+    db_file = str(directory / 'bench.db')
+    repos = [SQLiteRepository[Any](db_file, cls) for cls in (Expense, Category, Budget)]
+    for repo in repos:
+        repo.create_table()
+    return Ledger(*repos)
+
+
+def sqlite_epoch_ledger(directory: Path) -> Ledger:
+    """ Репозитории SQLiteRepository с датами в виде числа секунд """
+    db_file = str(directory / 'bench.db')
+    repos = [SQLiteRepository[Any](db_file, cls, epoch_seconds=True)
+             for cls in (Expense, Category, Budget)]
+    for repo in repos:
+        repo.create_table()
+    return Ledger(*repos)
+
+
+def sqlite_partitioned_ledger(directory: Path) -> Ledger:
+    """ Расходы в помесячных секциях PartitionedSQLiteRepository """
+    ledger = sqlite_epoch_ledger(directory)
+    exp_repo = PartitionedSQLiteRepository[Expense](str(directory / 'bench.db'),
+                                                    Expense, table_name='expense_part',
+                                                    epoch_seconds=True)
+    exp_repo.create_table()
+    ledger.exp_repo = exp_repo
+    return ledger
+
+
+BACKENDS: dict[str, Callable[[Path], Ledger]] = {
+    'memory': memory_ledger,
+    'columnar': columnar_ledger,
+    'sqlite': sqlite_ledger,
+    'sqlite-epoch': sqlite_epoch_ledger,
+    'sqlite-partitioned': sqlite_partitioned_ledger,
+}
+
+
+class Context:
+    """
+    Данные, доступные замерам.
+    ledger - заполненные репозитории
+    ops - количество операций в замерах поштучных операций
+    queries - количество запросов в замерах тяжелых запросов
+    """
+
+    def __init__(self, ledger: Ledger, scale: Scale, ops: int, queries: int) -> None:
+        self.ledger = ledger
+        self.scale = scale
+        self.ops = ops
+        self.queries = queries
+        self.rnd = random.Random(1)
+
+    def sample(self, pks: list[int], n: int) -> list[int]:
+        """ n случайных pk из списка (с повторениями) """
+        return [self.rnd.choice(pks) for _ in range(n)]
+
+
+def bench_add(ctx: Context) -> int:
+    """ Добавление расходов по одному """
+    repo = ctx.ledger.exp_repo
+    for i in range(ctx.ops):
+        repo.add(Expense(i, ctx.ledger.categories[0], comment='bench'))
+    return ctx.ops
+
+
+def bench_get(ctx: Context) -> int:
+    """ Получение расходов по pk """
+    repo = ctx.ledger.exp_repo
+    for pk in ctx.sample(ctx.ledger.expenses, ctx.ops):
+        repo.get(pk)
+    return ctx.ops
+
+
+def bench_get_all_filtered(ctx: Context) -> int:
+    """ Расходы одной категории """
+    repo = ctx.ledger.exp_repo
+    for pk in ctx.sample(ctx.ledger.categories, ctx.queries):
+        repo.get_all({'category': pk})
+    return ctx.queries
+
+
+def bench_update(ctx: Context) -> int:
+    """ Изменение суммы расходов """
+    repo = ctx.ledger.exp_repo
+    objects = [repo.get(pk) for pk in ctx.sample(ctx.ledger.expenses, ctx.ops)]
+    for obj in objects:
+        assert obj is not None
+        obj.amount += 1
+        repo.update(obj)
+    return ctx.ops
+
+
+def bench_update_many(ctx: Context) -> int:
+    """ Изменение суммы расходов одним вызовом update_many """
+    repo = ctx.ledger.exp_repo
+    objects = [repo.get(pk) for pk in ctx.sample(ctx.ledger.expenses, ctx.ops)]
+    for obj in objects:
+        assert obj is not None
+        obj.amount += 1
+    repo.update_many(objects)  # type: ignore[arg-type]
+    return ctx.ops
+
+
+def bench_hierarchy(ctx: Context) -> int:
+    """ Все подкатегории категории верхнего уровня и все родители листа """
+    repo = ctx.ledger.cat_repo
+    top = ctx.ledger.categories[:ctx.scale.fanout]
+    leaves = ctx.ledger.categories[-ctx.scale.fanout ** ctx.scale.depth:]
+    for root_pk, leaf_pk in zip(ctx.sample(top, ctx.queries),
+                                ctx.sample(leaves, ctx.queries)):
+        root, leaf = repo.get(root_pk), repo.get(leaf_pk)
+        assert root is not None and leaf is not None
+        list(root.get_subcategories(repo))
+        list(leaf.get_all_parents(repo))
+    return ctx.queries
+
+
+def bench_budget(ctx: Context) -> int:
+    """ Состояние всех действующих бюджетов на последний день данных """
+    evaluator = BudgetEvaluator(ctx.ledger.exp_repo, ctx.ledger.bud_repo,
+                                ctx.ledger.cat_repo)
+    for _ in range(ctx.queries):
+        evaluator.evaluate(ctx.scale.end)
+    return ctx.queries
+
+
+def bench_period_totals(ctx: Context) -> int:
+    """ Траты за день, неделю и месяц на случайную дату """
+    evaluator = BudgetEvaluator(ctx.ledger.exp_repo, ctx.ledger.bud_repo)
+    span = (ctx.scale.end - ctx.scale.start).days + 1
+    for _ in range(ctx.queries):
+        day = ctx.scale.start + timedelta(days=ctx.rnd.randrange(span))
+        evaluator.totals([period_start(length, day) for length in (1, 7, 30)], day)
+    return ctx.queries
+
+
+def bench_current_month(ctx: Context) -> int:
+    """ Расходы последнего месяца данных (условие Between по дате) """
+    end = ctx.scale.end
+    month = Between(datetime(end.year, end.month, 1), None)
+    for _ in range(ctx.queries):
+        ctx.ledger.exp_repo.get_all({'expense_date': month})
+    return ctx.queries
+
+
+def bench_delete(ctx: Context) -> int:
+    """ Удаление расходов по pk """
+    repo = ctx.ledger.exp_repo
+    pks = ctx.rnd.sample(ctx.ledger.expenses, min(ctx.ops, len(ctx.ledger.expenses)))
+    for pk in pks:
+        repo.delete(pk)
+    return len(pks)
+
+
+BENCHMARKS: dict[str, Callable[[Context], int]] = {
+    'add': bench_add,
+    'get': bench_get,
+    'get_all_filtered': bench_get_all_filtered,
+    'update': bench_update,
+    'update_many': bench_update_many,
+    'hierarchy': bench_hierarchy,
+    'budget': bench_budget,
+    'period_totals': bench_period_totals,
+    'current_month': bench_current_month,
+    'delete': bench_delete,
+}
+
+
+def run(backend: str, scale: Scale, names: list[str], ops: int, queries: int,
+        seed: int) -> list[dict[str, Any]]:
+    """ Выполнить замеры names для одного репозитория и размера данных """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        ledger = populate(BACKENDS[backend](Path(directory)), scale, seed)
+        results.append({'backend': backend, 'scale': scale.expenses,
+                        'benchmark': 'populate', 'ops': scale.expenses,
+                        'seconds': time.perf_counter() - started})
+        ctx = Context(ledger, scale, ops, queries)
+        for name in names:
+            started = time.perf_counter()
+            count = BENCHMARKS[name](ctx)
+            seconds = time.perf_counter() - started
+            results.append({'backend': backend, 'scale': scale.expenses,
+                            'benchmark': name, 'ops': count, 'seconds': seconds})
+    for result in results:
+        result['ops_per_sec'] = result['ops'] / result['seconds']
+    return results
+
+
+def metadata(args: argparse.Namespace) -> dict[str, Any]:
+    """ Описание окружения и параметров запуска """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ''
+    return {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': {key: value for key, value in vars(args).items() if key != 'output'},
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--backend', choices=list(BACKENDS), action='append')
+    parser.add_argument('--scale', type=int, action='append',
+                        help='количество расходов (можно указать несколько раз)')
+    parser.add_argument('--benchmark', choices=list(BENCHMARKS), action='append')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=5)
+    parser.add_argument('--ops', type=int, default=1000,
+                        help='количество поштучных операций в замере')
+    parser.add_argument('--queries', type=int, default=20,
+                        help='количество тяжелых запросов в замере')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', type=Path, help='файл для результатов')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if name in (args.benchmark or BENCHMARKS)]
+    results = []
+    for backend in args.backend or list(BACKENDS):
+        for expenses in args.scale or [1000, 10000]:
+            scale = Scale(expenses, args.depth, args.fanout, end=date(2023, 12, 31))
+            results.extend(run(backend, scale, names, args.ops, args.queries,
+                               args.seed))
+            print(f'{backend} {expenses}: done', file=sys.stderr)
+    report = {'meta': metadata(args), 'results': results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        args.output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
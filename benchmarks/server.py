@@ -0,0 +1,162 @@
+"""
+Нагрузочный тест локального JSON API (bookkeeper.server).
+
+Сервис запускается отдельным процессом на свободном порту. Клиенты
+(--clients) одновременно отправляют запросы по постоянным соединениям
+(keep-alive), каждый ждет ответа перед следующим запросом. Для каждого
+сценария измеряются запросы в секунду и задержки (p50, p99):
+    get - чтение расхода по случайному pk
+    list - страница из 50 расходов случайной категории
+    add - добавление расхода
+База данных берется готовая (--db) или заполняется синтетическими
+данными (см. benchmarks.generator).
+
+Запуск из корня проекта:
+    python -m benchmarks.server --expenses 100000 --clients 1 --clients 16
+
+Результат печатается в stdout в формате JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmarks.generator import Scale, populate
+from benchmarks.run import metadata, sqlite_ledger
+from bookkeeper.repository.sqlite_repository import close_connections
+
+Request = tuple[str, str, Any]
+SCENARIOS: dict[str, Callable[[random.Random, int, int], Request]] = {
+    'get': lambda rng, top, cats: ('GET', f'/expenses/{rng.randint(1, top)}', None),
+    'list': lambda rng, top, cats: (
+        'GET', f'/expenses?category={rng.randint(1, cats)}&limit=50', None),
+    'add': lambda rng, top, cats: (
+        'POST', '/expenses', {'amount': rng.randint(1, 10_000),
+                              'category': rng.randint(1, cats)}),
+}
+
+
+def percentile(values: list[float], share: float) -> float:
+    """ Значение, не меньше которого share всех значений (values упорядочены) """
+    return values[min(int(share * len(values)), len(values) - 1)]
+
+
+async def client(port: int, requests: int, make: Callable[[random.Random], Request],
+                 seed: int) -> list[float]:
+    """ Отправить requests запросов по одному соединению, вернуть задержки """
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    latencies = []
+    for _ in range(requests):
+        method, path, body = make(rng)
+        data = b'' if body is None else json.dumps(body).encode()
+        started = time.perf_counter()
+        writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\n'
+                     f'Content-Length: {len(data)}\r\n\r\n'.encode() + data)
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while (line := await reader.readline()) != b'\r\n':
+            name, _, value = line.decode('latin1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - started)
+        if status >= 500:
+            raise RuntimeError(f'{method} {path}: status {status}')
+    writer.close()
+    return latencies
+
+
+async def run(port: int, scenario: str, clients: int, requests: int,
+              top: int, cats: int) -> dict[str, Any]:
+    """ Запросы сценария от clients клиентов одновременно """
+    def make(rng: random.Random) -> Request:
+        return SCENARIOS[scenario](rng, top, cats)
+
+    started = time.perf_counter()
+    parts = await asyncio.gather(*(client(port, requests, make, seed)
+                                   for seed in range(clients)))
+    seconds = time.perf_counter() - started
+    latencies = sorted(value for part in parts for value in part)
+    return {'scenario': scenario, 'clients': clients, 'requests': len(latencies),
+            'rps': len(latencies) / seconds,
+            'p50_ms': 1000 * percentile(latencies, 0.5),
+            'p99_ms': 1000 * percentile(latencies, 0.99)}
+
+
+def measure(db_file: str, args: argparse.Namespace) -> list[dict[str, Any]]:
+    """ Запустить сервис и выполнить все сценарии для каждого количества клиентов """
+    command = [sys.executable, '-m', 'bookkeeper.server', '--db', db_file, '--port', '0',
+               '--readers', str(args.readers)] + (['--wal'] if args.wal else [])
+    with subprocess.Popen(command, stderr=subprocess.PIPE, text=True) as process:
+        try:
+            assert process.stderr is not None
+            line = process.stderr.readline()
+            found = re.search(r':(\d+)$', line.strip())
+            if found is None:
+                raise RuntimeError(f'server did not start: {line}')
+            port = int(found.group(1))
+            top, cats = args.expenses, args.categories
+            results = []
+            for clients in args.clients or [1, 16]:
+                for scenario in args.scenario or list(SCENARIOS):
+                    result = asyncio.run(run(port, scenario, clients, args.requests,
+                                             top, cats))
+                    print(f'{scenario}, {clients} clients: {result["rps"]:.0f} rps',
+                          file=sys.stderr)
+                    results.append(result)
+            return results
+        finally:
+            process.terminate()
+
+
+def top_pk(db_file: str, table: str) -> int:
+    """ Наибольший pk в таблице (pk идут подряд, если записи не удалялись) """
+    with closing(sqlite3.connect(db_file)) as con:
+        return con.execute(f'SELECT MAX(pk) FROM {table}').fetchone()[0] or 1
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--db', help='готовая база данных (по умолчанию - новая)')
+    parser.add_argument('--expenses', type=int, default=100_000,
+                        help='количество расходов в новой базе данных')
+    parser.add_argument('--clients', type=int, action='append',
+                        help='количество клиентов (можно указать несколько раз)')
+    parser.add_argument('--scenario', choices=list(SCENARIOS), action='append')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='количество запросов от каждого клиента')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--wal', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = args.db
+        if db_file is None:
+            populate(sqlite_ledger(Path(directory)), Scale(args.expenses), args.seed)
+            close_connections()
+            db_file = str(Path(directory) / 'bench.db')
+        args.categories = top_pk(db_file, 'category')
+        args.expenses = top_pk(db_file, 'expense')
+        results = measure(db_file, args)
+    report = {'meta': {**metadata(args), 'cpu_count': os.cpu_count()},
+              'results': results}
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
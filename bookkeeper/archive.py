@@ -0,0 +1,76 @@
+"""
+Перенос старых расходов в архив (см. bookkeeper.repository.archive).
+В базе данных остаются итоги по дням и категориям, бюджеты и траты
+за периоды считаются как прежде. Печатает размер файлов и время
+типовых запросов до и после архивирования.
+
+Запуск из корня проекта:
+    python -m bookkeeper.archive bookkeeper/main_db.db --before 2023-01-01
+"""
+
+import argparse
+import os
+import time
+from datetime import date, datetime
+from typing import Callable
+
+from bookkeeper.budgeting.evaluation import BudgetEvaluator, period_start
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.archive import archive_expenses
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, close_connections
+
+
+def _latency(query: Callable[[], object], repeat: int = 5) -> float:
+    """ Наименьшее время выполнения запроса, мс """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        query()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def measure(db_file: str, today: date) -> dict[str, float]:
+    """ Размер файла базы данных (КиБ) и время типовых запросов (мс) """
+    exp_repo = SQLiteRepository[Expense](db_file, Expense)
+    evaluator = BudgetEvaluator(exp_repo, SQLiteRepository[Budget](db_file, Budget))
+    starts = [period_start(length, today) for length in (1, 7, 30, 365)]
+    result = {
+        'size, KiB': os.path.getsize(db_file) / 1024,
+        'all expenses, ms': _latency(exp_repo.get_all),
+        'period totals, ms': _latency(lambda: evaluator.totals(starts, today)),
+        'budgets, ms': _latency(lambda: evaluator.evaluate(today)),
+    }
+    close_connections()
+    return result
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('database', help='файл базы данных')
+    parser.add_argument('--before', type=date.fromisoformat, required=True,
+                        help='перенести расходы с датой раньше (YYYY-MM-DD)')
+    parser.add_argument('--archive', help='файл архива (по умолчанию '
+                        '<database>.archive)')
+    args = parser.parse_args(argv)
+    archive_file = args.archive or f'{args.database}.archive'
+
+    today = datetime.now().date()
+    before = measure(args.database, today)
+    repo = SQLiteRepository[Expense](args.database, Expense)
+    result = archive_expenses(repo, archive_file, args.before)
+    close_connections()
+    after = measure(args.database, today)
+
+    print(f'{result.rows} expenses archived to {archive_file} '
+          f'({result.months} months, '
+          f'{os.path.getsize(archive_file) / 1024:.1f} KiB), '
+          f'{result.summary_rows} summary rows')
+    for name, value in before.items():
+        print(f'{name:>24}: {value:10.1f} -> {after[name]:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Сравнение трат с ограничениями для всех действующих бюджетов
+
+Траты считаются за текущий период каждого бюджета (день, календарная неделя,
+календарный месяц или скользящее окно из length дней) с учетом подкатегорий:
+бюджет категории ограничивает траты в ней и во всех ее подкатегориях,
+общий бюджет (категория None или 0) - все траты. Все периоды считаются
+за один проход по расходам, для SQLiteRepository - одним запросом
+с группировкой по категориям. Итоги перенесенных в архив расходов
+(см. bookkeeper.repository.archive) учитываются автоматически, повторения
+повторяющихся расходов, для которых расходы еще не созданы, - если задан
+репозиторий правил (см. bookkeeper.budgeting.recurring).
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from itertools import compress, repeat
+from operator import ge
+from typing import NamedTuple, Sequence
+
+from bookkeeper.budgeting.recurring import pending_totals
+from bookkeeper.budgeting.resolver import budget_resolver
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.recurring import RecurringExpense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.archive import summary_table
+from bookkeeper.repository.cache import QueryCache
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import as_date
+
+Totals = dict[int, list[int]]
+
+
+def period_start(length: int, day: date) -> date:
+    """
+    Начало текущего периода бюджета.
+    1 день - сам день, 7 дней - понедельник недели,
+    от 28 до 31 дня - первое число месяца,
+    иначе - скользящее окно из length дней, заканчивающееся днем day.
+    """
+    if length == 7:
+        return day - timedelta(days=day.weekday())
+    if length in (28, 29, 30, 31):
+        return day.replace(day=1)
+    return day - timedelta(days=max(length, 1) - 1)
+
+
+class BudgetStatus(NamedTuple):
+    """
+    Состояние бюджета в текущем периоде.
+    budget - id бюджета
+    category - id категории (0 - общий бюджет)
+    length - срок бюджета в днях
+    start - начало текущего периода
+    limit - ограничение
+    spent - потрачено с начала периода
+    """
+    budget: int
+    category: int
+    length: int
+    start: date
+    limit: int
+    spent: int
+
+    @property
+    def remaining(self) -> int:
+        """ Остаток до ограничения (отрицательный при превышении) """
+        return self.limit - self.spent
+
+    @property
+    def exceeded(self) -> bool:
+        """ Превышено ли ограничение """
+        return self.spent > self.limit
+
+
+def expense_source(repo: SQLiteRepository[Expense], low: date, high: date) -> str:
+    """
+    Источник строк (category, amount, expense_date) для подстановки в FROM
+    запроса по расходам за [low, high): секции таблицы расходов
+    и итоги по дням перенесенных в архив расходов, если они есть.
+    """
+    source = repo.source(low, high)
+    summary = summary_table(repo)
+    if summary is not None:
+        source = (f'(SELECT category, amount, expense_date FROM {source} '
+                  f'UNION ALL SELECT category, amount, expense_date FROM {summary})')
+    return source
+
+
+def _sql_totals(repo: SQLiteRepository[Expense], starts: Sequence[date],
+                end: date) -> Totals:
+    # при хранении дат числом секунд границы периодов - тоже числа
+    bounds = [repo.encode_value('expense_date', s) for s in starts]
+    sums = ', '.join('SUM(CASE WHEN expense_date >= ? THEN amount ELSE 0 END)'
+                     for _ in starts)
+    source = expense_source(repo, min(starts), end)
+    rows = repo.execute(
+        f'SELECT category, {sums} FROM {source} '
+        'WHERE expense_date >= ? AND expense_date < ? GROUP BY category',
+        bounds + [min(bounds), repo.encode_value('expense_date', end)])
+    return {row[0] or 0: list(row[1:]) for row in rows}
+
+
+def _columnar_totals(repo: ColumnarMemoryRepository[Expense],
+                     starts: Sequence[date], end: date) -> Totals:
+    def stamp(day: date) -> int:
+        return int(repo.encode_value('expense_date', datetime.combine(day, time())))
+
+    bounds = sorted(stamp(s) for s in starts)
+    order = sorted(range(len(starts)), key=lambda k: stamp(starts[k]))
+    upper = stamp(end)
+    rows = repo.raw_rows('category', 'amount', 'expense_date')
+    totals: Totals = defaultdict(lambda: [0] * len(starts))
+    # отбор по нижней границе выполняется без цикла на Python
+    first = bounds[0]
+    for category, amount, moment in compress(
+            rows, map(ge, repo.raw_rows('expense_date'), repeat((first,)))):
+        if moment >= upper:
+            continue
+        row = totals[category]
+        for k in order[:bisect_right(bounds, moment)]:
+            row[k] += amount
+    return dict(totals)
+
+
+def _scan_totals(repo: AbstractRepository[Expense], starts: Sequence[date],
+                 end: date) -> Totals:
+    bounds = [s.toordinal() for s in starts]
+    lower, upper = min(bounds), end.toordinal()
+    totals: Totals = defaultdict(lambda: [0] * len(starts))
+    for exp in repo.get_all():
+        day = as_date(exp.expense_date)
+        if day is None:
+            continue
+        ordinal = day.toordinal()
+        if lower <= ordinal < upper:
+            row = totals[exp.category or 0]
+            for k, bound in enumerate(bounds):
+                if ordinal >= bound:
+                    row[k] += exp.amount
+    return dict(totals)
+
+
+def category_totals(exp_repo: AbstractRepository[Expense], starts: Sequence[date],
+                    end: date) -> Totals:
+    """
+    Траты по категориям (без учета подкатегорий) за периоды
+    [starts[k], end) для всех k за один проход по расходам.
+
+    Returns
+    -------
+    Словарь {id категории: [сумма за период k для каждого k]}
+    """
+    if not starts:
+        return {}
+    if isinstance(exp_repo, SQLiteRepository):
+        return _sql_totals(exp_repo, starts, end)
+    if isinstance(exp_repo, ColumnarMemoryRepository):
+        return _columnar_totals(exp_repo, starts, end)
+    return _scan_totals(exp_repo, starts, end)
+
+
+def rollup(totals: Totals, parents: dict[int, int | None], size: int) -> Totals:
+    """
+    Добавить траты каждой категории ко всем ее предкам и к общему итогу
+    (ключ 0).
+
+    Parameters
+    ----------
+    totals - траты по категориям без учета подкатегорий
+    parents - словарь {id категории: id родителя}
+    size - количество периодов
+
+    Returns
+    -------
+    Траты по категориям с учетом подкатегорий
+    """
+    result: Totals = defaultdict(lambda: [0] * size)
+    for category, sums in totals.items():
+        seen = {0}
+        node: int | None = category
+        while node and node not in seen:
+            seen.add(node)
+            row = result[node]
+            for k, value in enumerate(sums):
+                row[k] += value
+            node = parents.get(node)
+        row = result[0]
+        for k, value in enumerate(sums):
+            row[k] += value
+    return dict(result)
+
+
+class BudgetEvaluator:
+    """
+    Расчет состояния всех действующих бюджетов.
+    exp_repo - репозиторий расходов
+    bud_repo - репозиторий бюджетов
+    cat_repo - репозиторий категорий (если не задан,
+    траты в подкатегориях не учитываются)
+    rule_repo - репозиторий правил повторяющихся расходов (если задан,
+    учитываются повторения, для которых расходы еще не созданы)
+    cache - кэш результатов totals (пересчитываются только после
+    изменения расходов, категорий или правил)
+    """
+
+    def __init__(self, exp_repo: AbstractRepository[Expense],
+                 bud_repo: AbstractRepository[Budget],
+                 cat_repo: AbstractRepository[Category] | None = None,
+                 rule_repo: AbstractRepository[RecurringExpense] | None = None,
+                 cache: QueryCache | None = None) -> None:
+        self.exp_repo = exp_repo
+        self.cat_repo = cat_repo
+        self.rule_repo = rule_repo
+        self.cache = cache
+        if cache is not None:
+            cache.watch([exp_repo, cat_repo, rule_repo])
+        self.resolver = budget_resolver(bud_repo)
+        if isinstance(exp_repo, SQLiteRepository):
+            exp_repo.ensure_column_index('expense_date')
+
+    def totals(self, starts: Sequence[date], day: date | None = None) -> Totals:
+        """
+        Траты по категориям с учетом подкатегорий за периоды
+        с starts[k] по day включительно (по умолчанию - по сегодня).
+        Общие траты - под ключом 0.
+        """
+        day = day or date.today()
+        if self.cache is None:
+            return self._totals(starts, day)
+        repos = [repo for repo in (self.exp_repo, self.cat_repo, self.rule_repo)
+                 if repo is not None]
+        return self.cache.get(('totals', tuple(starts), day), repos,
+                              lambda: self._totals(starts, day))
+
+    def _totals(self, starts: Sequence[date], day: date) -> Totals:
+        end = day + timedelta(days=1)
+        totals = category_totals(self.exp_repo, starts, end)
+        if self.rule_repo is not None and starts:
+            for category, sums in pending_totals(self.rule_repo.get_all(),
+                                                 starts, end).items():
+                row = totals.setdefault(category, [0] * len(starts))
+                for k, value in enumerate(sums):
+                    row[k] += value
+        parents: dict[int, int | None] = {}
+        if self.cat_repo is not None:
+            parents = {cat.pk: cat.parent for cat in self.cat_repo.get_all()}
+        return rollup(totals, parents, len(starts))
+
+    def evaluate(self, day: date | None = None,
+                 carry_over: bool = True) -> list[BudgetStatus]:
+        """
+        Состояние всех бюджетов, действующих на дату day
+        (по умолчанию - сегодня). Смысл carry_over - см. BudgetResolver.resolve.
+        """
+        day = day or date.today()
+        budgets = self.resolver.active(day, carry_over)
+        starts = sorted({period_start(b.length, day) for b in budgets})
+        index = {start: k for k, start in enumerate(starts)}
+        totals = self.totals(starts, day)
+        result = []
+        for budget in budgets:
+            start = period_start(budget.length, day)
+            spent = totals.get(budget.category or 0)
+            result.append(BudgetStatus(
+                budget.pk, budget.category or 0, budget.length, start,
+                budget.amount, spent[index[start]] if spent else 0))
+        return result
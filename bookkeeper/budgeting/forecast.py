@@ -0,0 +1,291 @@
+"""
+Прогноз трат до конца текущего периода бюджета
+
+Траты хранятся по дням: для каждой категории - массив array('q'),
+элемент которого - сумма трат за день (номер элемента - номер дня
+от первого дня с тратами). Статистика за скользящее окно (среднее
+и стандартное отклонение трат за день) считается по срезам массивов
+операциями над массивами целиком, без цикла по дням на Python.
+Прогноз на конец периода - траты с начала периода плюс средние траты
+за день, умноженные на количество оставшихся дней.
+
+Новые расходы учитываются инкрементально: refresh читает только
+расходы с pk больше последнего прочитанного, add и remove изменяют
+одну ячейку массива. Для SQLiteRepository изменение или удаление уже
+прочитанных расходов (в том числе удаление категории и архивирование)
+refresh обнаруживает по версии таблицы (см. repository.cache): если
+версия выросла больше, чем на количество новых расходов, все траты
+перечитываются. Для остальных репозиториев такие изменения нужно
+передать через remove и add (или перечитать все - rebuild).
+"""
+
+from array import array
+from datetime import date, timedelta
+from math import sqrt
+from operator import add, mul
+from typing import Iterable, NamedTuple
+
+from bookkeeper.budgeting.evaluation import period_start
+from bookkeeper.budgeting.reports import covers, day_expression, parse_day
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository, Between
+from bookkeeper.repository.archive import summary_table
+from bookkeeper.repository.cache import table_version, track_versions
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import as_date
+
+_EPOCH_DAY = date(1970, 1, 1).toordinal()
+_US_PER_DAY = 86_400_000_000
+
+
+def period_end(length: int, start: date) -> date:
+    """
+    Конец (не включительно) периода бюджета, начинающегося в start
+    (см. evaluation.period_start): для месячных бюджетов - первое число
+    следующего месяца, иначе - start + length дней.
+    """
+    if length in (28, 29, 30, 31):
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=max(length, 1))
+
+
+class SpendStats(NamedTuple):
+    """
+    Траты категории (с учетом подкатегорий) за скользящее окно.
+    category - id категории (0 - все траты)
+    start, end - окно [start, end)
+    total - сумма трат
+    mean - средние траты за день
+    std - стандартное отклонение трат за день
+    """
+    category: int
+    start: date
+    end: date
+    total: int
+    mean: float
+    std: float
+
+    @property
+    def weekly(self) -> float:
+        """ Средние траты за неделю """
+        return 7 * self.mean
+
+
+class BudgetForecast(NamedTuple):
+    """
+    Прогноз трат на конец текущего периода бюджета.
+    budget - id бюджета
+    category - id категории (0 - общий бюджет)
+    start, end - период [start, end)
+    limit - ограничение
+    spent - потрачено с начала периода
+    projected - ожидаемые траты за весь период
+    deviation - стандартное отклонение прогноза
+    """
+    budget: int
+    category: int
+    start: date
+    end: date
+    limit: int
+    spent: int
+    projected: int
+    deviation: float
+
+    @property
+    def exceeded(self) -> bool:
+        """ Ожидается ли превышение ограничения """
+        return self.projected > self.limit
+
+
+class SpendForecaster:
+    """
+    Скользящая статистика трат по категориям и прогноз трат по бюджетам.
+    exp_repo - репозиторий расходов
+    cat_repo - репозиторий категорий (если не задан,
+    траты в подкатегориях не учитываются)
+    window - длина скользящего окна в днях
+    """
+
+    def __init__(self, exp_repo: AbstractRepository[Expense],
+                 cat_repo: AbstractRepository[Category] | None = None,
+                 window: int = 28) -> None:
+        self.exp_repo = exp_repo
+        self.cat_repo = cat_repo
+        self.window = window
+        self.parents: dict[int, int | None] = {}
+        self._daily: dict[int, 'array[int]'] = {}
+        self._origin: int | None = None
+        self._last_pk = 0
+        self._versioned = track_versions(exp_repo)
+        self._version: int | None = None
+
+    def add(self, exp: Expense) -> None:
+        """ Учесть расход """
+        day = as_date(exp.expense_date)
+        if day is not None:
+            self._add(exp.category or 0, day.toordinal(), exp.amount)
+
+    def remove(self, exp: Expense) -> None:
+        """ Перестать учитывать расход (например, перед изменением) """
+        day = as_date(exp.expense_date)
+        if day is not None:
+            self._add(exp.category or 0, day.toordinal(), -exp.amount)
+
+    def _add(self, category: int, ordinal: int, amount: int) -> None:
+        if self._origin is None:
+            self._origin = ordinal
+        elif ordinal < self._origin:
+            shift = bytes(8 * (self._origin - ordinal))
+            for sums in self._daily.values():
+                sums[0:0] = array('q', shift)
+            self._origin = ordinal
+        if category not in self._daily:
+            self._daily[category] = array('q')
+        sums = self._daily[category]
+        index = ordinal - self._origin
+        if index >= len(sums):
+            sums.frombytes(bytes(8 * (index + 1 - len(sums))))
+        sums[index] += amount
+
+    def refresh(self) -> int:
+        """
+        Учесть расходы, добавленные после предыдущего вызова (при первом
+        вызове - все, включая итоги перенесенных в архив), и перечитать
+        категории. Возвращает количество прочитанных расходов.
+        """
+        if self.cat_repo is not None:
+            self.parents = {cat.pk: cat.parent for cat in self.cat_repo.get_all()}
+        if self._changed():
+            self._clear()
+        repo = self.exp_repo
+        if isinstance(repo, SQLiteRepository):
+            return self._refresh_sql(repo)
+        if isinstance(repo, ColumnarMemoryRepository):
+            rows = [row for row in repo.raw_rows('pk', 'category', 'amount',
+                                                 'expense_date')
+                    if row[0] > self._last_pk]
+            for _, category, amount, stamp in rows:
+                self._add(category or 0, stamp // _US_PER_DAY + _EPOCH_DAY, amount)
+            self._last_pk = max((row[0] for row in rows), default=self._last_pk)
+            return len(rows)
+        expenses = repo.get_all({'pk': Between(self._last_pk + 1, None)})
+        for exp in expenses:
+            self.add(exp)
+        self._last_pk = max((exp.pk for exp in expenses), default=self._last_pk)
+        return len(expenses)
+
+    def _refresh_sql(self, repo: SQLiteRepository[Expense]) -> int:
+        """ Траты по дням и категориям новых расходов одним запросом """
+        source = repo.source()
+        top = repo.execute(f'SELECT MAX(pk) FROM {source}')[0][0]
+        if top is None or top <= self._last_pk:
+            return 0
+        day = day_expression(repo)
+        rows = repo.execute(f'SELECT {day}, category, SUM(amount), COUNT(*) '
+                            f'FROM {source} WHERE pk > ? AND pk <= ? GROUP BY 1, 2',
+                            (self._last_pk, top))
+        summary = summary_table(repo)
+        if self._last_pk == 0 and summary is not None:
+            rows += repo.execute(f'SELECT {day}, category, SUM(amount), 0 '
+                                 f'FROM {summary} GROUP BY 1, 2')
+        for value, category, amount, _ in rows:
+            self._add(category or 0, parse_day(value).toordinal(), amount)
+        self._last_pk = top
+        return sum(row[3] for row in rows)
+
+    def _changed(self) -> bool:
+        """
+        Изменены или удалены ли прочитанные расходы: версия таблицы
+        выросла больше, чем на количество расходов с pk больше последнего
+        прочитанного (каждое добавление увеличивает версию на 1)
+        """
+        repo = self.exp_repo
+        if not self._versioned or not isinstance(repo, SQLiteRepository):
+            return False
+        version, previous = table_version(repo), self._version
+        self._version = version
+        if previous is None or self._last_pk == 0:
+            return False
+        added = repo.execute(f'SELECT COUNT(*) FROM {repo.table_name} WHERE pk > ?',
+                             (self._last_pk,))[0][0]
+        return bool(version - previous != added)
+
+    def _clear(self) -> None:
+        self._daily.clear()
+        self._origin = None
+        self._last_pk = 0
+
+    def rebuild(self) -> int:
+        """ Перечитать все расходы """
+        self._clear()
+        return self.refresh()
+
+    def _categories(self, category: int) -> list[int]:
+        """ Категория и все ее подкатегории, по которым есть траты """
+        return [node for node in self._daily
+                if covers(category, node, self.parents)]
+
+    def daily(self, category: int, start: date, end: date) -> 'array[int]':
+        """
+        Траты категории (с учетом подкатегорий, 0 - все траты) за каждый
+        день интервала [start, end)
+        """
+        size = max((end - start).days, 0)
+        result = array('q', bytes(8 * size))
+        if self._origin is None:
+            return result
+        low = start.toordinal() - self._origin
+        for node in self._categories(category):
+            sums = self._daily[node]
+            first, last = max(low, 0), min(low + size, len(sums))
+            if first >= last:
+                continue
+            offset = first - low
+            part = result[offset:offset + last - first]
+            result[offset:offset + last - first] = array(
+                'q', map(add, part, sums[first:last]))
+        return result
+
+    def stats(self, category: int, day: date | None = None) -> SpendStats:
+        """
+        Траты категории (с учетом подкатегорий, 0 - все траты)
+        за window дней, заканчивая днем day включительно (по умолчанию - сегодня)
+        """
+        day = day or date.today()
+        end = day + timedelta(days=1)
+        start = end - timedelta(days=self.window)
+        sums = self.daily(category, start, end)
+        total = sum(sums)
+        mean = total / self.window
+        variance = sum(map(mul, sums, sums)) / self.window - mean * mean
+        return SpendStats(category, start, end, total, mean, sqrt(max(variance, 0.0)))
+
+    def project(self, category: int, length: int,
+                day: date | None = None) -> BudgetForecast:
+        """
+        Прогноз трат категории (с учетом подкатегорий, 0 - все траты)
+        на конец текущего периода бюджета длиной length дней
+        (поля budget и limit результата равны 0)
+        """
+        day = day or date.today()
+        start = period_start(length, day)
+        end = period_end(length, start)
+        spent = sum(self.daily(category, start, day + timedelta(days=1)))
+        remaining = max((end - day).days - 1, 0)
+        stats = self.stats(category, day)
+        return BudgetForecast(0, category, start, end, 0, spent,
+                              spent + round(stats.mean * remaining),
+                              stats.std * sqrt(remaining))
+
+    def forecast(self, budgets: Iterable[Budget],
+                 day: date | None = None) -> list[BudgetForecast]:
+        """
+        Прогноз трат на конец текущего (на дату day, по умолчанию - сегодня)
+        периода каждого бюджета
+        """
+        return [self.project(budget.category or 0, budget.length, day)._replace(
+                    budget=budget.pk, limit=budget.amount)
+                for budget in budgets]
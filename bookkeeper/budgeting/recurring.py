@@ -0,0 +1,194 @@
+"""
+Повторяющиеся расходы: расчет дат повторений, создание расходов
+и учет еще не созданных повторений в итогах
+
+Правило (RecurringExpense) хранится одной записью. Расходы по нему
+создаются лениво: RecurringScheduler.materialize добавляет расходы
+для повторений раньше заданной даты пакетами и запоминает эту дату
+в правиле. Повторения после нее в итоги за период добавляются
+аналитически (pending_totals): количество повторений в интервале
+считается за O(1), без создания расходов.
+"""
+
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, Sequence
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.recurring import RecurringExpense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, shared_connection
+from bookkeeper.utils import as_datetime
+
+
+def _months(rule: RecurringExpense) -> int:
+    """ Шаг правила в месяцах (0 - шаг в днях) """
+    if rule.unit == 'month':
+        return rule.every
+    if rule.unit == 'year':
+        return 12 * rule.every
+    return 0
+
+
+def _start(rule: RecurringExpense) -> datetime:
+    start = as_datetime(rule.start_date)
+    assert start is not None
+    return start
+
+
+def occurrence(rule: RecurringExpense, k: int) -> datetime:
+    """ Дата и время повторения номер k (0 - первое повторение) """
+    start = _start(rule)
+    months = _months(rule)
+    if not months:
+        days = rule.every * (7 if rule.unit == 'week' else 1)
+        return start + timedelta(days=k * days)
+    total = start.month - 1 + k * months
+    year, month = start.year + total // 12, total % 12 + 1
+    return start.replace(year=year, month=month,
+                         day=min(start.day, monthrange(year, month)[1]))
+
+
+def first_index(rule: RecurringExpense, moment: datetime) -> int:
+    """ Номер первого повторения не раньше moment (без учета end_date) """
+    start = _start(rule)
+    if moment <= start:
+        return 0
+    months = _months(rule)
+    if not months:
+        step = timedelta(days=rule.every * (7 if rule.unit == 'week' else 1))
+        return -((start - moment) // step)
+    # повторение k приходится на месяц не позже месяца moment, k + 1 - позже
+    k = ((moment.year - start.year) * 12 + moment.month - start.month) // months
+    return k + 1 if occurrence(rule, k) < moment else k
+
+
+def _upper(rule: RecurringExpense, high: datetime) -> datetime:
+    end = as_datetime(rule.end_date)
+    return high if end is None else min(high, end)
+
+
+def count_between(rule: RecurringExpense, low: datetime, high: datetime) -> int:
+    """ Количество повторений в интервале [low, high) """
+    high = _upper(rule, high)
+    if low >= high:
+        return 0
+    return max(first_index(rule, high) - first_index(rule, low), 0)
+
+
+def occurrences(rule: RecurringExpense, low: datetime,
+                high: datetime) -> Iterator[datetime]:
+    """ Даты и время повторений в интервале [low, high) """
+    high = _upper(rule, high)
+    if low < high:
+        for k in range(first_index(rule, low), first_index(rule, high)):
+            yield occurrence(rule, k)
+
+
+def _midnight(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+def _pending_low(rule: RecurringExpense, low: datetime) -> datetime:
+    done = as_datetime(rule.materialized)
+    return low if done is None else max(low, done)
+
+
+def pending_amount(rules: Iterable[RecurringExpense], low: date, high: date) -> int:
+    """
+    Сумма повторений всех правил за [low, high), для которых расходы
+    еще не созданы (не раньше materialized)
+    """
+    start, end = _midnight(low), _midnight(high)
+    return sum(rule.amount * count_between(rule, _pending_low(rule, start), end)
+               for rule in rules)
+
+
+def pending_totals(rules: Iterable[RecurringExpense], starts: Sequence[date],
+                   end: date) -> dict[int, list[int]]:
+    """
+    Траты по категориям за периоды [starts[k], end) по повторениям,
+    для которых расходы еще не созданы (не раньше materialized).
+    Формат результата совпадает с evaluation.category_totals.
+    """
+    totals: dict[int, list[int]] = defaultdict(lambda: [0] * len(starts))
+    high = _midnight(end)
+    for rule in rules:
+        row = [rule.amount * count_between(rule, _pending_low(rule, _midnight(start)),
+                                           high) for start in starts]
+        if any(row):
+            sums = totals[rule.category or 0]
+            for k, value in enumerate(row):
+                sums[k] += value
+    return dict(totals)
+
+
+class RecurringScheduler:
+    """
+    Создание расходов по правилам повторяющихся расходов.
+    rule_repo - репозиторий правил
+    exp_repo - репозиторий расходов
+    batch_size - примерное количество расходов, добавляемых за одну
+    транзакцию (повторения одного правила не делятся между транзакциями)
+    """
+
+    def __init__(self, rule_repo: AbstractRepository[RecurringExpense],
+                 exp_repo: AbstractRepository[Expense],
+                 batch_size: int = 10_000) -> None:
+        self.rule_repo = rule_repo
+        self.exp_repo = exp_repo
+        self.batch_size = batch_size
+
+    def materialize(self, horizon: datetime | None = None) -> int:
+        """
+        Создать расходы для всех повторений раньше horizon (по умолчанию -
+        текущий момент), для которых они еще не созданы, и отметить это
+        в правилах. Возвращает количество созданных расходов.
+        """
+        # даты в sqlite могут храниться с точностью до секунды
+        horizon = (horizon or datetime.now()).replace(microsecond=0)
+        expenses: list[Expense] = []
+        rules: list[RecurringExpense] = []
+        count = 0
+        for rule in self.rule_repo.get_all():
+            low = as_datetime(rule.materialized) or _start(rule)
+            high = _upper(rule, horizon)
+            if low >= high:
+                continue
+            expenses.extend(Expense(rule.amount, rule.category, moment,
+                                    comment=rule.comment)
+                            for moment in occurrences(rule, low, high))
+            rule.materialized = high
+            rules.append(rule)
+            if len(expenses) >= self.batch_size:
+                count += self._write(expenses, rules)
+                expenses, rules = [], []
+        if rules:
+            count += self._write(expenses, rules)
+        return count
+
+    def _write(self, expenses: list[Expense], rules: list[RecurringExpense]) -> int:
+        """
+        Добавить расходы и сохранить отметки в правилах. В одном файле
+        sqlite - одной транзакцией, чтобы сбой не привел к повторному
+        созданию тех же расходов.
+        """
+        exp_repo, rule_repo = self.exp_repo, self.rule_repo
+        if (isinstance(exp_repo, SQLiteRepository)
+                and isinstance(rule_repo, SQLiteRepository)
+                and exp_repo.db_file == rule_repo.db_file):
+            # pylint: disable=protected-access
+            with shared_connection(exp_repo.db_file) as con:
+                for exp in expenses:
+                    exp_repo._add(con, exp)
+                for rule in rules:
+                    rule_repo._update(con, rule)
+        else:
+            exp_repo.add_many(expenses)
+            rule_repo.update_many(rules)
+        return len(expenses)
+
+    def pending_totals(self, starts: Sequence[date], end: date) -> dict[int, list[int]]:
+        """ Траты по еще не созданным повторениям всех правил (см. pending_totals) """
+        return pending_totals(self.rule_repo.get_all(), starts, end)
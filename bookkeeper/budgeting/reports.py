@@ -0,0 +1,238 @@
+"""
+Отчеты за длительные периоды: траты по категориям за месяцы или годы
+и история бюджетов
+
+Интервал дат отчета делится на части, траты по дням и категориям для
+каждой части считаются в отдельном процессе (ProcessPoolExecutor), который
+открывает базу данных sqlite только для чтения. Результаты частей
+объединяются, траты в подкатегориях добавляются к родительским
+категориям (см. rollup) уже после объединения.
+"""
+
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Iterable, NamedTuple
+
+from bookkeeper.budgeting.evaluation import Totals, expense_source, rollup
+from bookkeeper.budgeting.recurring import pending_amount
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.recurring import RecurringExpense
+from bookkeeper.repository.cache import QueryCache
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import as_date
+
+_EPOCH = date(1970, 1, 1)
+PERIODS = ('day', 'month', 'year')
+
+DailyTotals = dict[tuple[date, int], int]
+
+
+class BudgetPeriod(NamedTuple):
+    """
+    Траты за один период бюджета.
+    budget - id бюджета
+    category - id категории (0 - общий бюджет)
+    start, end - период [start, end)
+    limit - ограничение
+    spent - потрачено за период
+    """
+    budget: int
+    category: int
+    start: date
+    end: date
+    limit: int
+    spent: int
+
+
+def date_chunks(start: date, end: date, parts: int) -> list[tuple[date, date]]:
+    """ Разбить интервал [start, end) на parts частей почти равной длины в днях """
+    days = (end - start).days
+    if days <= 0:
+        return []
+    parts = max(1, min(parts, days))
+    bounds = [start + timedelta(days=days * k // parts) for k in range(parts + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def period_key(day: date, period: str) -> date:
+    """ Начало периода ('day', 'month' или 'year'), содержащего day """
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'year':
+        return day.replace(month=1, day=1)
+    if period == 'day':
+        return day
+    raise ValueError(f'unknown period {period!r}, expected one of {PERIODS}')
+
+
+def day_expression(repo: SQLiteRepository[Expense]) -> str:
+    """
+    Выражение SQL для дня расхода: номер дня от начала эпохи (даты
+    хранятся числом секунд) или строка 'YYYY-MM-DD' (см. parse_day)
+    """
+    if repo.epoch_seconds:
+        return 'expense_date / 86400'
+    return 'substr(expense_date, 1, 10)'
+
+
+def parse_day(value: int | str) -> date:
+    """ День из значения выражения day_expression """
+    if isinstance(value, int):
+        return _EPOCH + timedelta(days=value)
+    return date.fromisoformat(value)
+
+
+def _chunk_totals(db_file: str, sql: str, params: list[Any]) -> list[tuple[Any, ...]]:
+    """ Траты по дням и категориям части интервала (в процессе-исполнителе) """
+    con = sqlite3.connect(f'{Path(db_file).resolve().as_uri()}?mode=ro', uri=True)
+    try:
+        return con.execute(sql, params).fetchall()
+    finally:
+        con.close()
+
+
+def covers(category: int, node: int, parents: dict[int, int | None]) -> bool:
+    """ Относятся ли траты категории node к бюджету категории category """
+    seen = set()
+    while category and node and node not in seen:
+        if node == category:
+            return True
+        seen.add(node)
+        node = parents.get(node) or 0
+    return not category
+
+
+class ReportRunner:
+    """
+    Расчет отчетов по расходам параллельно в нескольких процессах.
+    exp_repo - репозиторий расходов sqlite (обычный или секционированный)
+    workers - количество процессов (по умолчанию - количество ядер;
+    1 - расчет в текущем процессе)
+    chunks_per_worker - на сколько частей на процесс делится интервал,
+    чтобы процессы были загружены равномерно
+    cache - кэш трат по дням (пересчитываются только после изменения расходов)
+    """
+
+    def __init__(self, exp_repo: SQLiteRepository[Expense], workers: int | None = None,
+                 chunks_per_worker: int = 4, cache: QueryCache | None = None) -> None:
+        self.exp_repo = exp_repo
+        self.workers = workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+        self.cache = cache
+        if cache is not None:
+            cache.watch([exp_repo])
+        exp_repo.ensure_column_index('expense_date')
+
+    def _query(self, low: date, high: date) -> tuple[str, list[Any]]:
+        repo = self.exp_repo
+        day = day_expression(repo)
+        params = [repo.encode_value('expense_date', bound) for bound in (low, high)]
+        sql = (f'SELECT {day}, category, SUM(amount) FROM '
+               f'{expense_source(repo, low, high)} '
+               'WHERE expense_date >= ? AND expense_date < ? GROUP BY 1, 2')
+        return sql, [p if isinstance(p, int) else str(p) for p in params]
+
+    def daily_totals(self, start: date, end: date) -> DailyTotals:
+        """
+        Траты по категориям (без учета подкатегорий) за каждый день
+        интервала [start, end). Расходы без категории - под ключом 0.
+
+        Returns
+        -------
+        Словарь {(день, id категории): сумма}
+        """
+        if self.cache is not None:
+            return self.cache.get(('daily_totals', start, end), [self.exp_repo],
+                                  lambda: self._daily_totals(start, end))
+        return self._daily_totals(start, end)
+
+    def _daily_totals(self, start: date, end: date) -> DailyTotals:
+        chunks = date_chunks(start, end, self.workers * self.chunks_per_worker)
+        queries = [self._query(low, high) for low, high in chunks]
+        db_files = [self.exp_repo.db_file] * len(queries)
+        sqls = [sql for sql, _ in queries]
+        params = [p for _, p in queries]
+        if self.workers == 1 or len(queries) < 2:
+            parts = map(_chunk_totals, db_files, sqls, params)
+            return self._merge(parts)
+        with ProcessPoolExecutor(min(self.workers, len(queries))) as pool:
+            return self._merge(pool.map(_chunk_totals, db_files, sqls, params))
+
+    def _merge(self, parts: Iterable[list[tuple[Any, ...]]]) -> DailyTotals:
+        totals: DailyTotals = {}
+        for rows in parts:
+            for day, category, amount in rows:
+                key = parse_day(day), category or 0
+                totals[key] = totals.get(key, 0) + amount
+        return totals
+
+    def spend_by_period(self, start: date, end: date, period: str = 'month',
+                        parents: dict[int, int | None] | None = None
+                        ) -> dict[date, dict[int, int]]:
+        """
+        Траты по категориям с учетом подкатегорий за каждый период
+        ('day', 'month' или 'year') интервала [start, end).
+        parents - словарь {id категории: id родителя} (если не задан,
+        подкатегории не учитываются). Общие траты - под ключом 0.
+
+        Returns
+        -------
+        Словарь {начало периода: {id категории: сумма}}
+        """
+        grouped: dict[date, Totals] = {}
+        for (day, category), amount in self.daily_totals(start, end).items():
+            row = grouped.setdefault(period_key(day, period), {}).setdefault(
+                category, [0])
+            row[0] += amount
+        return {key: {category: sums[0]
+                      for category, sums in rollup(totals, parents or {}, 1).items()}
+                for key, totals in sorted(grouped.items())}
+
+    def budget_history(self, budgets: Iterable[Budget],
+                       parents: dict[int, int | None] | None = None,
+                       rules: Iterable[RecurringExpense] = ()) -> list[BudgetPeriod]:
+        """
+        Траты за все периоды бюджетов: каждый бюджет делится на периоды
+        по length дней от start_date до end_date. Траты считаются с учетом
+        подкатегорий (если задан parents), как в BudgetEvaluator.
+        rules - правила повторяющихся расходов: их еще не созданные
+        повторения добавляются к тратам (прогноз бюджета на будущие периоды)
+        """
+        ranges = []
+        for budget in budgets:
+            start, end = as_date(budget.start_date), as_date(budget.end_date)
+            if start is not None and end is not None and start < end:
+                ranges.append((budget, start, end))
+        if not ranges:
+            return []
+        first = min(start for _, start, _ in ranges)
+        last = max(end for _, _, end in ranges)
+        size = (last - first).days
+        daily: Totals = {}
+        for (day, category), amount in self.daily_totals(first, last).items():
+            daily.setdefault(category, [0] * size)[(day - first).days] += amount
+        # суммы с начала интервала: траты за [a, b) - cumulative[b] - cumulative[a]
+        cumulative = {category: list(accumulate(sums, initial=0))
+                      for category, sums in rollup(daily, parents or {}, size).items()}
+        zeros = [0] * (size + 1)
+        rules = list(rules)
+        result = []
+        for budget, start, end in ranges:
+            category = budget.category or 0
+            sums = cumulative.get(category, zeros)
+            covered = [rule for rule in rules
+                       if covers(category, rule.category or 0, parents or {})]
+            low = start
+            while low < end:
+                high = min(low + timedelta(days=max(budget.length, 1)), end)
+                spent = sums[(high - first).days] - sums[(low - first).days]
+                spent += pending_amount(covered, low, high)
+                result.append(BudgetPeriod(budget.pk, category, low, high,
+                                           budget.amount, spent))
+                low = high
+        return result
@@ -0,0 +1,173 @@
+"""
+Поиск ограничения бюджета, действующего для категории на заданную дату
+
+Бюджеты группируются по ключу (категория, срок). Внутри группы более поздний
+бюджет (по start_date, при равенстве - по pk) заменяет все более ранние:
+на дату D действует бюджет с наибольшим start_date <= D, если его срок
+(end_date) еще не истек. Бюджеты с category, равной None или 0, относятся
+ко всем расходам.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, timedelta
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import as_date
+
+Key = tuple[int, int]
+
+
+def budget_key(budget: Budget) -> Key:
+    """ Ключ группы бюджета: (категория, срок в днях) """
+    return budget.category or 0, budget.length
+
+
+def is_expired(budget: Budget, day: date) -> bool:
+    """ Истек ли срок бюджета к дате day """
+    end = as_date(budget.end_date)
+    return end is not None and end <= day
+
+
+class BudgetResolver:
+    """
+    Индекс бюджетов в оперативной памяти. Для каждой группы хранит
+    отсортированный по дате начала список бюджетов, поиск выполняется
+    двоичным поиском за O(log n).
+
+    Индекс строится при создании по всем бюджетам репозитория,
+    новые бюджеты нужно добавлять методом add или перестроить
+    индекс методом refresh.
+    """
+
+    def __init__(self, repo: AbstractRepository[Budget]) -> None:
+        self.repo = repo
+        self._starts: dict[Key, list[tuple[int, int]]] = {}
+        self._budgets: dict[Key, list[Budget]] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """ Перестроить индекс по данным репозитория """
+        groups: dict[Key, list[Budget]] = defaultdict(list)
+        for budget in self.repo.get_all():
+            groups[budget_key(budget)].append(budget)
+        self._starts = {}
+        self._budgets = {}
+        for key, budgets in groups.items():
+            budgets.sort(key=self._position)
+            self._starts[key] = [self._position(b) for b in budgets]
+            self._budgets[key] = budgets
+
+    @staticmethod
+    def _position(budget: Budget) -> tuple[int, int]:
+        start = as_date(budget.start_date)
+        return (start.toordinal() if start is not None else 0), budget.pk
+
+    def add(self, budget: Budget) -> None:
+        """ Добавить в индекс бюджет, уже сохраненный в репозитории """
+        key = budget_key(budget)
+        position = self._position(budget)
+        starts = self._starts.setdefault(key, [])
+        i = bisect_left(starts, position)
+        starts.insert(i, position)
+        self._budgets.setdefault(key, []).insert(i, budget)
+
+    def resolve(self, category: int | None, length: int,
+                day: date | None = None, carry_over: bool = False) -> Budget | None:
+        """
+        Найти бюджет, действующий для категории на дату.
+
+        Parameters
+        ----------
+        category - id категории (None или 0 - общий бюджет)
+        length - срок бюджета в днях
+        day - дата (по умолчанию - сегодня)
+        carry_over - если True, последний установленный бюджет продолжает
+        действовать и после окончания своего срока
+
+        Returns
+        -------
+        Объект Budget или None, если ограничение не установлено
+        """
+        day = day or date.today()
+        key = (category or 0, length)
+        starts = self._starts.get(key)
+        if not starts:
+            return None
+        i = bisect_left(starts, (day.toordinal() + 1, 0)) - 1
+        if i < 0:
+            return None
+        budget = self._budgets[key][i]
+        if not carry_over and is_expired(budget, day):
+            return None
+        return budget
+
+    def active(self, day: date | None = None, carry_over: bool = False) -> list[Budget]:
+        """ Бюджеты всех групп, действующие на дату (см. resolve) """
+        day = day or date.today()
+        result = []
+        for category, length in self._starts:
+            budget = self.resolve(category, length, day, carry_over)
+            if budget is not None:
+                result.append(budget)
+        return result
+
+
+class SQLiteBudgetResolver(BudgetResolver):
+    """
+    Поиск действующих бюджетов запросами к sqlite. Создает индекс
+    по (категория, срок, start_date), поэтому запрос resolve выполняется
+    за O(log n) без загрузки бюджетов в память и всегда видит
+    актуальные данные.
+    """
+    repo: SQLiteRepository[Budget]
+
+    INDEX = 'IFNULL(category, 0), length, IFNULL(start_date, \'\')'
+
+    def __init__(self, repo: SQLiteRepository[Budget]) -> None:
+        super().__init__(repo)
+        repo.ensure_index(f'{repo.table_name}_period_idx', self.INDEX)
+
+    def refresh(self) -> None:
+        pass
+
+    def add(self, budget: Budget) -> None:
+        pass
+
+    def resolve(self, category: int | None, length: int,
+                day: date | None = None, carry_over: bool = False) -> Budget | None:
+        day = day or date.today()
+        found = self.repo.query(
+            f'SELECT * FROM {self.repo.table_name} '
+            'WHERE IFNULL(category, 0) = ? AND length = ? '
+            'AND IFNULL(start_date, \'\') < ? '
+            'ORDER BY IFNULL(start_date, \'\') DESC, pk DESC LIMIT 1',
+            (category or 0, length, (day + timedelta(days=1)).isoformat()))
+        if not found or (not carry_over and is_expired(found[0], day)):
+            return None
+        return found[0]
+
+    def active(self, day: date | None = None, carry_over: bool = False) -> list[Budget]:
+        day = day or date.today()
+        columns = ', '.join(self.repo.columns)
+        budgets = self.repo.query(
+            f'SELECT {columns} FROM (SELECT *, ROW_NUMBER() OVER ('
+            'PARTITION BY IFNULL(category, 0), length '
+            'ORDER BY IFNULL(start_date, \'\') DESC, pk DESC) AS position '
+            f'FROM {self.repo.table_name} WHERE IFNULL(start_date, \'\') < ?) '
+            'WHERE position = 1',
+            ((day + timedelta(days=1)).isoformat(),))
+        return [b for b in budgets if carry_over or not is_expired(b, day)]
+
+
+def budget_resolver(repo: AbstractRepository[Budget]) -> BudgetResolver:
+    """
+    Создать объект для поиска бюджетов, подходящий для репозитория:
+    для SQLiteRepository - выполняющий запросы к базе данных,
+    для остальных - индекс в оперативной памяти.
+    """
+    if isinstance(repo, SQLiteRepository):
+        return SQLiteBudgetResolver(repo)
+    return BudgetResolver(repo)
@@ -0,0 +1,51 @@
+"""
+Перенос расходов, категорий и бюджетов между базой данных и каталогом
+файлов столбцов .npy (см. bookkeeper.repository.column_files).
+Для каждой модели создается подкаталог (expense, category, budget).
+
+Запуск из корня проекта:
+    python -m bookkeeper.column_files export bookkeeper/main_db.db ledger
+    python -m bookkeeper.column_files import ledger copy.db
+"""
+
+import argparse
+import os
+import time
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.column_files import export_table, import_table
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, close_connections
+
+MODELS = (Category, Expense, Budget)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='записать базу данных в каталог')
+    export.add_argument('database', help='файл базы данных')
+    export.add_argument('directory', help='каталог для файлов столбцов')
+    load = commands.add_parser('import', help='загрузить каталог в базу данных')
+    load.add_argument('directory', help='каталог с файлами столбцов')
+    load.add_argument('database', help='файл базы данных (таблицы должны быть пустыми)')
+    args = parser.parse_args(argv)
+
+    for cls in MODELS:
+        repo = SQLiteRepository[cls](args.database, cls)  # type: ignore[valid-type]
+        directory = os.path.join(args.directory, cls.__name__.lower())
+        started = time.perf_counter()
+        if args.command == 'export':
+            count = export_table(repo, cls, directory)
+        else:
+            repo.create_table()
+            count = import_table(directory, repo, cls)
+        print(f'{cls.__name__.lower()}: {count} rows in '
+              f'{time.perf_counter() - started:.2f} s')
+    close_connections()
+
+
+if __name__ == '__main__':
+    main()
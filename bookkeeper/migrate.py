@@ -0,0 +1,32 @@
+"""
+Перевод базы данных приложения на хранение дат расходов целым числом
+секунд от начала эпохи (см. SQLiteRepository.migrate_to_epoch).
+После миграции репозитории определяют формат по типу столбцов
+автоматически, преобразование дат при чтении и записи прозрачно.
+
+Запуск из корня проекта:
+    python -m bookkeeper.migrate bookkeeper/main_db.db
+"""
+
+import argparse
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('database', help='файл базы данных')
+    args = parser.parse_args(argv)
+
+    repo = SQLiteRepository[Expense](args.database, Expense)
+    if repo.epoch_seconds:
+        print(f'{args.database}: dates are already stored as epoch seconds')
+        return
+    count = repo.migrate_to_epoch()
+    print(f'{args.database}: {count} expenses migrated')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,22 +2,75 @@
 Класс ограничения бюджета
 """
 
-from dataclasses import dataclass
-from datetime import datetime, timedelta, date
+from dataclasses import dataclass, field
+from datetime import date, timedelta
 
+from ..utils import as_date
 
-@dataclass
+
+def week_start() -> date:
+    """ Дата понедельника текущей недели """
+    today = date.today()
+    return today - timedelta(days=today.weekday())
+
+
+@dataclass(slots=True, weakref_slot=True)
 class Budget:
     """
 .   Установка ограниченного бюджета на определенный срок
     amount - сумма ограничения
     category - id категории расходов
     length - срок в днях
+    start_date - начало срока (по умолчанию - понедельник текущей недели)
+    end_date - конец срока (по умолчанию - start_date + length дней)
     pk - id записи в базе данных
     """
     amount: int
     category: int = 0
     length: int = 7
-    start_date: date = date.today() - timedelta(days=datetime.weekday(date.today()))
-    end_date: date = start_date + timedelta(days=length)
+    start_date: date = field(default_factory=week_start)
+    end_date: date | None = None
+    pk: int = 0
+
+    def __post_init__(self) -> None:
+        if self.end_date is None and isinstance(self.start_date, date):
+            self.end_date = self.start_date + timedelta(days=self.length)
+
+    def freeze(self) -> 'BudgetRecord':
+        """ Получить неизменяемую копию объекта (даты могут быть строками ISO) """
+        start_date, end_date = as_date(self.start_date), as_date(self.end_date)
+        return BudgetRecord(
+            self.amount, self.category, self.length,
+            start_date.toordinal() if start_date is not None else None,
+            end_date.toordinal() if end_date is not None else None,
+            self.pk)
+
+
+@dataclass(slots=True, frozen=True)
+class BudgetRecord:
+    """
+    Неизменяемое представление бюджета для результатов запросов только
+    на чтение. Даты хранятся порядковыми номерами дней (date.toordinal)
+    и преобразуются в date при обращении к start_date и end_date.
+    """
+    amount: int
+    category: int = 0
+    length: int = 7
+    start_day: int | None = None
+    end_day: int | None = None
     pk: int = 0
+
+    @property
+    def start_date(self) -> date | None:
+        """ Начало срока """
+        return date.fromordinal(self.start_day) if self.start_day is not None else None
+
+    @property
+    def end_date(self) -> date | None:
+        """ Конец срока """
+        return date.fromordinal(self.end_day) if self.end_day is not None else None
+
+    def thaw(self) -> Budget:
+        """ Получить изменяемую копию объекта """
+        return Budget(self.amount, self.category, self.length,
+                      self.start_date, self.end_date, self.pk)  # type: ignore[arg-type]
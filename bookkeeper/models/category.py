@@ -8,7 +8,7 @@ from typing import Iterator
 from ..repository.abstract_repository import AbstractRepository
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Category:
     """
     Категория расходов, хранит название в атрибуте name и ссылку (id) на
@@ -19,6 +19,10 @@ class Category:
     parent: int | None = None
     pk: int = 0
 
+    def freeze(self) -> 'CategoryRecord':
+        """ Получить неизменяемую копию объекта """
+        return CategoryRecord(self.name, self.parent, self.pk)
+
     def get_parent(self,
                    repo: AbstractRepository['Category']) -> 'Category | None':
         """
@@ -116,3 +120,18 @@ class Category:
             repo.add(cat)
             created[child] = cat
         return list(created.values())
+
+
+@dataclass(slots=True, frozen=True)
+class CategoryRecord:
+    """
+    Неизменяемое представление категории для результатов запросов
+    только на чтение.
+    """
+    name: str
+    parent: int | None = None
+    pk: int = 0
+
+    def thaw(self) -> Category:
+        """ Получить изменяемую копию объекта """
+        return Category(self.name, self.parent, self.pk)
@@ -5,8 +5,10 @@
 from dataclasses import dataclass, field
 from datetime import datetime
 
+from ..utils import as_datetime, from_timestamp, to_timestamp
 
-@dataclass(slots=True)
+
+@dataclass(slots=True, weakref_slot=True)
 class Expense:
     """
     Расходная операция.
@@ -23,3 +25,45 @@ class Expense:
     added_date: datetime = field(default_factory=datetime.now)
     comment: str = ''
     pk: int = 0
+
+    def freeze(self) -> 'ExpenseRecord':
+        """
+        Получить неизменяемую копию объекта. Даты могут быть строками ISO
+        (так их возвращает SQLiteRepository с датами в виде текста).
+        """
+        expense_date = as_datetime(self.expense_date)
+        added_date = as_datetime(self.added_date)
+        assert expense_date is not None and added_date is not None
+        return ExpenseRecord(self.amount, self.category, to_timestamp(expense_date),
+                             to_timestamp(added_date), self.comment, self.pk)
+
+
+@dataclass(slots=True, frozen=True)
+class ExpenseRecord:
+    """
+    Неизменяемое представление расходной операции для результатов запросов
+    только на чтение. Даты хранятся целым числом микросекунд от начала эпохи
+    (см. bookkeeper.utils.to_timestamp) и преобразуются в datetime
+    при обращении к expense_date и added_date.
+    """
+    amount: int
+    category: int
+    expense_ts: int
+    added_ts: int
+    comment: str = ''
+    pk: int = 0
+
+    @property
+    def expense_date(self) -> datetime:
+        """ Дата расхода """
+        return from_timestamp(self.expense_ts)
+
+    @property
+    def added_date(self) -> datetime:
+        """ Дата добавления в бд """
+        return from_timestamp(self.added_ts)
+
+    def thaw(self) -> Expense:
+        """ Получить изменяемую копию объекта """
+        return Expense(self.amount, self.category, self.expense_date,
+                       self.added_date, self.comment, self.pk)
@@ -0,0 +1,41 @@
+"""
+Описан класс, представляющий правило повторяющегося расхода
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+
+UNITS = ('day', 'week', 'month', 'year')
+
+
+@dataclass(slots=True, weakref_slot=True)
+class RecurringExpense:
+    """
+    Правило повторяющегося расхода (аренда, подписка).
+    amount - сумма каждого повторения
+    category - id категории расходов
+    start_date - дата и время первого повторения
+    every - интервал между повторениями в единицах unit
+    unit - единица интервала: 'day', 'week', 'month' или 'year'
+    (при повторении по месяцам день месяца, которого нет в коротком
+    месяце, заменяется последним днем месяца)
+    end_date - повторения не создаются начиная с этой даты (None - бессрочно)
+    comment - комментарий создаваемых расходов
+    materialized - расходы созданы для всех повторений раньше этой даты
+    (None - расходы еще не создавались)
+    pk - id записи в базе данных
+    """
+    amount: int
+    category: int
+    start_date: datetime = field(default_factory=datetime.now)
+    every: int = 1
+    unit: str = 'month'
+    end_date: datetime | None = None
+    comment: str = ''
+    materialized: datetime | None = None
+    pk: int = 0
+
+    def __post_init__(self) -> None:
+        if self.unit not in UNITS:
+            raise ValueError(f'unknown unit {self.unit!r}, expected one of {UNITS}')
+        if self.every < 1:
+            raise ValueError(f'every must be positive, got {self.every}')
@@ -1,35 +1,138 @@
 """
 Файл для соединения всех элементов в одно приложение
 """
+import os
 import sys
-from PySide6 import QtWidgets
+import time
 
-from bookkeeper.view.interface import MainWindow
+from PySide6 import QtCore, QtWidgets
+
+from bookkeeper.budgeting.recurring import RecurringScheduler
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.instrumentation import RepositoryStats, instrument
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.category import Category
 from bookkeeper.models.budget import Budget
+from bookkeeper.models.recurring import RecurringExpense
+
+
+class StartupTimer:
+    """
+    Длительность этапов запуска приложения: каждый вызов mark
+    завершает этап, начавшийся с предыдущего вызова (или создания).
+    """
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """ Завершить этап phase """
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self) -> str:
+        """ Этапы и время от начала запуска, мс """
+        lines = ['startup phase              ms   since start']
+        elapsed = 0.0
+        for phase, seconds in self.phases:
+            elapsed += seconds
+            lines.append(f'{phase:<22} {seconds * 1000:8.1f} {elapsed * 1000:13.1f}')
+        return '\n'.join(lines)
+
+
+class _FirstPaint(QtCore.QObject):
+    """ Отмечает первую отрисовку окна """
+    def __init__(self, timer: StartupTimer) -> None:
+        super().__init__()
+        self.timer = timer
+
+    def eventFilter(self, watched: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if event.type() == QtCore.QEvent.Type.Paint:
+            self.timer.mark('first paint')
+            watched.removeEventFilter(self)
+        return False
 
 
 class Presenter:
     """
     Создание репозиториев для расходов, категорий и бюджетов;
     Создание основного окна приложения.
+    Если задан profile, собирается статистика вызовов репозиториев,
+    вызовы дольше slow_threshold секунд записываются в журнал
+    медленных запросов.
+
+    Окно создается без загрузки всех данных: история расходов
+    показывает первую страницу и догружает остальные после показа
+    окна (см. ExpenseHistory). Перед созданием окна добавляются расходы
+    по наступившим повторениям повторяющихся расходов (см. RecurringScheduler).
+    Этапы запуска записываются в startup.
     """
-    def __init__(self, database: str) -> None:
+    def __init__(self, database: str, profile: bool = False,
+                 slow_threshold: float | None = None,
+                 startup: StartupTimer | None = None) -> None:
+        self.startup = startup or StartupTimer()
         self.database: str = database
         self.exp_repo = SQLiteRepository[Expense](self.database, Expense)
         self.cat_repo = SQLiteRepository[Category](self.database, Category)
         self.bud_repo = SQLiteRepository[Budget](self.database, Budget)
-        self.view: QtWidgets.QMainWindow = MainWindow(self.exp_repo,
-                                                      self.cat_repo,
-                                                      self.bud_repo)
+        self.rule_repo = SQLiteRepository[RecurringExpense](self.database,
+                                                            RecurringExpense)
+        self.profile = profile
+        self.stats: RepositoryStats | None = None
+        if profile:
+            self.stats = RepositoryStats(slow_threshold)
+            for repo in (self.exp_repo, self.cat_repo, self.bud_repo, self.rule_repo):
+                instrument(repo, self.stats)
+        self.startup.mark('repositories')
+        for repo in (self.exp_repo, self.cat_repo, self.bud_repo, self.rule_repo):
+            repo.create_table()
+        RecurringScheduler(self.rule_repo, self.exp_repo).materialize()
+        self.startup.mark('recurring expenses')
+        # модули интерфейса импортируются здесь, чтобы их загрузка
+        # учитывалась отдельным этапом
+        from bookkeeper.view import interface  # pylint: disable=import-outside-toplevel
+        self.startup.mark('view imports')
+        self.view = interface.MainWindow(self.exp_repo, self.cat_repo, self.bud_repo)
+        self.startup.mark('window')
+        self._first_paint = _FirstPaint(self.startup)
+        self.view.installEventFilter(self._first_paint)
+        self.view.expense.exp_hist.loaded.connect(self._expenses_loaded)
+
+    def _expenses_loaded(self, count: int) -> None:
+        if not self.view.expense.exp_hist.prefetch.isActive():
+            self.startup.mark(f'expenses preloaded ({count})')
+            self.view.expense.exp_hist.loaded.disconnect(self._expenses_loaded)
+
+    def report(self) -> None:
+        """
+        Вывести в stderr этапы запуска, статистику кэша трат
+        и статистику вызовов репозиториев, если она собиралась.
+        """
+        if self.profile:
+            print(self.startup.report(), file=sys.stderr)
+            cache = self.view.budget.act_bud.cache.stats()
+            print(f'query cache: {cache.hits} hits, {cache.misses} misses '
+                  f'({cache.hit_ratio:.0%}), {cache.entries} entries, '
+                  f'{cache.size / 1024:.0f} KiB', file=sys.stderr)
+        if self.stats is not None:
+            print(self.stats.report(), file=sys.stderr)
 
 
 if __name__ == '__main__':
+    startup = StartupTimer()
     app = QtWidgets.QApplication(sys.argv)
+    startup.mark('qt application')
 
-    window = Presenter('main_db.db')
+    # BOOKKEEPER_PROFILE=1 - собирать статистику и вывести ее при выходе,
+    # BOOKKEEPER_SLOW_MS=50 - дополнительно журналировать вызовы дольше 50 мс
+    slow_ms = os.environ.get('BOOKKEEPER_SLOW_MS')
+    window = Presenter('main_db.db',
+                       profile=bool(os.environ.get('BOOKKEEPER_PROFILE') or slow_ms),
+                       slow_threshold=float(slow_ms) / 1000 if slow_ms else None,
+                       startup=startup)
+    app.aboutToQuit.connect(window.report)
     window.view.show()
 
     sys.exit(app.exec())
@@ -8,7 +8,7 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from typing import Generic, TypeVar, Protocol, Any, Iterable, NamedTuple
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -21,6 +21,37 @@ class Model(Protocol):  # pylint: disable=too-few-public-methods
 T = TypeVar('T', bound=Model)
 
 
+class Between(NamedTuple):
+    """
+    Условие для get_all: значение поля лежит в полуинтервале [low, high).
+    Граница None - интервал не ограничен с этой стороны. Записи, у которых
+    значение поля None, условию не удовлетворяют.
+    Пример: repo.get_all({'expense_date': Between(datetime(2023, 3, 1), None)})
+    """
+    low: Any = None
+    high: Any = None
+
+    def __contains__(self, value: Any) -> bool:
+        return (value is not None
+                and (self.low is None or value >= self.low)
+                and (self.high is None or value < self.high))
+
+
+def matches(obj: Any, where: dict[str, Any]) -> bool:
+    """
+    Удовлетворяет ли объект условию where: каждое поле равно заданному
+    значению или, для условий Between, лежит в интервале.
+    """
+    for attr, condition in where.items():
+        value = getattr(obj, attr)
+        if isinstance(condition, Between):
+            if value not in condition:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
 class AbstractRepository(ABC, Generic[T]):
     """
     Абстрактный репозиторий.
@@ -30,6 +61,12 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+    put_many
+    Методы для групповых операций (реализованы через абстрактные методы,
+    могут быть переопределены для ускорения):
+    add_many
+    update_many
+    get_page
     """
 
     @abstractmethod
@@ -47,7 +84,8 @@ class AbstractRepository(ABC, Generic[T]):
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
         """
         Получить все записи по некоторому условию
-        where - условие в виде словаря {'название_поля': значение}
+        where - условие в виде словаря {'название_поля': значение},
+        вместо значения можно указать интервал Between(от, до)
         если условие не задано (по умолчанию), вернуть все записи
         """
 
@@ -58,3 +96,32 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete(self, pk: int) -> None:
         """ Удалить запись """
+
+    @abstractmethod
+    def put_many(self, objs: Iterable[T]) -> None:
+        """
+        Сохранить объекты с заданными pk: записи с такими pk заменяются,
+        отсутствующие добавляются с тем же pk (например, при переносе
+        изменений из другого репозитория, см. repository.changes).
+        Следующие add выдают pk больше всех сохраненных.
+        """
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """ Добавить несколько объектов, вернуть список их id """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах """
+        for obj in objs:
+            self.update(obj)
+
+    def get_page(self, limit: int, before: int | None = None) -> list[T]:
+        """
+        Получить не более limit записей с pk меньше before (None - без
+        ограничения) в порядке убывания pk, то есть от последних добавленных.
+        Следующая страница - get_page(limit, before=<pk последней записи>).
+        """
+        objs = sorted((obj for obj in self.get_all()
+                       if before is None or obj.pk < before),
+                      key=lambda obj: obj.pk, reverse=True)
+        return objs[:limit]
@@ -0,0 +1,160 @@
+"""
+Модуль описывает архивирование старых расходов
+
+Расходы с датой раньше заданной переносятся в отдельный файл архива,
+где хранятся сжатыми блоками по месяцам (строки таблицы в формате JSON,
+сжатые zlib). В основной базе данных вместо них остаются итоговые строки
+{таблица}_summary: сумма и количество расходов за день по категории.
+Подсчет трат по периодам (bookkeeper.budgeting.evaluation) учитывает
+итоговые строки, поэтому бюджеты и отчеты по дням и более длинным
+периодам не меняются после архивирования.
+"""
+
+import json
+import sqlite3
+import zlib
+from itertools import groupby
+from typing import Any, Iterator, NamedTuple
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import from_epoch_seconds
+
+DAY_SECONDS = 86400
+
+
+class ArchiveResult(NamedTuple):
+    """
+    Результат архивирования.
+    rows - количество перенесенных в архив расходов
+    months - количество затронутых блоков архива (месяцев)
+    summary_rows - количество итоговых строк (день, категория) в базе данных
+    """
+    rows: int
+    months: int
+    summary_rows: int
+
+
+def summary_table(repo: SQLiteRepository[Expense]) -> str | None:
+    """ Название таблицы итогов репозитория, если она существует """
+    name = f'{repo.table_name}_summary'
+    found = repo.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                         'AND name = ?', (name,))
+    return name if found else None
+
+
+def create_summary(con: sqlite3.Connection, repo: SQLiteRepository[Expense]) -> str:
+    """ Создать таблицу итогов репозитория, если ее нет, вернуть ее название """
+    name = f'{repo.table_name}_summary'
+    day_type = 'INTEGER' if repo.epoch_seconds else 'TEXT'
+    con.execute(f'CREATE TABLE IF NOT EXISTS {name} (expense_date {day_type}, '
+                'category INTEGER, amount INTEGER, count INTEGER, '
+                'PRIMARY KEY (expense_date, category))')
+    return name
+
+
+def _month(value: Any) -> str:
+    if isinstance(value, int):
+        return from_epoch_seconds(value).strftime('%Y-%m')
+    return str(value)[:7]
+
+
+def _store(con: sqlite3.Connection, table: str, month: str,
+           rows: list[tuple[Any, ...]]) -> None:
+    found = con.execute(f'SELECT data FROM archive.{table} WHERE month = ?',
+                        (month,)).fetchone()
+    if found is not None:
+        rows = [tuple(row) for row in json.loads(zlib.decompress(found[0]))] + rows
+    data = zlib.compress(json.dumps(rows, ensure_ascii=False).encode(), 9)
+    con.execute(f'INSERT OR REPLACE INTO archive.{table} (month, count, data) '
+                'VALUES (?, ?, ?)', (month, len(rows), data))
+
+
+def archive_expenses(repo: SQLiteRepository[Expense], archive_file: str,
+                     cutoff: Any, vacuum: bool = True) -> ArchiveResult:
+    """
+    Перенести расходы с датой раньше cutoff в архив и оставить
+    в базе данных итоги по дням и категориям. Все изменения обоих файлов
+    выполняются в одной транзакции; повторный запуск с более поздней
+    датой дополняет архив и итоги.
+
+    Parameters
+    ----------
+    repo - репозиторий расходов (SQLiteRepository
+    или PartitionedSQLiteRepository)
+    archive_file - файл архива (создается при необходимости)
+    cutoff - граница: date, datetime или строка ISO
+    vacuum - сжать файл базы данных после удаления строк
+
+    Returns
+    -------
+    Объект ArchiveResult
+    """
+    bound = repo.encode_value('expense_date', cutoff)
+    table = repo.table_name
+    archive = f'{table}_archive'
+    pk_table = None
+    sources = [table]
+    if isinstance(repo, PartitionedSQLiteRepository):
+        pk_table = repo.pk_table
+        sources = repo.partitions_for(None, cutoff)
+    position = repo.columns.index('expense_date')
+    if repo.epoch_seconds:
+        day = (f'expense_date - ((expense_date % {DAY_SECONDS}) + {DAY_SECONDS}) '
+               f'% {DAY_SECONDS}')
+    else:
+        day = "substr(expense_date, 1, 10) || ' 00:00:00'"
+    rows = 0
+    months: set[str] = set()
+    con = sqlite3.connect(repo.db_file)
+    con.execute('ATTACH DATABASE ? AS archive', (archive_file,))
+    with con:
+        summary = create_summary(con, repo)
+        con.execute(f'CREATE TABLE IF NOT EXISTS archive.{archive} '
+                    '(month TEXT PRIMARY KEY, count INTEGER, data BLOB)')
+        for source in sources:
+            con.execute(
+                f'INSERT INTO {summary} (expense_date, category, amount, count) '
+                f'SELECT {day}, IFNULL(category, 0), SUM(amount), COUNT(*) '
+                f'FROM {source} WHERE expense_date < ? GROUP BY 1, 2 '
+                'ON CONFLICT (expense_date, category) DO UPDATE SET '
+                'amount = amount + excluded.amount, count = count + excluded.count',
+                (bound,))
+            cursor = con.execute(f'SELECT * FROM {source} WHERE expense_date < ? '
+                                 'ORDER BY expense_date, pk', (bound,))
+            for month, group in groupby(cursor, lambda row: _month(row[position])):
+                block = list(group)
+                _store(con, archive, month, block)
+                rows += len(block)
+                months.add(month)
+            if pk_table is not None:
+                con.execute(f'DELETE FROM {pk_table} WHERE pk IN '
+                            f'(SELECT pk FROM {source} WHERE expense_date < ?)', (bound,))
+            con.execute(f'DELETE FROM {source} WHERE expense_date < ?', (bound,))
+        summary_rows = con.execute(f'SELECT COUNT(*) FROM {summary}').fetchone()[0]
+    con.execute('DETACH DATABASE archive')
+    if vacuum:
+        con.execute('VACUUM')
+    con.close()
+    return ArchiveResult(rows, len(months), summary_rows)
+
+
+def archived_rows(archive_file: str, table: str = 'expense',
+                  month: str | None = None) -> Iterator[tuple[Any, ...]]:
+    """
+    Строки архива в порядке дат, все или за месяц month ('YYYY-MM').
+    Значения - в том виде, в котором они хранились в таблице table
+    (столбцы в порядке полей модели).
+    """
+    con = sqlite3.connect(archive_file)
+    query = f'SELECT data FROM {table}_archive'
+    params: tuple[str, ...] = ()
+    if month is not None:
+        query, params = query + ' WHERE month = ?', (month,)
+    try:
+        for data, in con.execute(query + ' ORDER BY month', params).fetchall():
+            for row in json.loads(zlib.decompress(data)):
+                yield tuple(row)
+    finally:
+        con.close()
@@ -0,0 +1,255 @@
+"""
+Кэш результатов запросов к репозиториям sqlite, действующий
+до изменения таблиц, по которым они получены
+
+Версия таблицы - счетчик в таблице table_versions, который увеличивают
+триггеры на добавление, изменение и удаление строк. Как и в журнале
+изменений (см. changes), учитывается запись через любой репозиторий,
+из другого процесса и произвольным SQL. Триггеры создаются один раз
+при подключении репозитория к кэшу (QueryCache.watch), чтение их
+не создает. Результат хранится вместе с версиями таблиц на момент
+расчета и используется, пока версии не изменились; проверка - один
+запрос по первичному ключу маленькой таблицы.
+
+Размер результатов оценивается приблизительно (approximate_size).
+Если общий размер превышает max_bytes, удаляются результаты, которые
+дольше всего не запрашивались (LRU).
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from copy import copy
+from typing import Any, Callable, Hashable, Iterable, NamedTuple, Sequence, TypeVar
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, shared_connection
+
+VERSIONS_TABLE = 'table_versions'
+# сколько элементов коллекции просматривается для оценки ее размера
+SIZE_SAMPLE = 16
+
+V = TypeVar('V')
+
+
+def enable_versions(repo: SQLiteRepository[Any]) -> None:
+    """
+    Создать таблицу версий (одну на файл базы данных) и триггеры,
+    увеличивающие версию таблицы репозитория при каждом изменении строк.
+    Повторный вызов ничего не меняет. После migrate_to_epoch, которая
+    пересоздает таблицу, отслеживание нужно включить снова (секционированной
+    таблице - не нужно, триггеры секций создаются заново по шаблонам).
+    """
+    table = repo.table_name
+    bump = (f'BEGIN UPDATE {VERSIONS_TABLE} SET version = version + 1 '
+            f"WHERE table_name = '{table}'; END")
+    with shared_connection(repo.db_file) as con:
+        con.execute(f'CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} '
+                    '(table_name TEXT PRIMARY KEY, version INTEGER NOT NULL) '
+                    'WITHOUT ROWID')
+        con.execute(f'INSERT OR IGNORE INTO {VERSIONS_TABLE} VALUES (?, 0)', (table,))
+        for op in ('insert', 'update', 'delete'):
+            # pylint: disable=protected-access
+            repo._create_trigger(
+                con, f'version_{op}',
+                f'CREATE TRIGGER IF NOT EXISTS $trigger AFTER {op.upper()} ON $table '
+                f'{bump}')
+
+
+def track_versions(repo: AbstractRepository[Any]) -> bool:
+    """
+    Включить отслеживание версий таблицы репозитория, если это возможно
+    (SQLiteRepository с созданной таблицей; у секционированного
+    репозитория таблица - представление, объединяющее секции).
+    Возвращает True, если версии отслеживаются.
+    """
+    if not isinstance(repo, SQLiteRepository):
+        return False
+    exists = shared_connection(repo.db_file).execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?",
+        (repo.table_name,)).fetchone()
+    if exists is None:
+        return False
+    enable_versions(repo)
+    return True
+
+
+def table_version(repo: SQLiteRepository[Any]) -> int:
+    """ Текущая версия таблицы репозитория (см. enable_versions) """
+    row = shared_connection(repo.db_file).execute(
+        f'SELECT version FROM {VERSIONS_TABLE} WHERE table_name = ?',
+        (repo.table_name,)).fetchone()
+    return 0 if row is None else row[0]
+
+
+def approximate_size(value: Any) -> int:
+    """
+    Приблизительный размер значения в памяти, байт. Размер коллекций
+    оценивается по первым SIZE_SAMPLE элементам.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float)) or value is None:
+        return size
+    if isinstance(value, dict):
+        items: list[Any] = []
+        for item in value.items():
+            items.extend(item)
+            if len(items) >= 2 * SIZE_SAMPLE:
+                break
+        count = 2 * len(value)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = []
+        for item in value:
+            items.append(item)
+            if len(items) >= SIZE_SAMPLE:
+                break
+        count = len(value)
+    else:
+        slots = getattr(type(value), '__slots__', ())
+        attrs = getattr(value, '__dict__', {})
+        items = [getattr(value, name) for name in slots if hasattr(value, name)]
+        items.extend(attrs.values())
+        count = len(items)
+    if not items:
+        return size
+    return size + sum(map(approximate_size, items)) * count // len(items)
+
+
+class CacheStats(NamedTuple):
+    """
+    Статистика кэша.
+    hits - результаты, взятые из кэша
+    misses - результаты, рассчитанные заново (нет в кэше или устарели)
+    bypassed - результаты, которые нельзя кэшировать (версия таблиц
+    не отслеживается, например, для репозиториев в оперативной памяти)
+    evictions - результаты, удаленные из-за ограничения размера
+    entries - количество результатов в кэше
+    size - оценка размера результатов в кэше, байт
+    """
+    hits: int
+    misses: int
+    bypassed: int
+    evictions: int
+    entries: int
+    size: int
+
+    @property
+    def hit_ratio(self) -> float:
+        """ Доля запросов, результат которых взят из кэша """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class _Entry(NamedTuple):
+    versions: tuple[int, ...]
+    value: Any
+    size: int
+
+
+class QueryCache:
+    """
+    Кэш результатов запросов с проверкой версий таблиц.
+    max_bytes - ограничение общего размера результатов в кэше
+
+    Кэшируются только результаты, зависящие от репозиториев,
+    подключенных через watch; остальные рассчитываются при каждом вызове.
+    Результаты из кэша общие для всех вызовов, изменять их нельзя
+    (get_all возвращает копии объектов). Методы, кроме watch, можно
+    вызывать из нескольких потоков.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._size = 0
+        self._hits = self._misses = self._bypassed = self._evictions = 0
+        self._watched: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def watch(self, repos: Iterable[AbstractRepository[Any] | None]) -> None:
+        """
+        Подключить репозитории к кэшу: включить отслеживание версий
+        их таблиц (см. track_versions). Вызывается при настройке,
+        до запросов; после migrate_to_epoch нужно вызвать снова.
+        """
+        for repo in repos:
+            if isinstance(repo, SQLiteRepository) and track_versions(repo):
+                self._watched.add((repo.db_file, repo.table_name))
+
+    def _tables(self, repos: Sequence[AbstractRepository[Any]]
+                ) -> list[SQLiteRepository[Any]] | None:
+        """ Репозитории, если все они подключены к кэшу, иначе None """
+        tables = []
+        for repo in repos:
+            if (not isinstance(repo, SQLiteRepository)
+                    or (repo.db_file, repo.table_name) not in self._watched):
+                return None
+            tables.append(repo)
+        return tables
+
+    def versions(self, repos: Sequence[AbstractRepository[Any]]
+                 ) -> tuple[int, ...] | None:
+        """ Версии таблиц репозиториев (None - хотя бы одна не отслеживается) """
+        tables = self._tables(repos)
+        if tables is None:
+            return None
+        return tuple(map(table_version, tables))
+
+    def get(self, key: Hashable, repos: Sequence[AbstractRepository[Any]],
+            compute: Callable[[], V]) -> V:
+        """
+        Результат запроса key, зависящего от таблиц репозиториев repos:
+        из кэша, если таблицы не менялись после расчета, иначе - compute()
+        """
+        tables = self._tables(repos)
+        if tables is None:
+            with self._lock:
+                self._bypassed += 1
+            return compute()
+        versions = tuple(map(table_version, tables))
+        key = (tuple((repo.db_file, repo.table_name) for repo in tables), key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.versions == versions:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry.value  # type: ignore[no-any-return]
+            self._misses += 1
+        # версии прочитаны до расчета: если таблица изменится во время
+        # расчета, результат будет пересчитан при следующем запросе
+        value = compute()
+        self._store(key, _Entry(versions, value, approximate_size(value)))
+        return value
+
+    def _store(self, key: Hashable, entry: _Entry) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old.size
+            if entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+                self._evictions += 1
+
+    def get_all(self, repo: AbstractRepository[T],
+                where: dict[str, Any] | None = None) -> list[T]:
+        """ Результат repo.get_all(where) (копии объектов из кэша) """
+        key = ('get_all', tuple(sorted((where or {}).items())))
+        objs = self.get(key, [repo], lambda: repo.get_all(where))
+        return [copy(obj) for obj in objs]
+
+    def clear(self) -> None:
+        """ Удалить все результаты (статистика сохраняется) """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> CacheStats:
+        """ Текущая статистика """
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._bypassed,
+                              self._evictions, len(self._entries), self._size)
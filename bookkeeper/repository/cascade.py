@@ -0,0 +1,107 @@
+"""
+Удаление категории с переносом зависимых записей
+
+Расходы удаляемой категории и ее непосредственные подкатегории переносятся
+в родительскую категорию удаляемой. Для репозиториев sqlite в одном файле
+базы данных все изменения выполняются одной транзакцией: два UPDATE
+по индексированным столбцам и DELETE, поэтому сбой не может оставить
+расходы со ссылкой на удаленную категорию. Для остальных репозиториев
+записи выбираются по индексу (у MemoryRepository) или сканированием
+столбца (у ColumnarMemoryRepository), а при сбое уже внесенные изменения
+отменяются.
+"""
+
+from copy import copy
+from typing import NamedTuple
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.archive import summary_table
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, shared_connection
+
+
+class CascadeResult(NamedTuple):
+    """
+    Результат удаления категории.
+    expenses - количество перенесенных расходов
+    categories - количество перенесенных подкатегорий
+    """
+    expenses: int
+    categories: int
+
+
+def _sql_delete(cat_repo: SQLiteRepository[Category], exp_repo: SQLiteRepository[Expense],
+                pk: int, new_parent: int | None) -> CascadeResult:
+    cat_repo.ensure_column_index('parent')
+    exp_repo.ensure_column_index('category')
+    if isinstance(exp_repo, PartitionedSQLiteRepository):
+        tables = exp_repo.partitions()
+    else:
+        tables = [exp_repo.table_name]
+    summary = summary_table(exp_repo)
+    with shared_connection(cat_repo.db_file) as con:
+        moved = sum(con.execute(f'UPDATE {table} SET category = ? WHERE category = ?',
+                                (new_parent, pk)).rowcount for table in tables)
+        if summary is not None:
+            # итоги по дням перенесенных в архив расходов объединяются
+            # с итогами новой категории за тот же день; расходы без
+            # категории в итогах, как и при архивировании, - категория 0
+            con.execute(f'INSERT INTO {summary} (expense_date, category, amount, count) '
+                        f'SELECT expense_date, IFNULL(?, 0), amount, count '
+                        f'FROM {summary} WHERE category = ? '
+                        'ON CONFLICT (expense_date, category) '
+                        'DO UPDATE SET amount = amount + excluded.amount, '
+                        'count = count + excluded.count', (new_parent, pk))
+            con.execute(f'DELETE FROM {summary} WHERE category = ?', (pk,))
+        children = con.execute(f'UPDATE {cat_repo.table_name} SET parent = ? '
+                               'WHERE parent = ? AND pk != ?',
+                               (new_parent, pk, pk)).rowcount
+        if con.execute(cat_repo.statements.delete, (pk,)).rowcount == 0:
+            raise KeyError(pk)
+    return CascadeResult(moved, children)
+
+
+def delete_category(cat_repo: AbstractRepository[Category],
+                    exp_repo: AbstractRepository[Expense], pk: int) -> CascadeResult:
+    """
+    Удалить категорию pk, перенеся ее расходы и подкатегории в ее
+    родительскую категорию (у категории верхнего уровня расходы остаются
+    без категории, подкатегории становятся категориями верхнего уровня).
+    Если категории нет, выбрасывается KeyError и ничего не изменяется.
+
+    Для SQLiteRepository (в том числе секционированного) в одном файле -
+    одна транзакция; для остальных репозиториев записи выбираются
+    get_all по полю и обновляются update_many, при ошибке прежние
+    записи восстанавливаются.
+    """
+    cat = cat_repo.get(pk)
+    if cat is None:
+        raise KeyError(pk)
+    new_parent = None if cat.parent == pk else cat.parent
+    if (isinstance(cat_repo, SQLiteRepository) and isinstance(exp_repo, SQLiteRepository)
+            and cat_repo.db_file == exp_repo.db_file):
+        return _sql_delete(cat_repo, exp_repo, pk, new_parent)
+    for repo, name in ((exp_repo, 'category'), (cat_repo, 'parent')):
+        if isinstance(repo, MemoryRepository):
+            repo.ensure_column_index(name)
+    old_expenses = exp_repo.get_all({'category': pk})
+    old_children = [child for child in cat_repo.get_all({'parent': pk})
+                    if child.pk != pk]
+    # изменяются копии: объекты MemoryRepository остаются прежними до update
+    expenses, children = list(map(copy, old_expenses)), list(map(copy, old_children))
+    for exp in expenses:
+        exp.category = new_parent  # type: ignore[assignment]
+    for child in children:
+        child.parent = new_parent
+    try:
+        exp_repo.update_many(expenses)
+        cat_repo.update_many(children)
+        cat_repo.delete(pk)
+    except BaseException:
+        exp_repo.update_many(old_expenses)
+        cat_repo.update_many(old_children)
+        raise
+    return CascadeResult(len(expenses), len(children))
@@ -0,0 +1,175 @@
+"""
+Поиск категорий по названию без учета регистра
+
+Названия категорий могут повторяться у разных родителей, поэтому
+однозначный ключ категории - путь (родитель, название): find_in ищет
+подкатегорию родителя, find_path - категорию по полному пути от верхнего
+уровня. Категории верхнего уровня - с parent, равным None или своему pk
+(так хранится категория по умолчанию "другое"). find ищет по одному
+названию и при совпадении названий возвращает категорию с наименьшим pk
+(как get_all({'name': ...})[0]).
+"""
+
+from bisect import insort
+from collections import defaultdict
+from typing import Sequence
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def name_key(name: str) -> str:
+    """ Ключ названия для сравнения без учета регистра """
+    return name.strip().casefold()
+
+
+def parent_key(cat: Category) -> int | None:
+    """ Родитель категории (None для категорий верхнего уровня) """
+    return None if cat.parent == cat.pk else cat.parent
+
+
+class CategoryIndex:
+    """
+    Индекс названий категорий в оперативной памяти, поиск за O(1).
+
+    Индекс строится при создании по всем категориям репозитория,
+    изменения нужно передавать методами add, update и remove
+    или перестроить индекс методом refresh.
+    """
+
+    def __init__(self, repo: AbstractRepository[Category]) -> None:
+        self.repo = repo
+        self._categories: dict[int, Category] = {}
+        self._by_name: dict[str, list[int]] = defaultdict(list)
+        self._by_path: dict[tuple[int | None, str], list[int]] = defaultdict(list)
+        self.refresh()
+
+    def refresh(self) -> None:
+        """ Перестроить индекс по данным репозитория """
+        self._categories = {}
+        self._by_name.clear()
+        self._by_path.clear()
+        for cat in self.repo.get_all():
+            self.add(cat)
+
+    def add(self, cat: Category) -> None:
+        """ Добавить в индекс категорию, уже сохраненную в репозитории """
+        key = name_key(cat.name)
+        self._categories[cat.pk] = Category(cat.name, cat.parent, cat.pk)
+        insort(self._by_name[key], cat.pk)
+        insort(self._by_path[parent_key(cat), key], cat.pk)
+
+    def remove(self, pk: int) -> None:
+        """ Удалить категорию из индекса """
+        cat = self._categories.pop(pk, None)
+        if cat is None:
+            return
+        key = name_key(cat.name)
+        self._by_name[key].remove(pk)
+        if not self._by_name[key]:
+            del self._by_name[key]
+        path_key = parent_key(cat), key
+        self._by_path[path_key].remove(pk)
+        if not self._by_path[path_key]:
+            del self._by_path[path_key]
+
+    def update(self, cat: Category) -> None:
+        """ Учесть изменение названия или родителя категории """
+        self.remove(cat.pk)
+        self.add(cat)
+
+    def find(self, name: str) -> int | None:
+        """ pk категории с названием name или None """
+        pks = self._by_name.get(name_key(name))
+        return pks[0] if pks else None
+
+    def find_in(self, parent: int | None, name: str) -> int | None:
+        """
+        pk подкатегории родителя parent (None - верхний уровень)
+        с названием name или None
+        """
+        pks = self._by_path.get((parent, name_key(name)))
+        return pks[0] if pks else None
+
+    def find_path(self, names: Sequence[str]) -> int | None:
+        """ pk категории по названиям от верхнего уровня (['еда', 'мясо']) """
+        pk = None
+        for name in names:
+            pk = self.find_in(pk, name)
+            if pk is None:
+                return None
+        return pk
+
+    def path(self, pk: int) -> list[str]:
+        """ Названия категорий от верхнего уровня до категории pk """
+        names: list[str] = []
+        cat = self._categories.get(pk)
+        while cat is not None and len(names) < len(self._categories):
+            names.append(cat.name)
+            parent = parent_key(cat)
+            cat = None if parent is None else self._categories.get(parent)
+        return names[::-1]
+
+
+class SQLiteCategoryIndex(CategoryIndex):
+    """
+    Поиск категорий запросами к sqlite по индексу
+    (name COLLATE NOCASE, parent), всегда видит актуальные данные.
+
+    NOCASE в sqlite не различает регистр только латинских букв, поэтому
+    название ищется как есть и в нижнем регистре (приложение хранит
+    названия категорий в нижнем регистре).
+    """
+    repo: SQLiteRepository[Category]
+
+    def __init__(self, repo: SQLiteRepository[Category]) -> None:
+        super().__init__(repo)
+        repo.ensure_index(f'{repo.table_name}_name_idx', 'name COLLATE NOCASE, parent')
+
+    def refresh(self) -> None:
+        pass
+
+    def add(self, cat: Category) -> None:
+        pass
+
+    def remove(self, pk: int) -> None:
+        pass
+
+    def _find(self, name: str, condition: str = '',
+              params: tuple[int | None, ...] = ()) -> int | None:
+        name = name.strip()
+        rows = self.repo.execute(
+            f'SELECT MIN(pk) FROM {self.repo.table_name} '
+            f'WHERE name COLLATE NOCASE IN (?, ?){condition}',
+            (name, name.lower(), *params))
+        return rows[0][0]
+
+    def find(self, name: str) -> int | None:
+        return self._find(name)
+
+    def find_in(self, parent: int | None, name: str) -> int | None:
+        if parent is None:
+            return self._find(name, ' AND (parent IS NULL OR parent = pk)')
+        return self._find(name, ' AND parent = ? AND pk != ?', (parent, parent))
+
+    def path(self, pk: int) -> list[str]:
+        rows = self.repo.execute(
+            'WITH RECURSIVE up(pk, name, parent, depth) AS ('
+            f'SELECT pk, name, parent, 0 FROM {self.repo.table_name} WHERE pk = ? '
+            'UNION ALL SELECT c.pk, c.name, c.parent, up.depth + 1 '
+            f'FROM {self.repo.table_name} AS c JOIN up ON c.pk = up.parent '
+            'AND up.parent != up.pk AND up.depth < 1000) '
+            'SELECT name FROM up ORDER BY depth DESC', (pk,))
+        return [name for name, in rows]
+
+
+def category_index(repo: AbstractRepository[Category]) -> CategoryIndex:
+    """
+    Создать индекс названий, подходящий для репозитория:
+    для SQLiteRepository - выполняющий запросы к базе данных,
+    для остальных - индекс в оперативной памяти.
+    """
+    if isinstance(repo, SQLiteRepository):
+        return SQLiteCategoryIndex(repo)
+    return CategoryIndex(repo)
@@ -0,0 +1,252 @@
+"""
+Журнал изменений базы данных sqlite (change data capture)
+и перенос изменений в другой репозиторий
+
+Добавление, изменение и удаление строки таблицы, для которой включен
+журнал (enable_changes), записывается триггером в таблицу changes:
+номер изменения seq (возрастает монотонно), таблица, pk, операция
+и версия записи (номер изменения этой записи, начиная с 1). Как и для
+полнотекстового индекса (см. search), изменения через репозиторий,
+удаление категории, архивирование и произвольный SQL учитываются сразу.
+
+sync_changes читает изменения с номером больше заданного и переносит
+в другой репозиторий только затронутые записи (put_many и delete),
+поэтому время синхронизации зависит от количества изменений,
+а не от размера базы данных. Синхронизация односторонняя: записи
+получателя заменяются записями источника, изменения получателя
+обратно не переносятся. Чтобы не потерять их молча, изменения
+получателя проверяются по его собственному журналу (SyncConflict).
+"""
+
+from contextlib import suppress
+from typing import Any, NamedTuple, Sequence
+
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, shared_connection
+from bookkeeper.utils import as_datetime
+
+CHANGES_TABLE = 'changes'
+OPERATIONS = ('insert', 'update', 'delete')
+
+
+class Change(NamedTuple):
+    """
+    Изменение записи.
+    seq - номер изменения
+    table - название таблицы
+    pk - id записи
+    op - операция ('insert', 'update' или 'delete')
+    version - версия записи после изменения
+    """
+    seq: int
+    table: str
+    pk: int
+    op: str
+    version: int
+
+
+class SyncConflict(ValueError):
+    """
+    В получателе есть изменения, сделанные не синхронизацией.
+    changes - эти изменения по журналу получателя
+    """
+
+    def __init__(self, changes: list[Change]) -> None:
+        rows = ', '.join(f'{change.table} {change.pk}' for change in changes[:10])
+        super().__init__(f'target has {len(changes)} local changes: {rows}')
+        self.changes = changes
+
+
+class SyncResult(NamedTuple):
+    """
+    Результат синхронизации.
+    seq - номер последнего перенесенного изменения (с него начинается
+    следующая синхронизация)
+    changes - количество прочитанных изменений
+    saved - количество сохраненных записей (добавленных или измененных)
+    deleted - количество удаленных записей
+    """
+    seq: int
+    changes: int
+    saved: int
+    deleted: int
+
+
+def _version(table: str, pk: str) -> str:
+    """ Выражение SQL: следующая версия записи pk таблицы table """
+    return (f'1 + COALESCE((SELECT MAX(version) FROM {CHANGES_TABLE} '
+            f"WHERE table_name = '{table}' AND pk = {pk}), 0)")
+
+
+def _trigger(table: str, op: str) -> str:
+    """ Шаблон триггера журнала (см. SQLiteRepository.create_trigger) """
+    row = 'old' if op == 'delete' else 'new'
+    return (f'CREATE TRIGGER IF NOT EXISTS $trigger AFTER {op.upper()} ON $table '
+            f'BEGIN INSERT INTO {CHANGES_TABLE} (table_name, pk, op, version) '
+            f"VALUES ('{table}', {row}.pk, '{op}', {_version(table, f'{row}.pk')}); END")
+
+
+def enable_changes(repo: SQLiteRepository[Any]) -> None:
+    """
+    Создать таблицу журнала изменений (одну на файл базы данных)
+    и триггеры, записывающие в нее изменения таблицы репозитория.
+    Записи, которые уже есть в таблице, записываются в журнал
+    как добавленные, поэтому журнал можно включить перед первой
+    синхронизацией. Записи, которые есть в журнале, но были удалены,
+    пока он не велся, записываются как удаленные. Повторный вызов
+    ничего не меняет. После
+    migrate_to_epoch, которая пересоздает таблицу, журнал нужно
+    включить снова (секционированной таблице - не нужно, триггеры
+    секций создаются заново по шаблонам).
+    """
+    table = repo.table_name
+    with shared_connection(repo.db_file) as con:
+        con.execute(f'CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} ('
+                    'seq INTEGER PRIMARY KEY AUTOINCREMENT, table_name TEXT NOT NULL, '
+                    'pk INTEGER NOT NULL, op TEXT NOT NULL, version INTEGER NOT NULL)')
+        con.execute(f'CREATE INDEX IF NOT EXISTS {CHANGES_TABLE}_row_idx '
+                    f'ON {CHANGES_TABLE} (table_name, pk, version)')
+        if repo.has_trigger('changes_insert'):
+            return
+        con.execute(f'INSERT INTO {CHANGES_TABLE} (table_name, pk, op, version) '
+                    f"SELECT table_name, pk, 'delete', version + 1 "
+                    f'FROM {CHANGES_TABLE} AS logged '
+                    f"WHERE table_name = '{table}' AND op != 'delete' "
+                    f'AND seq = (SELECT MAX(seq) FROM {CHANGES_TABLE} '
+                    f"WHERE table_name = '{table}' AND pk = logged.pk) "
+                    f'AND pk NOT IN (SELECT pk FROM {table}) ORDER BY pk')
+        con.execute(f'INSERT INTO {CHANGES_TABLE} (table_name, pk, op, version) '
+                    f"SELECT '{table}', pk, 'insert', {_version(table, 'source.pk')} "
+                    f'FROM {table} AS source ORDER BY pk')
+        for op in OPERATIONS:
+            # pylint: disable=protected-access
+            repo._create_trigger(con, f'changes_{op}', _trigger(table, op))
+
+
+def _has_changes(db_file: str) -> bool:
+    return shared_connection(db_file).execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (CHANGES_TABLE,)).fetchone() is not None
+
+
+def last_seq(db_file: str) -> int:
+    """ Номер последнего изменения (0 - изменений нет) """
+    if not _has_changes(db_file):
+        return 0
+    row = shared_connection(db_file).execute(
+        f'SELECT MAX(seq) FROM {CHANGES_TABLE}').fetchone()
+    return row[0] or 0
+
+
+def read_changes(db_file: str, since: int = 0, limit: int | None = None) -> list[Change]:
+    """ Изменения с номером больше since по возрастанию номера (не более limit) """
+    if not _has_changes(db_file):
+        return []
+    rows = shared_connection(db_file).execute(
+        f'SELECT seq, table_name, pk, op, version FROM {CHANGES_TABLE} '
+        'WHERE seq > ? ORDER BY seq LIMIT ?',
+        (since, -1 if limit is None else limit)).fetchall()
+    return [Change(*row) for row in rows]
+
+
+def compact_changes(db_file: str) -> int:
+    """
+    Удалить из журнала изменения, после которых запись менялась еще раз,
+    вернуть количество удаленных изменений. Синхронизация с любого номера
+    дает тот же результат, так как переносится последнее состояние записей,
+    а версии записей сохраняются.
+    """
+    if not _has_changes(db_file):
+        return 0
+    with shared_connection(db_file) as con:
+        return con.execute(
+            f'DELETE FROM {CHANGES_TABLE} WHERE seq NOT IN '
+            f'(SELECT MAX(seq) FROM {CHANGES_TABLE} GROUP BY table_name, pk)').rowcount
+
+
+def _latest(changes: list[Change]) -> dict[str, dict[int, str]]:
+    """ Последняя операция для каждой записи: {таблица: {pk: операция}} """
+    result: dict[str, dict[int, str]] = {}
+    for change in changes:
+        result.setdefault(change.table, {})[change.pk] = change.op
+    return result
+
+
+def _rows(repo: SQLiteRepository[Any], pks: list[int]) -> list[Any]:
+    """
+    Текущие записи с заданными pk (удаленные пропускаются). Даты, которые
+    в таблице хранятся текстом, переводятся в datetime.
+    """
+    if not pks:
+        return []
+    objs = repo.query(f'SELECT * FROM {repo.table_name} '
+                      f'WHERE pk IN ({", ".join("?" * len(pks))})', pks)
+    for obj in objs:
+        for name in repo.datetime_columns:
+            setattr(obj, name, as_datetime(getattr(obj, name)))
+    return objs
+
+
+def _db_file(repos: Sequence[AbstractRepository[Any]]) -> str:
+    """ Общий файл базы данных репозиториев sqlite с включенным журналом """
+    db_files = {getattr(repo, 'db_file', None) for repo in repos}
+    if len(db_files) != 1 or not all(isinstance(repo, SQLiteRepository)
+                                     and repo.has_trigger('changes_insert')
+                                     for repo in repos):
+        raise ValueError('repositories must share one database file with change log')
+    return str(db_files.pop())
+
+
+def local_changes(targets: Sequence[AbstractRepository[Any]],
+                  since: int) -> list[Change]:
+    """
+    Изменения таблиц репозиториев targets (sqlite с включенным журналом,
+    в одном файле базы данных) с номером больше since
+    """
+    db_file = _db_file(targets)
+    tables = {getattr(target, 'table_name') for target in targets}
+    return [change for change in read_changes(db_file, since)
+            if change.table in tables]
+
+
+def sync_changes(pairs: Sequence[tuple[SQLiteRepository[Any], AbstractRepository[Any]]],
+                 since: int = 0, batch_size: int = 1000,
+                 target_since: int | None = None) -> SyncResult:
+    """
+    Перенести изменения с номером больше since из репозиториев-источников
+    (с включенным журналом, в одном файле базы данных) в соответствующие
+    им репозитории (put_many - добавленные и измененные записи с теми же
+    pk, delete - удаленные). Изменения читаются пакетами по batch_size,
+    каждая запись пакета переносится один раз в последнем состоянии.
+    Изменения таблиц, не указанных в pairs, пропускаются.
+
+    Синхронизация односторонняя. Если задан target_since, получатели
+    тоже должны вести журнал в одном файле; изменения их таблиц с номером
+    больше target_since (last_seq получателя после предыдущей
+    синхронизации) сделаны не синхронизацией, и перенос не выполняется
+    (SyncConflict). Без target_since изменения получателя не проверяются.
+    """
+    if not pairs:
+        return SyncResult(since, 0, 0, 0)
+    db_file = _db_file([source for source, _ in pairs])
+    if target_since is not None:
+        if local := local_changes([target for _, target in pairs], target_since):
+            raise SyncConflict(local)
+    targets = {source.table_name: (source, target) for source, target in pairs}
+    seq, total, saved, deleted = since, 0, 0, 0
+    while changes := read_changes(db_file, seq, batch_size):
+        for table, ops in _latest(changes).items():
+            if table not in targets:
+                continue
+            source, target = targets[table]
+            objs = _rows(source, [pk for pk, op in ops.items() if op != 'delete'])
+            target.put_many(objs)
+            saved += len(objs)
+            for pk, op in ops.items():
+                if op == 'delete':
+                    with suppress(KeyError):
+                        target.delete(pk)
+                        deleted += 1
+        seq = changes[-1].seq
+        total += len(changes)
+    return SyncResult(seq, total, saved, deleted)
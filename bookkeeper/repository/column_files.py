@@ -0,0 +1,271 @@
+"""
+Модуль описывает перенос данных репозитория в каталог файлов столбцов
+в формате NumPy (.npy) и обратно
+
+Каждое поле модели записывается в отдельный файл {поле}.npy:
+    целые числа - int64 (None - минимальное значение int64)
+    числа с плавающей точкой - float64
+    дата и время - datetime64[us] (None - NaT)
+    дата - datetime64[D] (None - NaT)
+    строки - int32, номер строки в словаре (None - -1); словарь уникальных
+    строк - {поле}.offsets.npy (int64, смещения) и {поле}.data.npy
+    (uint8, строки в кодировке UTF-8 подряд)
+pk записей - pk.npy, описание модели и полей - meta.json.
+
+Файлы читаются через mmap без копирования (ColumnFiles.column), поэтому
+их можно открыть и в numpy (numpy.load(..., mmap_mode='r')).
+Модуль numpy при этом не требуется: файлы пишутся и читаются модулем array.
+"""
+
+import ast
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date, datetime
+from inspect import get_annotations
+from typing import Any, Iterable, Iterator
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.columnar_repository import (NULL, Column, DateColumn,
+                                                       DatetimeColumn, FloatColumn,
+                                                       StrColumn, make_column)
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, shared_connection
+from bookkeeper.utils import from_timestamp, to_timestamp
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 100_000
+_NPY_MAGIC = b'\x93NUMPY'
+_EPOCH_DAY = date(1970, 1, 1).toordinal()
+_US = 1_000_000
+# тип элемента .npy -> код типа модуля array
+_TYPECODES = {'<i8': 'q', '<i4': 'i', '<f8': 'd', '<M8[us]': 'q', '<M8[D]': 'q',
+              '|u1': 'B'}
+
+
+def _descr(col: Column) -> str:
+    if isinstance(col, StrColumn):
+        return '<i4'
+    if isinstance(col, FloatColumn):
+        return '<f8'
+    if isinstance(col, DatetimeColumn):
+        return '<M8[us]'
+    if isinstance(col, DateColumn):
+        return '<M8[D]'
+    return '<i8'
+
+
+def write_npy(path: str, descr: str, data: 'array[Any]') -> None:
+    """ Записать одномерный массив в файл .npy (версия формата 1.0) """
+    if sys.byteorder != 'little' and data.itemsize > 1:
+        data = array(data.typecode, data)
+        data.byteswap()
+    header = repr({'descr': descr, 'fortran_order': False, 'shape': (len(data),)})
+    # данные выравниваются на 64 байта, как при записи numpy
+    size = len(_NPY_MAGIC) + 4 + len(header) + 1
+    header += ' ' * (-size % 64) + '\n'
+    with open(path, 'wb') as file:
+        file.write(_NPY_MAGIC + b'\x01\x00' + struct.pack('<H', len(header)))
+        file.write(header.encode('latin1'))
+        file.write(data.tobytes())
+
+
+def read_npy(path: str) -> memoryview:
+    """
+    Открыть одномерный массив из файла .npy через mmap.
+    Возвращает memoryview с элементами типа из _TYPECODES (без копирования
+    данных; на компьютерах с обратным порядком байтов - копию).
+    """
+    with open(path, 'rb') as file:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:6] != _NPY_MAGIC:
+        raise ValueError(f'{path} is not a .npy file')
+    if mm[6] == 1:
+        header_len, start = struct.unpack_from('<H', mm, 8)[0], 10
+    else:
+        header_len, start = struct.unpack_from('<I', mm, 8)[0], 12
+    header = ast.literal_eval(mm[start:start + header_len].decode('latin1'))
+    typecode = _TYPECODES.get(header['descr'])
+    if typecode is None or header['fortran_order'] or len(header['shape']) != 1:
+        raise ValueError(f'{path}: unsupported array {header}')
+    start += header_len
+    size = array(typecode).itemsize * header['shape'][0]
+    view = memoryview(mm)[start:start + size]
+    if sys.byteorder != 'little' and size:
+        data = array(typecode, view.tobytes())
+        data.byteswap()
+        return memoryview(data)
+    return view.cast(typecode)  # type: ignore[call-overload]
+
+
+def _columns(cls: type) -> dict[str, Column]:
+    fields = get_annotations(cls, eval_str=True)
+    fields.pop('pk')
+    return {name: make_column(annotation) for name, annotation in fields.items()}
+
+
+def _sqlite_decoder(col: Column) -> Any:
+    """ Преобразование значения из таблицы sqlite в элемент массива столбца """
+    if isinstance(col, DatetimeColumn):
+        def decode_datetime(value: Any) -> int:
+            if value is None:
+                return NULL
+            if isinstance(value, int):
+                return value * _US
+            return to_timestamp(datetime.fromisoformat(value))
+        return decode_datetime
+    if isinstance(col, DateColumn):
+        return lambda value: (NULL if value is None
+                              else date.fromisoformat(value[:10]).toordinal())
+    return col.encode
+
+
+def _sqlite_rows(repo: SQLiteRepository[Any], columns: dict[str, Column]
+                 ) -> Iterator[list[tuple[Any, ...]]]:
+    cursor = shared_connection(repo.db_file).execute(
+        f'SELECT pk, {", ".join(columns)} FROM {repo.table_name} ORDER BY pk')
+    while batch := cursor.fetchmany(BATCH_SIZE):
+        yield batch
+
+
+def export_table(repo: AbstractRepository[Any], cls: type, directory: str) -> int:
+    """
+    Записать все объекты модели cls из репозитория в каталог directory
+    (создается, если не существует). Возвращает количество записей.
+    Для SQLiteRepository строки читаются из таблицы без создания объектов.
+    """
+    os.makedirs(directory, exist_ok=True)
+    columns = _columns(cls)
+    pks = array('q')
+    if isinstance(repo, SQLiteRepository):
+        decoders = [_sqlite_decoder(col) for col in columns.values()]
+        for batch in _sqlite_rows(repo, columns):
+            pk_values, *values = zip(*batch)
+            pks.extend(pk_values)
+            for col, decode, column in zip(columns.values(), decoders, values):
+                col.data.extend(map(decode, column))
+    else:
+        objs = sorted(repo.get_all(), key=lambda obj: obj.pk)
+        pks.extend(obj.pk for obj in objs)
+        for name, col in columns.items():
+            col.data.extend(col.encode(getattr(obj, name)) for obj in objs)
+    for name, col in columns.items():
+        data = col.data
+        if isinstance(col, DateColumn):
+            data = array('q', (NULL if day == NULL else day - _EPOCH_DAY
+                               for day in data))
+        write_npy(os.path.join(directory, f'{name}.npy'), _descr(col), data)
+        if isinstance(col, StrColumn):
+            encoded = [string.encode() for string in col.strings]
+            offsets = array('q', [0])
+            for string in encoded:
+                offsets.append(offsets[-1] + len(string))
+            write_npy(os.path.join(directory, f'{name}.offsets.npy'), '<i8', offsets)
+            write_npy(os.path.join(directory, f'{name}.data.npy'), '|u1',
+                      array('B', b''.join(encoded)))
+    write_npy(os.path.join(directory, 'pk.npy'), '<i8', pks)
+    meta = {'version': FORMAT_VERSION, 'model': cls.__name__, 'count': len(pks),
+            'fields': {name: {'descr': _descr(col), 'nullable': col.nullable}
+                       for name, col in columns.items()}}
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, indent=2)
+    return len(pks)
+
+
+class ColumnFiles:
+    """
+    Каталог файлов столбцов, записанный export_table.
+    directory - каталог
+    cls - класс модели; поля модели должны совпадать с описанием в meta.json
+    columns - столбцы модели (см. columnar_repository.make_column)
+    """
+
+    def __init__(self, directory: str, cls: type) -> None:
+        self.directory = directory
+        self.cls = cls
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as file:
+            self.meta = json.load(file)
+        self.columns = _columns(cls)
+        fields = {name: {'descr': _descr(col), 'nullable': col.nullable}
+                  for name, col in self.columns.items()}
+        if self.meta.get('version') != FORMAT_VERSION or self.meta['fields'] != fields:
+            raise ValueError(f'{directory} does not contain {cls.__name__} columns')
+
+    def __len__(self) -> int:
+        return int(self.meta['count'])
+
+    def column(self, name: str) -> memoryview:
+        """
+        Массив значений поля name (или 'pk') в файле, отображенном в память:
+        для строк - номера строк в словаре (см. strings)
+        """
+        return read_npy(os.path.join(self.directory, f'{name}.npy'))
+
+    def strings(self, name: str) -> list[str]:
+        """ Словарь строк строкового поля name """
+        offsets = read_npy(os.path.join(self.directory, f'{name}.offsets.npy'))
+        data = read_npy(os.path.join(self.directory, f'{name}.data.npy'))
+        return [str(data[start:end], 'utf-8') for start, end in zip(offsets, offsets[1:])]
+
+    def values(self, name: str) -> Iterable[Any]:
+        """ Значения поля name в виде объектов Python (datetime, date, str, ...) """
+        col = self.columns[name]
+        data = self.column(name)
+        if isinstance(col, StrColumn):
+            strings = self.strings(name)
+            return (None if code == -1 else strings[code] for code in data)
+        if isinstance(col, DatetimeColumn):
+            return (None if value == NULL else from_timestamp(value) for value in data)
+        if isinstance(col, DateColumn):
+            return (None if value == NULL else date.fromordinal(value + _EPOCH_DAY)
+                    for value in data)
+        if col.nullable:
+            return (None if value == NULL else value for value in data)
+        return data
+
+    def objects(self) -> Iterator[Any]:
+        """ Объекты модели с заполненными pk в порядке pk """
+        names = list(self.columns)
+        for pk, *values in zip(self.column('pk'), *map(self.values, names)):
+            yield self.cls(*values, pk=pk)
+
+
+def _sqlite_values(repo: SQLiteRepository[Any], files: ColumnFiles,
+                   name: str) -> Iterable[Any]:
+    """ Значения поля в том виде, в котором они хранятся в таблице sqlite """
+    col = files.columns[name]
+    if isinstance(col, DatetimeColumn) and repo.epoch_seconds:
+        return (None if value == NULL else value // _US for value in files.column(name))
+    if isinstance(col, (DatetimeColumn, DateColumn)):
+        return (None if value is None else str(value) for value in files.values(name))
+    return files.values(name)
+
+
+def import_table(directory: str, repo: AbstractRepository[T], cls: type) -> int:
+    """
+    Загрузить объекты модели cls из каталога directory в репозиторий,
+    вернуть количество записей. Объекты сохраняются с исходными pk, поэтому
+    ссылки между записями (expense.category, category.parent) остаются
+    верными. В SQLiteRepository строки добавляются одной транзакцией
+    (таблица не должна содержать записей с такими pk), в остальные
+    репозитории - через put_many (записи с такими pk заменяются).
+    """
+    files = ColumnFiles(directory, cls)
+    if isinstance(repo, SQLiteRepository) and not isinstance(
+            repo, PartitionedSQLiteRepository):
+        names = ['pk', *files.columns]
+        rows = zip(files.column('pk'),
+                   *(_sqlite_values(repo, files, name) for name in files.columns))
+        with shared_connection(repo.db_file) as con:
+            con.executemany(f'INSERT INTO {repo.table_name} ({", ".join(names)}) '
+                            f'VALUES ({", ".join("?" * len(names))})', rows)
+        return len(files)
+    objs = files.objects()
+    count = 0
+    while batch := [obj for _, obj in zip(range(BATCH_SIZE), objs)]:
+        repo.put_many(batch)
+        count += len(batch)
+    return count
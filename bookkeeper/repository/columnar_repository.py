@@ -0,0 +1,390 @@
+"""
+Модуль описывает репозиторий, хранящий данные в оперативной памяти по столбцам
+
+Каждое поле модели хранится в отдельном типизированном массиве (модуль array):
+целые числа, даты и время - как 64-битные целые, строки - как индексы в таблице
+уникальных строк. Объекты модели создаются только при обращении к ним,
+поэтому запись занимает несколько десятков байт вместо нескольких сотен.
+"""
+
+from array import array
+from datetime import date, datetime
+from inspect import get_annotations
+from itertools import compress, repeat
+from operator import eq
+from types import NoneType, UnionType
+from typing import Any, Callable, Iterable, Iterator, Union, get_args, get_origin
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, Between, T
+from bookkeeper.utils import as_datetime, from_timestamp, to_timestamp
+
+NULL = -2 ** 63
+_NO_MATCH = object()
+
+
+class Column:
+    """
+    Столбец значений одного поля модели.
+    data - массив закодированных значений
+    nullable - допускается ли значение None (хранится как NULL)
+    """
+    typecode = 'q'
+    kind: type = int
+
+    def __init__(self, nullable: bool = False) -> None:
+        self.nullable = nullable
+        self.data = array(self.typecode)
+
+    def encode(self, value: Any) -> Any:
+        """
+        Преобразовать значение поля в элемент массива.
+        Если тип значения не подходит, выбрасывается TypeError.
+        """
+        if value is None:
+            if not self.nullable:
+                raise TypeError('None is not allowed in this column')
+            return NULL
+        if not isinstance(value, self.kind):
+            raise TypeError(f'expected {self.kind.__name__}, got {value!r}')
+        return self._encode(value)
+
+    def decode(self, raw: Any) -> Any:
+        """ Преобразовать элемент массива в значение поля """
+        if self.nullable and raw == NULL:
+            return None
+        return self._decode(raw)
+
+    def key(self, value: Any) -> Any:
+        """
+        Закодировать значение для поиска. Если значение заведомо не может
+        совпасть ни с одним хранимым, вернуть _NO_MATCH.
+        """
+        try:
+            return self.encode(value)
+        except (TypeError, ValueError, OverflowError):
+            return _NO_MATCH
+
+    def bound(self, value: Any) -> Any:
+        """
+        Закодировать границу интервала Between. Если границу нельзя
+        сравнить со значениями столбца, выбрасывается ValueError.
+        """
+        try:
+            return self.encode(value)
+        except TypeError:
+            raise ValueError(f'cannot compare {self.kind.__name__} values '
+                             f'with {value!r}') from None
+
+    def _encode(self, value: Any) -> Any:
+        return value
+
+    def _decode(self, raw: Any) -> Any:
+        return raw
+
+
+class IntColumn(Column):
+    """ Целые числа """
+
+    def bound(self, value: Any) -> Any:
+        if isinstance(value, float):
+            return value
+        return super().bound(value)
+
+
+class FloatColumn(Column):
+    """ Числа с плавающей точкой (None не поддерживается) """
+    typecode = 'd'
+    kind = float
+
+    def __init__(self, nullable: bool = False) -> None:
+        if nullable:
+            raise TypeError('nullable float columns are not supported')
+        super().__init__(nullable)
+
+    def encode(self, value: Any) -> Any:
+        if isinstance(value, int):
+            value = float(value)
+        return super().encode(value)
+
+
+class DatetimeColumn(Column):
+    """ Дата и время в микросекундах от начала эпохи """
+    kind = datetime
+
+    def bound(self, value: Any) -> Any:
+        # дата - полночь, строка - в формате ISO
+        if isinstance(value, (date, str)):
+            value = as_datetime(value)
+        return super().bound(value)
+
+    def _encode(self, value: datetime) -> int:
+        return to_timestamp(value)
+
+    def _decode(self, raw: int) -> datetime:
+        return from_timestamp(raw)
+
+
+class DateColumn(Column):
+    """ Дата в виде порядкового номера дня (date.toordinal) """
+    kind = date
+
+    def bound(self, value: Any) -> Any:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if isinstance(value, datetime):
+            # день входит в интервал, если в него входит полночь этого дня
+            day = value.date()
+            return day.toordinal() + (value > datetime(day.year, day.month, day.day))
+        return super().bound(value)
+
+    def _encode(self, value: date) -> int:
+        return value.toordinal()
+
+    def _decode(self, raw: int) -> date:
+        return date.fromordinal(raw)
+
+
+class StrColumn(Column):
+    """
+    Строки. В массиве хранится индекс строки в таблице уникальных строк,
+    одинаковые строки (например, пустые комментарии) хранятся один раз.
+    Строки из таблицы не удаляются при удалении записей.
+    """
+    typecode = 'i'
+    kind = str
+
+    def __init__(self, nullable: bool = False) -> None:
+        super().__init__(nullable)
+        self.strings: list[str] = []
+        self.index: dict[str, int] = {}
+
+    def encode(self, value: Any) -> Any:
+        if value is None and self.nullable:
+            return -1
+        return super().encode(value)
+
+    def decode(self, raw: Any) -> Any:
+        if raw == -1:
+            return None
+        return self.strings[raw]
+
+    def key(self, value: Any) -> Any:
+        if value is None:
+            return -1 if self.nullable else _NO_MATCH
+        if not isinstance(value, str):
+            return _NO_MATCH
+        return self.index.get(value, _NO_MATCH)
+
+    def _encode(self, value: str) -> int:
+        idx = self.index.get(value)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(value)
+            self.index[value] = idx
+        return idx
+
+
+COLUMN_TYPES: dict[type, type[Column]] = {
+    int: IntColumn,
+    float: FloatColumn,
+    str: StrColumn,
+    datetime: DatetimeColumn,
+    date: DateColumn,
+}
+
+
+def make_column(annotation: Any) -> Column:
+    """
+    Создать столбец по аннотации поля модели.
+    Поддерживаются типы из COLUMN_TYPES и их объединения с None.
+    """
+    nullable = False
+    if get_origin(annotation) in (Union, UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not NoneType]
+        nullable = len(args) < len(get_args(annotation))
+        if len(args) != 1:
+            raise TypeError(f'unsupported field type {annotation}')
+        annotation = args[0]
+    try:
+        return COLUMN_TYPES[annotation](nullable)
+    except KeyError:
+        raise TypeError(f'unsupported field type {annotation}') from None
+
+
+class ColumnarMemoryRepository(AbstractRepository[T]):
+    """
+    Репозиторий, работающий в оперативной памяти. Хранит значения каждого
+    поля в отдельном массиве, запись занимает одну позицию (слот) во всех
+    массивах. Слоты удаленных записей попадают в список свободных
+    и используются повторно.
+
+    В отличие от MemoryRepository, get и get_all возвращают новые объекты,
+    изменения объектов сохраняются только через update.
+    cls - класс модели (dataclass с аннотациями полей и полем pk)
+    """
+
+    def __init__(self, cls: type) -> None:
+        self.cls = cls
+        fields = get_annotations(cls, eval_str=True)
+        fields.pop('pk')
+        self._columns: dict[str, Column] = {
+            name: make_column(annotation) for name, annotation in fields.items()}
+        self._pks = array('q')  # pk записи в слоте, 0 - свободный слот
+        self._slots = array('q', [-1])  # слот записи по pk, -1 - нет записи
+        self._free = array('q')
+        self._ordered = True  # слоты упорядочены по pk
+
+    def _encode(self, obj: T) -> list[Any]:
+        return [col.encode(getattr(obj, name)) for name, col in self._columns.items()]
+
+    def _slot(self, pk: int) -> int:
+        if 0 < pk < len(self._slots):
+            return self._slots[pk]
+        return -1
+
+    def _build(self, slot: int) -> T:
+        values = {name: col.decode(col.data[slot])
+                  for name, col in self._columns.items()}
+        return self.cls(pk=self._pks[slot], **values)  # type: ignore[no-any-return]
+
+    def add(self, obj: T) -> int:
+        if getattr(obj, 'pk', None) != 0:
+            raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        values = self._encode(obj)
+        pk = len(self._slots)
+        if self._free:
+            slot = self._free.pop()
+            self._ordered = False
+            for col, value in zip(self._columns.values(), values):
+                col.data[slot] = value
+            self._pks[slot] = pk
+        else:
+            slot = len(self._pks)
+            for col, value in zip(self._columns.values(), values):
+                col.data.append(value)
+            self._pks.append(pk)
+        self._slots.append(slot)
+        obj.pk = pk
+        return pk
+
+    def get(self, pk: int) -> T | None:
+        slot = self._slot(pk)
+        if slot < 0:
+            return None
+        return self._build(slot)
+
+    def _condition(self, attr: str, value: Any) -> tuple['array[Any]', Any]:
+        if attr == 'pk':
+            return self._pks, value if isinstance(value, int) else _NO_MATCH
+        try:
+            col = self._columns[attr]
+        except KeyError:
+            raise AttributeError(
+                f'{self.cls.__name__} object has no attribute {attr!r}') from None
+        return col.data, col.key(value)
+
+    def _range(self, attr: str, between: Between) -> tuple['array[Any]',
+                                                           Callable[[Any], bool]]:
+        if attr == 'pk':
+            return self._pks, between.__contains__
+        data, _ = self._condition(attr, None)
+        col = self._columns[attr]
+        if isinstance(col, StrColumn):
+            # индексы строк не упорядочены, сравниваются сами строки
+            if not all(bound is None or isinstance(bound, str) for bound in between):
+                raise ValueError(f'cannot compare str values with {between!r}')
+            strings = col.strings
+            return data, lambda raw: raw != -1 and strings[raw] in between
+        bounds = Between(*(None if bound is None else col.bound(bound)
+                           for bound in between))
+        if col.nullable:
+            return data, lambda raw: raw != NULL and raw in bounds
+        return data, bounds.__contains__
+
+    def _select(self, where: dict[str, Any]) -> list[int]:
+        slots: Iterable[int] = range(len(self._pks))
+        for attr, value in where.items():
+            if isinstance(value, Between):
+                data, test = self._range(attr, value)
+                slots = [slot for slot in slots if test(data[slot])]
+                continue
+            data, key = self._condition(attr, value)
+            if key is _NO_MATCH:
+                return []
+            if isinstance(slots, range):
+                slots = list(compress(slots, map(eq, data, repeat(key))))
+            else:
+                slots = [slot for slot in slots if data[slot] == key]
+        pks = self._pks
+        return [slot for slot in slots if pks[slot]]
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        if where is None:
+            slots = list(compress(range(len(self._pks)), self._pks))
+        else:
+            slots = self._select(where)
+        if not self._ordered:
+            slots.sort(key=self._pks.__getitem__)
+        return [self._build(slot) for slot in slots]
+
+    def update(self, obj: T) -> None:
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+        slot = self._slot(obj.pk)
+        if slot < 0:
+            raise KeyError(obj.pk)
+        for col, value in zip(self._columns.values(), self._encode(obj)):
+            col.data[slot] = value
+
+    def put_many(self, objs: Iterable[T]) -> None:
+        for obj in objs:
+            if obj.pk <= 0:
+                raise ValueError(f'trying to put object {obj} without `pk` attribute')
+            values = self._encode(obj)
+            slot = self._slot(obj.pk)
+            if slot >= 0:
+                for col, value in zip(self._columns.values(), values):
+                    col.data[slot] = value
+                continue
+            if obj.pk < len(self._slots):
+                self._ordered = False
+            else:
+                self._slots.extend([-1] * (obj.pk + 1 - len(self._slots)))
+            if self._free:
+                slot = self._free.pop()
+                self._ordered = False
+                for col, value in zip(self._columns.values(), values):
+                    col.data[slot] = value
+                self._pks[slot] = obj.pk
+            else:
+                slot = len(self._pks)
+                for col, value in zip(self._columns.values(), values):
+                    col.data.append(value)
+                self._pks.append(obj.pk)
+            self._slots[obj.pk] = slot
+
+    def delete(self, pk: int) -> None:
+        slot = self._slot(pk)
+        if slot < 0:
+            raise KeyError(pk)
+        self._pks[slot] = 0
+        self._slots[pk] = -1
+        self._free.append(slot)
+
+    def encode_value(self, name: str, value: Any) -> Any:
+        """
+        Закодировать значение поля name так, как оно хранится в массиве
+        (например, datetime - в микросекунды от начала эпохи).
+        """
+        if name == 'pk':
+            return value
+        return self._columns[name].encode(value)
+
+    def raw_rows(self, *names: str) -> Iterator[tuple[Any, ...]]:
+        """
+        Перебрать закодированные значения полей names всех записей
+        без создания объектов модели. Порядок записей не определен.
+        """
+        data = [self._pks if name == 'pk' else self._columns[name].data
+                for name in names]
+        return compress(zip(*data), self._pks)
@@ -0,0 +1,186 @@
+"""
+Модуль описывает сбор статистики вызовов репозиториев
+
+Функция instrument заменяет методы конкретного объекта репозитория обертками,
+которые считают вызовы, время выполнения (гистограмма задержек) и количество
+возвращенных записей, а для SQLiteRepository - собирают тексты запросов,
+выполненных во время вызова (SQLiteRepository.trace_sql). Вызовы дольше
+заданного порога записываются в журнал медленных запросов (логгер
+bookkeeper.repository.slow). Репозитории, для которых instrument
+не вызывалась, не изменяются и работают без накладных расходов.
+"""
+
+import logging
+from bisect import bisect_left
+from collections import deque
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass, field
+from functools import wraps
+from time import perf_counter
+from typing import Any, Callable, NamedTuple
+
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+logger = logging.getLogger('bookkeeper.repository.slow')
+
+# верхние границы интервалов гистограммы задержек, секунды
+BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, float('inf'))
+METHODS = ('add', 'get', 'get_all', 'get_page', 'update', 'update_many', 'delete',
+           'query', 'execute')
+
+
+@dataclass(slots=True)
+class MethodStats:
+    """
+    Статистика вызовов одного метода.
+    calls - количество вызовов
+    total, max - суммарное и максимальное время выполнения, секунды
+    rows - количество возвращенных записей
+    histogram - количество вызовов по интервалам задержек BUCKETS
+    """
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    rows: int = 0
+    histogram: list[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+
+    @property
+    def mean(self) -> float:
+        """ Среднее время выполнения """
+        return self.total / self.calls if self.calls else 0.0
+
+    def record(self, seconds: float, rows: int) -> None:
+        """ Учесть один вызов """
+        self.calls += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.rows += rows
+        self.histogram[bisect_left(BUCKETS, seconds)] += 1
+
+
+class SlowCall(NamedTuple):
+    """ Вызов, выполнявшийся дольше порога """
+    repository: str
+    method: str
+    seconds: float
+    sql: tuple[str, ...]
+
+
+class RepositoryStats:
+    """
+    Статистика вызовов всех инструментированных репозиториев.
+    slow_threshold - порог в секундах для журнала медленных запросов
+    (None - журнал не ведется)
+    keep_slow - сколько последних медленных вызовов хранить в slow_calls
+    """
+
+    def __init__(self, slow_threshold: float | None = None,
+                 keep_slow: int = 100) -> None:
+        self.slow_threshold = slow_threshold
+        self.methods: dict[tuple[str, str], MethodStats] = {}
+        self.slow_calls: deque[SlowCall] = deque(maxlen=keep_slow)
+
+    def record(self, repository: str, method: str, seconds: float, rows: int,
+               sql: list[str]) -> None:
+        """ Учесть вызов метода method репозитория repository """
+        key = (repository, method)
+        stats = self.methods.get(key)
+        if stats is None:
+            stats = self.methods[key] = MethodStats()
+        stats.record(seconds, rows)
+        if self.slow_threshold is not None and seconds >= self.slow_threshold:
+            call = SlowCall(repository, method, seconds, tuple(sql))
+            self.slow_calls.append(call)
+            logger.warning('slow call %s.%s: %.1f ms %s', repository, method,
+                           seconds * 1000, '; '.join(sql))
+
+    def reset(self) -> None:
+        """ Сбросить накопленную статистику """
+        self.methods.clear()
+        self.slow_calls.clear()
+
+    def as_dict(self) -> dict[str, dict[str, Any]]:
+        """ Статистика в виде словаря {'репозиторий.метод': {...}} """
+        return {f'{repo}.{method}': {
+            'calls': s.calls, 'total': s.total, 'mean': s.mean, 'max': s.max,
+            'rows': s.rows, 'histogram': dict(zip(map(str, BUCKETS), s.histogram))}
+            for (repo, method), s in sorted(self.methods.items())}
+
+    def report(self) -> str:
+        """ Текстовый отчет, упорядоченный по суммарному времени """
+        lines = [f'{"method":32} {"calls":>8} {"total ms":>10} {"mean ms":>9} '
+                 f'{"max ms":>9} {"rows":>9}']
+        for (repo, method), s in sorted(self.methods.items(),
+                                        key=lambda item: -item[1].total):
+            lines.append(f'{repo + "." + method:32} {s.calls:8d} '
+                         f'{s.total * 1000:10.1f} {s.mean * 1000:9.2f} '
+                         f'{s.max * 1000:9.2f} {s.rows:9d}')
+        for call in self.slow_calls:
+            lines.append(f'slow: {call.repository}.{call.method} '
+                         f'{call.seconds * 1000:.1f} ms {"; ".join(call.sql)}')
+        return '\n'.join(lines)
+
+
+def _rows(result: Any) -> int:
+    if isinstance(result, list):
+        return len(result)
+    if result is None or isinstance(result, int):
+        return 0
+    return 1
+
+
+def _wrap(repo: AbstractRepository[Any], name: str, method: Callable[..., Any],
+          stats: RepositoryStats, label: str) -> Callable[..., Any]:
+    @wraps(method)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        tracing: AbstractContextManager[list[str]] = (
+            repo.trace_sql() if isinstance(repo, SQLiteRepository) else nullcontext([]))
+        with tracing as sql:
+            started = perf_counter()
+            result = None
+            try:
+                result = method(*args, **kwargs)
+                return result
+            finally:
+                stats.record(label, name, perf_counter() - started, _rows(result), sql)
+
+    return wrapper
+
+
+def instrument(repo: AbstractRepository[Any], stats: RepositoryStats,
+               label: str | None = None) -> AbstractRepository[Any]:
+    """
+    Начать сбор статистики вызовов методов репозитория.
+    Методы заменяются у переданного объекта, поэтому все существующие
+    ссылки на репозиторий начинают учитываться в stats.
+
+    Parameters
+    ----------
+    repo - репозиторий
+    stats - объект для накопления статистики
+    label - название репозитория в отчете (по умолчанию - имя класса
+    и таблицы или класса модели)
+
+    Returns
+    -------
+    Тот же объект repo
+    """
+    if label is None:
+        label = type(repo).__name__
+        table = getattr(repo, 'table_name', None) or getattr(
+            getattr(repo, 'cls', None), '__name__', None)
+        if table:
+            label = f'{label}[{table}]'
+    for name in METHODS:
+        method = getattr(repo, name, None)
+        if method is not None and name not in vars(repo):
+            setattr(repo, name, _wrap(repo, name, method, stats, label))
+    return repo
+
+
+def uninstrument(repo: AbstractRepository[Any]) -> AbstractRepository[Any]:
+    """ Прекратить сбор статистики и вернуть исходные методы """
+    for name in METHODS:
+        vars(repo).pop(name, None)
+    return repo
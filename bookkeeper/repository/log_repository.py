@@ -0,0 +1,360 @@
+"""
+Модуль описывает репозиторий, записывающий изменения в журнал (log) на диске
+
+Каждое добавление, изменение и удаление дописывается в конец файла журнала
+записью: размер данных, контрольная сумма CRC32, операция, pk и значения
+полей объекта (JSON). В оперативной памяти хранится только индекс
+pk -> смещение последней записи объекта в журнале, объекты читаются
+из файла при обращении к ним. Последовательная запись в конец файла
+не требует транзакций, поэтому добавление записей намного быстрее,
+чем в sqlite с отдельной транзакцией на каждую запись.
+
+Контрольная точка (файл {журнал}.ckpt) - сохраненный индекс и смещение
+в журнале, до которого он построен. При открытии журнала загружается
+контрольная точка и воспроизводится только хвост журнала после нее;
+оборванная при сбое последняя запись отбрасывается.
+
+Сжатие (compact) переписывает журнал, оставляя только последние записи
+существующих объектов. Оно выполняется в фоновом потоке, когда доля
+устаревших записей превышает compact_ratio, и не блокирует запись:
+изменения, сделанные во время сжатия, переносятся в новый журнал.
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+from array import array
+from inspect import get_annotations
+from typing import Any, Iterable
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T, matches
+from bookkeeper.repository.columnar_repository import Column, StrColumn, make_column
+
+MAGIC = b'BKLOG001'
+CHECKPOINT_MAGIC = b'BKCKP001'
+ADD, UPDATE, DELETE = 1, 2, 3
+
+_FILE_HEADER = struct.Struct('=8sQ')  # сигнатура, поколение журнала
+_RECORD = struct.Struct('=IIBq')  # размер данных, CRC32, операция, pk
+_CHECKPOINT = struct.Struct('=8sQQQQ')  # сигнатура, поколение, смещение, pk, мусор
+_MIN_COMPACT_SIZE = 1 << 20
+# в Windows файл без O_BINARY открывается в текстовом режиме
+_FLAGS = os.O_RDWR | os.O_APPEND | getattr(os, 'O_BINARY', 0)
+_READ_FLAGS = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+
+
+def _read_at(fd: int, size: int, offset: int) -> bytes:
+    """
+    Прочитать до size байт файла fd со смещения offset. В отличие
+    от os.pread (есть только в POSIX) сдвигает позицию в файле, поэтому
+    вызывается под блокировкой репозитория или на отдельном дескрипторе.
+    Журнал открыт с O_APPEND, поэтому запись от позиции не зависит.
+    """
+    os.lseek(fd, offset, os.SEEK_SET)
+    chunks = []
+    while size > 0:
+        chunk = os.read(fd, size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _crc(op: int, pk: int, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(struct.pack('=Bq', op, pk)))
+
+
+def replay(data: bytes, base: int, offsets: 'array[int]', sizes: 'array[int]'
+           ) -> tuple[int, int, int]:
+    """
+    Применить записи журнала из data (начинающиеся со смещения base
+    в файле) к индексу offsets/sizes (смещение и размер последней записи
+    по pk, -1 - объекта нет). Возвращает количество прочитанных байт
+    (до первой неполной или поврежденной записи), количество записей
+    и размер устаревших записей в байтах.
+    """
+    pos = count = dead = 0
+    while pos + _RECORD.size <= len(data):
+        size, crc, op, pk = _RECORD.unpack_from(data, pos)
+        end = pos + _RECORD.size + size
+        if (end > len(data) or op not in (ADD, UPDATE, DELETE) or pk <= 0
+                or crc != _crc(op, pk, data[pos + _RECORD.size:end])):
+            break
+        while len(offsets) <= pk:
+            offsets.append(-1)
+            sizes.append(0)
+        if offsets[pk] >= 0:
+            dead += _RECORD.size + sizes[pk]
+        if op == DELETE:
+            offsets[pk] = -1
+            dead += end - pos
+        else:
+            offsets[pk] = base + pos
+            sizes[pk] = size
+        pos = end
+        count += 1
+    return pos, count, dead
+
+
+class LogRepository(AbstractRepository[T]):
+    """
+    Репозиторий с хранением изменений в журнале на диске.
+    path - файл журнала (создается, если не существует)
+    cls - класс модели (dataclass с аннотациями полей и полем pk)
+    checkpoint_every - через сколько операций записывать контрольную точку
+    compact_ratio - доля устаревших записей в журнале, при превышении
+    которой запускается фоновое сжатие (None - только вызовом compact)
+
+    Как и в ColumnarMemoryRepository, get и get_all возвращают новые
+    объекты, изменения сохраняются только через update. Запись в журнал
+    выполняется сразу (сохраняется при аварийном завершении программы),
+    на диск данные гарантированно сбрасываются в контрольной точке
+    и при закрытии (close).
+    """
+
+    def __init__(self, path: str, cls: type, checkpoint_every: int = 100_000,
+                 compact_ratio: float | None = 0.5) -> None:
+        self.path = path
+        self.cls = cls
+        fields = get_annotations(cls, eval_str=True)
+        fields.pop('pk')
+        self._columns: dict[str, Column] = {
+            name: make_column(annotation) for name, annotation in fields.items()}
+        self.checkpoint_every = checkpoint_every
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compaction: threading.Thread | None = None
+        self._offsets = array('q', [-1])  # смещение записи по pk, -1 - нет объекта
+        self._sizes = array('I', [0])  # размер данных записи по pk
+        self._dead = 0  # размер устаревших записей в байтах
+        self._since_checkpoint = 0
+        self._fd = os.open(path, _FLAGS | os.O_CREAT)
+        self._end = os.lseek(self._fd, 0, os.SEEK_END)
+        if self._end == 0:
+            self._end = os.write(self._fd, _FILE_HEADER.pack(MAGIC, 0))
+        magic, self.generation = _FILE_HEADER.unpack(
+            _read_at(self._fd, _FILE_HEADER.size, 0).ljust(_FILE_HEADER.size, b'\0'))
+        if magic != MAGIC:
+            os.close(self._fd)
+            raise ValueError(f'{path} is not a log file')
+        self.replayed = self._recover()
+
+    @property
+    def checkpoint_path(self) -> str:
+        """ Файл контрольной точки """
+        return f'{self.path}.ckpt'
+
+    def _load_checkpoint(self) -> int:
+        """ Загрузить индекс из контрольной точки, вернуть ее смещение в журнале """
+        try:
+            with open(self.checkpoint_path, 'rb') as file:
+                data = file.read()
+            magic, generation, offset, next_pk, dead = _CHECKPOINT.unpack_from(data)
+        except (OSError, struct.error):
+            return _FILE_HEADER.size
+        if (magic != CHECKPOINT_MAGIC or generation != self.generation
+                or offset > self._end
+                or len(data) != _CHECKPOINT.size + 12 * next_pk):
+            return _FILE_HEADER.size
+        start = _CHECKPOINT.size
+        self._offsets = array('q', data[start:start + 8 * next_pk])
+        self._sizes = array('I', data[start + 8 * next_pk:])
+        self._dead = dead
+        return offset  # type: ignore[no-any-return]
+
+    def _recover(self) -> int:
+        """ Восстановить индекс: контрольная точка и хвост журнала после нее """
+        start = self._load_checkpoint()
+        data = _read_at(self._fd, self._end - start, start)
+        used, count, dead = replay(data, start, self._offsets, self._sizes)
+        self._dead += dead
+        if start + used < self._end:
+            os.ftruncate(self._fd, start + used)
+            self._end = start + used
+        return count
+
+    def checkpoint(self) -> None:
+        """ Сбросить журнал на диск и записать контрольную точку """
+        with self._lock:
+            os.fsync(self._fd)
+            data = (_CHECKPOINT.pack(CHECKPOINT_MAGIC, self.generation, self._end,
+                                     len(self._offsets), self._dead)
+                    + self._offsets.tobytes() + self._sizes.tobytes())
+            tmp = f'{self.checkpoint_path}.tmp'
+            with open(tmp, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp, self.checkpoint_path)
+            self._since_checkpoint = 0
+
+    def close(self) -> None:
+        """ Дождаться фонового сжатия, записать контрольную точку и закрыть журнал """
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+        with self._lock:
+            if self._fd < 0:
+                return
+            self.checkpoint()
+            os.close(self._fd)
+            self._fd = -1
+
+    def _encode(self, obj: T) -> bytes:
+        values = [getattr(obj, name) if isinstance(col, StrColumn)
+                  else col.encode(getattr(obj, name))
+                  for name, col in self._columns.items()]
+        return json.dumps(values, ensure_ascii=False).encode()
+
+    def _record(self, op: int, pk: int, payload: bytes = b'') -> bytes:
+        return _RECORD.pack(len(payload), _crc(op, pk, payload), op, pk) + payload
+
+    def _append(self, records: list[tuple[int, int, bytes]]) -> None:
+        """ Дописать записи (операция, pk, данные) в журнал и обновить индекс """
+        with self._lock:
+            data = b''.join(self._record(op, pk, payload) for op, pk, payload in records)
+            os.write(self._fd, data)
+            _, count, dead = replay(data, self._end, self._offsets, self._sizes)
+            self._end += len(data)
+            self._dead += dead
+            self._since_checkpoint += count
+            if self._since_checkpoint >= self.checkpoint_every:
+                self.checkpoint()
+            if (self.compact_ratio is not None and self._compaction is None
+                    and self._end > _MIN_COMPACT_SIZE
+                    and self._dead > self.compact_ratio * self._end):
+                self._compaction = threading.Thread(target=self._compact_background,
+                                                    daemon=True)
+                self._compaction.start()
+
+    def add(self, obj: T) -> int:
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """ Добавить несколько объектов одной записью в журнал """
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        payloads = [self._encode(obj) for obj in objs]
+        with self._lock:
+            first = len(self._offsets)
+            self._append([(ADD, first + i, payload)
+                          for i, payload in enumerate(payloads)])
+        for i, obj in enumerate(objs):
+            obj.pk = first + i
+        return [obj.pk for obj in objs]
+
+    def _read(self, pk: int) -> T | None:
+        with self._lock:
+            offset = self._offsets[pk] if 0 < pk < len(self._offsets) else -1
+            if offset < 0:
+                return None
+            size = self._sizes[pk]
+            data = _read_at(self._fd, size, offset + _RECORD.size)
+        values = {name: value if isinstance(col, StrColumn) else col.decode(value)
+                  for (name, col), value in zip(self._columns.items(), json.loads(data))}
+        return self.cls(pk=pk, **values)  # type: ignore[no-any-return]
+
+    def get(self, pk: int) -> T | None:
+        return self._read(pk)
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        with self._lock:
+            pks = [pk for pk, offset in enumerate(self._offsets) if offset >= 0]
+        objs = [obj for obj in map(self._read, pks) if obj is not None]
+        if where is None:
+            return objs
+        return [obj for obj in objs if matches(obj, where)]
+
+    def _check_exists(self, pk: int) -> None:
+        if not 0 < pk < len(self._offsets) or self._offsets[pk] < 0:
+            raise KeyError(pk)
+
+    def update(self, obj: T) -> None:
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить несколько объектов одной записью в журнал """
+        records = []
+        with self._lock:
+            for obj in objs:
+                if obj.pk == 0:
+                    raise ValueError('attempt to update object with unknown primary key')
+                self._check_exists(obj.pk)
+                records.append((UPDATE, obj.pk, self._encode(obj)))
+            self._append(records)
+
+    def put_many(self, objs: Iterable[T]) -> None:
+        """ Сохранить объекты с заданными pk одной записью в журнал """
+        records = []
+        for obj in objs:
+            if obj.pk <= 0:
+                raise ValueError(f'trying to put object {obj} without `pk` attribute')
+            records.append((ADD, obj.pk, self._encode(obj)))
+        self._append(records)
+
+    def delete(self, pk: int) -> None:
+        with self._lock:
+            self._check_exists(pk)
+            self._append([(DELETE, pk, b'')])
+
+    def _compact_background(self) -> None:
+        try:
+            self.compact()
+        finally:
+            self._compaction = None
+
+    def compact(self) -> None:
+        """
+        Переписать журнал, оставив только последние записи существующих
+        объектов. Записи копируются без блокировки репозитория, изменения,
+        сделанные за это время, затем дописываются в новый журнал.
+        """
+        with self._compact_lock:
+            with self._lock:
+                if self._fd < 0:
+                    return
+                end = self._end
+                offsets, sizes = self._offsets[:], self._sizes[:]
+                generation = self.generation + 1
+                # свой дескриптор: копирование без блокировки не сдвигает
+                # позицию self._fd, с которого читают get и get_all
+                reader = os.open(self.path, _READ_FLAGS)
+            new_offsets = array('q', [-1]) * len(offsets)
+            new_sizes = array('I', [0]) * len(sizes)
+            tmp = f'{self.path}.compact'
+            try:
+                with open(tmp, 'wb') as file:
+                    pos = file.write(_FILE_HEADER.pack(MAGIC, generation))
+                    for pk, offset in enumerate(offsets):
+                        if offset >= 0:
+                            record = _read_at(reader, _RECORD.size + sizes[pk], offset)
+                            new_offsets[pk], new_sizes[pk] = pos, sizes[pk]
+                            pos += file.write(record)
+                with self._lock:
+                    tail = _read_at(reader, self._end - end, end)
+                    os.close(reader)
+                    reader = -1
+                    with open(tmp, 'ab') as file:
+                        file.write(tail)
+                        file.flush()
+                        os.fsync(file.fileno())
+                    _, _, dead = replay(tail, pos, new_offsets, new_sizes)
+                    # в Windows нельзя заменить открытый файл
+                    os.close(self._fd)
+                    try:
+                        os.replace(tmp, self.path)
+                    finally:
+                        self._fd = os.open(self.path, _FLAGS)
+                    self._offsets, self._sizes = new_offsets, new_sizes
+                    self._end, self._dead = pos + len(tail), dead
+                    self.generation = generation
+                    self.checkpoint()
+            finally:
+                if reader >= 0:
+                    os.close(reader)
@@ -3,27 +3,94 @@
 """
 
 from itertools import count
-from typing import Any
+from typing import Any, Iterable, MutableMapping
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.abstract_repository import (AbstractRepository, Between,
+                                                       T, matches)
+from bookkeeper.repository.snapshot import Snapshot, write_snapshot
+
+
+class _FieldIndex:
+    """ Индекс поля: значение -> pk записей с этим значением """
+
+    def __init__(self, name: str, objs: Iterable[Any]) -> None:
+        self.name = name
+        self.pks: dict[Any, set[int]] = {}
+        self.values: dict[int, Any] = {}
+        for obj in objs:
+            self.put(obj)
+
+    def put(self, obj: Any) -> None:
+        """ Учесть объект (после добавления или изменения) """
+        self.remove(obj.pk)
+        value = getattr(obj, self.name)
+        self.values[obj.pk] = value
+        self.pks.setdefault(value, set()).add(obj.pk)
+
+    def remove(self, pk: int) -> None:
+        """ Перестать учитывать объект с данным pk """
+        if pk not in self.values:
+            return
+        value = self.values.pop(pk)
+        pks = self.pks[value]
+        pks.discard(pk)
+        if not pks:
+            del self.pks[value]
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+    Данные можно сохранить в файл снимка (save_snapshot) и открыть
+    из него (load_snapshot), см. модуль snapshot.
+    Для полей, по которым создан индекс (ensure_column_index), get_all
+    с условием на равенство выбирает записи по индексу, без перебора
+    (изменения объектов учитываются индексом после update).
     """
 
     def __init__(self) -> None:
-        self._container: dict[int, T] = {}
+        self._container: MutableMapping[int, T] = {}
         self._counter = count(1)
+        self._indexes: dict[str, _FieldIndex] = {}
+
+    @classmethod
+    def load_snapshot(cls, path: str, model: type) -> 'MemoryRepository[T]':
+        """
+        Открыть репозиторий из файла снимка объектов модели model.
+        Файл отображается в память, записи читаются при обращении к ним,
+        изменения не записываются в файл до вызова save_snapshot.
+        """
+        repo = cls()
+        snapshot: Snapshot[T] = Snapshot(path, model)
+        repo._container = snapshot
+        repo._counter = count(snapshot.next_pk)
+        return repo
+
+    def save_snapshot(self, path: str, model: type) -> int:
+        """
+        Записать все объекты (модели model) в файл снимка,
+        вернуть количество записей
+        """
+        next_pk = next(self._counter)
+        self._counter = count(next_pk)
+        return write_snapshot(path, model, self._container.values(), next_pk)
+
+    def ensure_column_index(self, name: str) -> None:
+        """ Создать индекс поля name, если его еще нет """
+        if name not in self._indexes:
+            self._indexes[name] = _FieldIndex(name, self._container.values())
+
+    def _put(self, obj: T) -> None:
+        self._container[obj.pk] = obj
+        for index in self._indexes.values():
+            index.put(obj)
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
-        pk = next(self._counter)
-        self._container[pk] = obj
-        obj.pk = pk
-        return pk
+        obj.pk = next(self._counter)
+        self._put(obj)
+        return obj.pk
 
     def get(self, pk: int) -> T | None:
         return self._container.get(pk)
@@ -31,13 +98,28 @@ class MemoryRepository(AbstractRepository[T]):
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
         if where is None:
             return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+        for name, value in where.items():
+            if name in self._indexes and not isinstance(value, Between):
+                pks = self._indexes[name].pks.get(value, ())
+                return [obj for obj in map(self._container.__getitem__, sorted(pks))
+                        if matches(obj, where)]
+        return [obj for obj in self._container.values() if matches(obj, where)]
 
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
-        self._container[obj.pk] = obj
+        self._put(obj)
+
+    def put_many(self, objs: Iterable[T]) -> None:
+        next_pk = next(self._counter)
+        for obj in objs:
+            if obj.pk <= 0:
+                raise ValueError(f'trying to put object {obj} without `pk` attribute')
+            self._put(obj)
+            next_pk = max(next_pk, obj.pk + 1)
+        self._counter = count(next_pk)
 
     def delete(self, pk: int) -> None:
         self._container.pop(pk)
+        for index in self._indexes.values():
+            index.remove(pk)
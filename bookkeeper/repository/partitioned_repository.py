@@ -0,0 +1,374 @@
+"""
+Модуль описывает репозиторий sqlite, разделяющий записи по периодам времени
+
+Записи хранятся в отдельных таблицах-секциях по месяцам или годам значения
+поля даты (например, expense_2023_03 или expense_2023). Запросы get_all
+с условием на это поле (равенство или Between) выполняются только по
+секциям, пересекающимся с заданным интервалом, поэтому выборка за текущий
+месяц не зависит от объема истории. Для запросов без ограничения по дате
+и для произвольного SQL поддерживается представление (VIEW) с именем
+таблицы, объединяющее все секции.
+
+pk общие для всех секций: они выдаются таблицей {таблица}_pk, в которой
+для каждой записи хранится название ее секции. Шаблоны триггеров
+(create_trigger) хранятся в таблице {таблица}_triggers и применяются
+к каждой новой секции.
+"""
+
+import re
+import sqlite3
+from datetime import date, datetime
+from typing import Any
+
+from bookkeeper.repository.abstract_repository import Between, T
+from bookkeeper.repository.sqlite_repository import (SQLiteRepository, compile_statements,
+                                                     render_trigger)
+from bookkeeper.utils import as_date, to_epoch_seconds
+
+PERIODS = ('month', 'year')
+
+
+class PartitionedSQLiteRepository(SQLiteRepository[T]):
+    """
+    Репозиторий sqlite с секционированием записей по периодам.
+    partition_by - поле даты (date или datetime), по которому выбирается
+    секция; значение None не допускается
+    period - длина периода секции: 'month' или 'year'
+    Остальные параметры - как у SQLiteRepository.
+
+    Количество секций в одном запросе ограничено настройкой sqlite
+    SQLITE_MAX_COMPOUND_SELECT (по умолчанию 500, то есть около 40 лет
+    помесячных секций).
+    """
+
+    def __init__(self, db_file: str, cls: type, table_name: str | None = None,
+                 partition_by: str = 'expense_date', period: str = 'month',
+                 track_changes: bool = False, epoch_seconds: bool | None = None):
+        if period not in PERIODS:
+            raise ValueError(f'period must be one of {PERIODS}, got {period!r}')
+        super().__init__(db_file, cls, table_name, track_changes, epoch_seconds)
+        if partition_by not in self.fields:
+            raise AttributeError(f'{cls.__name__} object has no attribute '
+                                 f'{partition_by!r}')
+        self.partition_by = partition_by
+        self.period = period
+        self.pk_table = f'{self.table_name}_pk'
+        self.trigger_table = f'{self.table_name}_triggers'
+        suffix = r'_(\d{4})_(\d{2})' if period == 'month' else r'_(\d{4})()'
+        self._pattern = re.compile(re.escape(self.table_name) + suffix)
+        self._partitions: dict[str, tuple[int, int]] = {}
+        self._schema_version = -1
+        self._indexes: dict[str, str] = {}
+
+    def partition_name(self, value: date | str) -> str:
+        """ Название секции для значения поля даты """
+        day = as_date(value)
+        if day is None:
+            raise ValueError(f'{self.partition_by} is required for partitioning')
+        if self.period == 'month':
+            return f'{self.table_name}_{day.year:04d}_{day.month:02d}'
+        return f'{self.table_name}_{day.year:04d}'
+
+    def partitions(self) -> list[str]:
+        """
+        Названия существующих секций в хронологическом порядке.
+        Список перечитывается, только если изменилась схема базы данных.
+        """
+        con = self._connect()
+        version = con.execute('PRAGMA schema_version').fetchone()[0]
+        if version != self._schema_version:
+            self._partitions = {}
+            for name, in con.execute("SELECT name FROM sqlite_master "
+                                     "WHERE type = 'table' ORDER BY name"):
+                found = self._pattern.fullmatch(name)
+                if found:
+                    year, month = int(found[1]), int(found[2] or 1)
+                    start = date(year, month, 1)
+                    end = (date(year + 1, 1, 1) if self.period == 'year' or month == 12
+                           else date(year, month + 1, 1))
+                    self._partitions[name] = (to_epoch_seconds(start),
+                                              to_epoch_seconds(end))
+            self._schema_version = version
+        return list(self._partitions)
+
+    def partitions_for(self, low: date | datetime | str | None = None,
+                       high: date | datetime | str | None = None) -> list[str]:
+        """
+        Секции, пересекающиеся с полуинтервалом дат [low, high)
+        (None - без ограничения с этой стороны).
+        """
+        names = self.partitions()
+        low_s = None if low is None else to_epoch_seconds(low)
+        high_s = None if high is None else to_epoch_seconds(high)
+        return [name for name in names
+                if (high_s is None or self._partitions[name][0] < high_s)
+                and (low_s is None or self._partitions[name][1] > low_s)]
+
+    def _routed(self, where: dict[str, Any]) -> list[str]:
+        condition = where.get(self.partition_by)
+        if condition is None:
+            return self.partitions()
+        if isinstance(condition, Between):
+            return self.partitions_for(condition.low, condition.high)
+        name = self.partition_name(condition)
+        return [name] if name in self.partitions() else []
+
+    def _union(self, names: list[str], clause: str = '') -> str:
+        where = f' WHERE {clause}' if clause else ''
+        return ' UNION ALL '.join(f'SELECT * FROM {name}{where}' for name in names)
+
+    def source(self, low: date | datetime | None = None,
+               high: date | datetime | None = None) -> str:
+        """
+        Подзапрос, объединяющий секции, пересекающиеся с интервалом [low, high),
+        для подстановки в FROM вместо названия таблицы.
+        """
+        names = self.partitions_for(low, high)
+        if not names:
+            return f'(SELECT * FROM {self.table_name} LIMIT 0)'
+        if len(names) == 1:
+            return names[0]
+        return f'({self._union(names)})'
+
+    def create_table(self) -> None:
+        """
+        Создать таблицу pk, таблицу шаблонов триггеров и представление,
+        объединяющее секции. Секции создаются при добавлении первой
+        записи периода.
+        """
+        with self._connect() as con:
+            con.execute(f'CREATE TABLE IF NOT EXISTS {self.pk_table} '
+                        '(pk INTEGER PRIMARY KEY AUTOINCREMENT, part TEXT NOT NULL)')
+            self._create_trigger_table(con)
+            self._create_view(con)
+
+    def _create_trigger_table(self, con: sqlite3.Connection) -> None:
+        con.execute(f'CREATE TABLE IF NOT EXISTS {self.trigger_table} '
+                    '(name TEXT PRIMARY KEY, sql TEXT NOT NULL)')
+
+    def _create_view(self, con: sqlite3.Connection) -> None:
+        names = self.partitions()
+        if names:
+            body = self._union(names)
+        else:
+            # пустое представление с теми же столбцами
+            body = 'SELECT ' + ', '.join(
+                f'CAST(NULL AS {self._column_type(name) or "BLOB"}) AS {name}'
+                if name != 'pk' else 'CAST(NULL AS INTEGER) AS pk'
+                for name in self.columns) + ' LIMIT 0'
+        con.execute(f'DROP VIEW IF EXISTS {self.table_name}')
+        con.execute(f'CREATE VIEW {self.table_name} AS {body}')
+
+    def _ensure_partition(self, con: sqlite3.Connection, name: str) -> None:
+        if name in self._partitions or name in self.partitions():
+            return
+        columns = ', '.join('pk INTEGER PRIMARY KEY' if column == 'pk'
+                            else f'{column} {self._column_type(column)}'.rstrip()
+                            for column in self.columns)
+        con.execute(f'CREATE TABLE IF NOT EXISTS {name} ({columns})')
+        indexes = {f'{self.partition_by}_idx': self.partition_by, **self._indexes}
+        for index, expression in indexes.items():
+            con.execute(f'CREATE INDEX IF NOT EXISTS {name}_{index} '
+                        f'ON {name} ({expression})')
+        self._apply_triggers(con, name)
+        self._create_view(con)
+
+    def ensure_index(self, name: str, expression: str) -> None:
+        """
+        Создать индекс во всех секциях (с названием {секция}_{name}),
+        в том числе в секциях, которые будут созданы этим репозиторием.
+        """
+        self._indexes[name] = expression
+        with self._connect() as con:
+            for part in self.partitions():
+                con.execute(f'CREATE INDEX IF NOT EXISTS {part}_{name} '
+                            f'ON {part} ({expression})')
+
+    def ensure_column_index(self, column: str) -> None:
+        if column != self.partition_by:
+            self.ensure_index(f'{column}_idx', column)
+
+    def _create_trigger(self, con: sqlite3.Connection, name: str, sql: str) -> None:
+        """
+        Создать триггер во всех секциях (с названием {секция}_{name}).
+        Шаблон сохраняется в базе данных, поэтому триггер создается и в
+        секциях, которые будут созданы позже любым репозиторием этой таблицы.
+        """
+        self._create_trigger_table(con)
+        con.execute(f'INSERT OR REPLACE INTO {self.trigger_table} VALUES (?, ?)',
+                    (name, sql))
+        for part in self.partitions():
+            con.execute(render_trigger(sql, part, name))
+
+    def has_trigger(self, name: str) -> bool:
+        return bool(self.execute(f'SELECT 1 FROM {self.trigger_table} WHERE name = ?',
+                                 (name,)))
+
+    def _apply_triggers(self, con: sqlite3.Connection, part: str) -> None:
+        """ Создать в секции part триггеры по всем сохраненным шаблонам """
+        for name, sql in con.execute(
+                f'SELECT name, sql FROM {self.trigger_table}').fetchall():
+            con.execute(render_trigger(sql, part, name))
+
+    def migrate_to_epoch(self) -> int:
+        """
+        Перевести все секции на хранение полей типа datetime числом секунд
+        от начала эпохи (см. SQLiteRepository.migrate_to_epoch). Секции
+        пересоздаются в одной транзакции, индексы секций сохраняются,
+        триггеры создаются заново по шаблонам (см. create_trigger),
+        представление тоже создается заново.
+
+        Returns
+        -------
+        Количество перенесенных строк
+        """
+        self.epoch_seconds = bool(self.datetime_columns)
+        if not self.epoch_seconds:
+            return 0
+        count = 0
+        with self._connect() as con:
+            # без явного BEGIN команды до первого INSERT выполнились бы
+            # вне транзакции
+            con.execute('BEGIN')
+            con.execute(f'DROP VIEW IF EXISTS {self.table_name}')
+            for name in self.partitions():
+                count += self._rebuild_epoch(con, name, 'pk INTEGER PRIMARY KEY')
+                self._apply_triggers(con, name)
+            self._create_view(con)
+        for name in self.datetime_columns:
+            self.ensure_column_index(name)
+        return count
+
+    def _part(self, con: sqlite3.Connection, pk: int) -> str | None:
+        row = con.execute(f'SELECT part FROM {self.pk_table} WHERE pk = ?',
+                          (pk,)).fetchone()
+        return None if row is None else row[0]
+
+    def _insert(self, con: sqlite3.Connection, name: str, obj: T) -> None:
+        self._ensure_partition(con, name)
+        con.execute(compile_statements(self.cls, name).insert_pk,
+                    self._values(obj, self.columns))
+
+    def _add(self, con: sqlite3.Connection, obj: T) -> int:
+        if getattr(obj, 'pk', None) != 0:
+            raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        name = self.partition_name(getattr(obj, self.partition_by))
+        cur = con.execute(f'INSERT INTO {self.pk_table} (part) VALUES (?)', (name,))
+        assert cur.lastrowid is not None
+        obj.pk = cur.lastrowid
+        self._insert(con, name, obj)
+        self._remember(obj)
+        return obj.pk
+
+    def _put(self, con: sqlite3.Connection, obj: T) -> None:
+        if obj.pk <= 0:
+            raise ValueError(f'trying to put object {obj} without `pk` attribute')
+        if self._part(con, obj.pk) is not None:
+            # все поля записываются заново, как при обновлении без отслеживания
+            self._forget(obj)
+            self._update(con, obj)
+            return
+        name = self.partition_name(getattr(obj, self.partition_by))
+        con.execute(f'INSERT INTO {self.pk_table} (pk, part) VALUES (?, ?)',
+                    (obj.pk, name))
+        self._insert(con, name, obj)
+        self._remember(obj)
+
+    def get(self, pk: int) -> T | None:
+        con = self._connect()
+        name = self._part(con, pk)
+        if name is None:
+            return None
+        row = con.execute(compile_statements(self.cls, name).select, (pk,)).fetchone()
+        return None if row is None else self._to_object(row)
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        where = where or {}
+        names = self._routed(where)
+        if not names:
+            return []
+        if self.epoch_seconds:
+            where = self.encode_where(where)
+        clause, params = self.statements.condition(where) if where else ('', [])
+        return self._select(f'{self._union(names, clause)} ORDER BY pk',
+                            params * len(names))
+
+    def get_page(self, limit: int, before: int | None = None) -> list[T]:
+        # страница pk выбирается по таблице pk, записи - из их секций
+        con = self._connect()
+        condition = '' if before is None else 'WHERE pk < ? '
+        params = [] if before is None else [before]
+        parts: dict[str, list[int]] = {}
+        for pk, part in con.execute(f'SELECT pk, part FROM {self.pk_table} {condition}'
+                                    'ORDER BY pk DESC LIMIT ?', params + [limit]):
+            parts.setdefault(part, []).append(pk)
+        if not parts:
+            return []
+        sql = ' UNION ALL '.join(
+            f'SELECT * FROM {part} WHERE pk IN ({", ".join("?" * len(pks))})'
+            for part, pks in parts.items())
+        return self._select(f'{sql} ORDER BY pk DESC',
+                            [pk for pks in parts.values() for pk in pks])
+
+    def _update(self, con: sqlite3.Connection, obj: T) -> None:
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+        old = self._part(con, obj.pk)
+        if old is None:
+            raise KeyError(obj.pk)
+        new = self.partition_name(getattr(obj, self.partition_by))
+        if new == old:
+            names, values = self._changes(obj)
+            if names:
+                values = [self.encode_value(name, value)
+                          for name, value in zip(names, values)]
+                con.execute(compile_statements(self.cls, old).update_columns(
+                    tuple(names)), values + [obj.pk])
+        else:
+            # запись переносится в секцию нового периода
+            con.execute(compile_statements(self.cls, old).delete, (obj.pk,))
+            self._insert(con, new, obj)
+            con.execute(f'UPDATE {self.pk_table} SET part = ? WHERE pk = ?',
+                        (new, obj.pk))
+        self._remember(obj)
+
+    def delete(self, pk: int) -> None:
+        with self._connect() as con:
+            name = self._part(con, pk)
+            if name is None:
+                raise KeyError(pk)
+            con.execute(compile_statements(self.cls, name).delete, (pk,))
+            con.execute(f'DELETE FROM {self.pk_table} WHERE pk = ?', (pk,))
+
+    def partition_table(self, table: str) -> int:
+        """
+        Перенести в секции все записи существующей таблицы table
+        с теми же столбцами (например, несекционированной таблицы расходов)
+        с сохранением pk. Таблица table не изменяется.
+
+        Returns
+        -------
+        Количество перенесенных записей
+        """
+        fmt = '%Y-%m' if self.period == 'month' else '%Y'
+        value = (f"{self.partition_by}, 'unixepoch'" if self.epoch_seconds
+                 else self.partition_by)
+        key = f"strftime('{fmt}', {value})"
+        columns = ', '.join(self.columns)
+        count = 0
+        self.create_table()
+        with self._connect() as con:
+            periods = [period for period, in con.execute(
+                f'SELECT DISTINCT {key} FROM {table}')]
+            if None in periods:
+                raise ValueError(f'{table} has rows without {self.partition_by}')
+            for period in periods:
+                name = self.partition_name(f'{period}-01-01'[:10])
+                self._ensure_partition(con, name)
+                count += con.execute(f'INSERT INTO {name} ({columns}) SELECT '
+                                     f'{columns} FROM {table} WHERE {key} = ?',
+                                     (period,)).rowcount
+                con.execute(f'INSERT INTO {self.pk_table} (pk, part) '
+                            f'SELECT pk, ? FROM {table} WHERE {key} = ?',
+                            (name, period))
+        return count
@@ -0,0 +1,93 @@
+"""
+Модуль описывает полнотекстовый поиск по текстовому полю записей
+(например, по комментариям расходов) в репозитории sqlite
+
+Индекс - виртуальная таблица FTS5 {таблица}_fts, хранящая только
+словарь (содержимое читается из самой таблицы). Индекс обновляется
+триггерами на добавление, изменение и удаление строк, поэтому изменения
+через репозиторий, архивирование и произвольный SQL учитываются сразу.
+У секционированной таблицы содержимое читается из представления,
+объединяющего секции, а триггеры создаются в каждой секции.
+"""
+
+import re
+from typing import Any
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+# слово, слово* (поиск по началу слова) или "фраза" в кавычках
+_TOKEN = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def search_table(repo: SQLiteRepository[Any]) -> str:
+    """ Название таблицы полнотекстового индекса репозитория """
+    return f'{repo.table_name}_fts'
+
+
+def create_search_index(repo: SQLiteRepository[Any], column: str = 'comment') -> None:
+    """
+    Создать полнотекстовый индекс по столбцу column и триггеры,
+    поддерживающие его, и заполнить индекс существующими строками.
+    Повторный вызов перестраивает индекс (например, после
+    SQLiteRepository.migrate_to_epoch, которая пересоздает таблицу).
+    """
+    table, fts = repo.table_name, search_table(repo)
+    if column not in repo.fields:
+        raise AttributeError(f'{repo.cls.__name__} object has no attribute {column!r}')
+    repo.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5('
+                 f"{column}, content='{table}', content_rowid='pk', "
+                 "tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    delete = (f"INSERT INTO {fts} ({fts}, rowid, {column}) "
+              f"VALUES ('delete', old.pk, old.{column});")
+    insert = f'INSERT INTO {fts} (rowid, {column}) VALUES (new.pk, new.{column});'
+    triggers = {
+        'fts_insert': f'AFTER INSERT ON $table BEGIN {insert} END',
+        'fts_delete': f'AFTER DELETE ON $table BEGIN {delete} END',
+        'fts_update': f'AFTER UPDATE OF pk, {column} ON $table '
+                      f'BEGIN {delete} {insert} END',
+    }
+    for name, body in triggers.items():
+        repo.create_trigger(name, f'CREATE TRIGGER IF NOT EXISTS $trigger {body}')
+    repo.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def match_query(text: str) -> str:
+    """
+    Запрос FTS5 из строки поиска: слова ищутся целиком, слово со звездочкой
+    в конце (моло*) - по началу слова, текст в кавычках - как фраза.
+    Все части запроса должны встречаться в тексте. Спецсимволы FTS5
+    (AND, OR, NEAR, двоеточие и др.) не интерпретируются.
+    """
+    parts = []
+    for phrase, word in _TOKEN.findall(text):
+        prefix = word.endswith('*')
+        term = (phrase or word.rstrip('*')).replace('"', '')
+        if term.strip():
+            parts.append(f'"{term}"' + ('*' if prefix else ''))
+    return ' '.join(parts)
+
+
+def search(repo: SQLiteRepository[T], text: str, where: dict[str, Any] | None = None,
+           limit: int | None = None) -> list[T]:
+    """
+    Найти записи по строке поиска (см. match_query), наиболее
+    подходящие - первыми (ранжирование bm25).
+    where - дополнительные условия на поля, как в get_all
+    (например, категория и Between по дате)
+    limit - наибольшее количество записей
+    """
+    query = match_query(text)
+    if not query:
+        return []
+    table, fts = repo.table_name, search_table(repo)
+    where = repo.encode_where(where or {})
+    clause, params = repo.statements.condition(where) if where else ('', [])
+    sql = (f'SELECT {table}.* FROM {table} JOIN (SELECT rowid, rank FROM {fts} '
+           f'WHERE {fts} MATCH ?) AS hits ON hits.rowid = {table}.pk')
+    if clause:
+        sql += f' WHERE {clause}'
+    sql += ' ORDER BY hits.rank'
+    if limit is not None:
+        sql += f' LIMIT {int(limit)}'
+    return repo.query(sql, [query, *params])
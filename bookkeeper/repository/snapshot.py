@@ -0,0 +1,185 @@
+"""
+Модуль описывает файл снимка (snapshot) данных репозитория в оперативной памяти
+
+Формат файла (порядок байтов - как у компьютера, записавшего файл):
+    заголовок: сигнатура, количество записей, следующий pk,
+    количество строк, длина описания полей, описание полей (JSON)
+    pk записей по возрастанию - массив 64-битных целых
+    записи фиксированной длины - значения полей, закодированные как
+    в ColumnarMemoryRepository (целые, даты и время - 64-битные целые,
+    строки - номер строки в таблице уникальных строк)
+    смещения строк в куче - массив 64-битных целых (строк + 1)
+    куча строк - строки в кодировке UTF-8 подряд
+
+Файл открывается через mmap: загрузка снимка читает только заголовок,
+запись декодируется в объект модели при первом обращении к ней.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from inspect import get_annotations
+from typing import Any, Iterable, Iterator, MutableMapping
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.columnar_repository import Column, StrColumn, make_column
+
+MAGIC = b'BKSNAP01'
+_HEADER = struct.Struct('=8sQQQI')
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+def _columns(cls: type) -> dict[str, Column]:
+    fields = get_annotations(cls, eval_str=True)
+    fields.pop('pk')
+    return {name: make_column(annotation) for name, annotation in fields.items()}
+
+
+def write_snapshot(path: str, cls: type, objs: Iterable[Any], next_pk: int) -> int:
+    """
+    Записать объекты модели cls в файл снимка path, вернуть количество
+    записей. next_pk - pk, который получит следующий добавленный объект.
+    Файл заменяется атомарно, поэтому можно перезаписать снимок,
+    из которого загружен репозиторий.
+    """
+    columns = _columns(cls)
+    record = struct.Struct('=' + ''.join(col.typecode for col in columns.values()))
+    pks = array('q')
+    rows = []
+    for obj in sorted(objs, key=lambda obj: obj.pk):
+        pks.append(obj.pk)
+        rows.append([col.encode(getattr(obj, name)) for name, col in columns.items()])
+    # строки всех столбцов хранятся в одной куче подряд, поэтому
+    # к номеру строки в таблице столбца добавляется начало этой таблицы
+    bases = []
+    strings: list[bytes] = []
+    for col in columns.values():
+        bases.append(len(strings) if isinstance(col, StrColumn) else None)
+        if isinstance(col, StrColumn):
+            strings.extend(string.encode() for string in col.strings)
+    records = bytearray()
+    for row in rows:
+        records += record.pack(*(value if base is None or value == -1 else value + base
+                                 for value, base in zip(row, bases)))
+    offsets = array('q', [0])
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    meta = json.dumps({'byteorder': sys.byteorder, 'fields': [
+        [name, col.typecode, col.nullable] for name, col in columns.items()]}).encode()
+    header = _HEADER.pack(MAGIC, len(pks), next_pk, len(strings), len(meta)) + meta
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as file:
+        file.write(header.ljust(_align(len(header)), b'\0'))
+        file.write(pks.tobytes())
+        file.write(records.ljust(_align(len(records)), b'\0'))
+        file.write(offsets.tobytes())
+        file.write(b''.join(strings))
+    os.replace(tmp, path)
+    return len(pks)
+
+
+class Snapshot(MutableMapping[int, T]):
+    """
+    Словарь {pk: объект} поверх файла снимка для MemoryRepository.
+    Записи декодируются при первом обращении и запоминаются, добавленные,
+    измененные и удаленные записи хранятся в оперативной памяти,
+    файл не изменяется. Порядок перебора - записи снимка по возрастанию pk,
+    затем добавленные после загрузки.
+    """
+
+    def __init__(self, path: str, cls: type) -> None:
+        self.cls = cls
+        with open(path, 'rb') as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, self.next_pk, n_strings, meta_len = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a snapshot file')
+        meta = json.loads(self._mm[_HEADER.size:_HEADER.size + meta_len])
+        self._columns = _columns(cls)
+        fields: list[list[Any]] = [[name, col.typecode, col.nullable]
+                                   for name, col in self._columns.items()]
+        if meta['byteorder'] != sys.byteorder or meta['fields'] != fields:
+            raise ValueError(f'snapshot {path} does not match {cls.__name__} '
+                             f'on this machine')
+        self._record = struct.Struct('=' + ''.join(code for _, code, _ in fields))
+        view = memoryview(self._mm)
+        offset = _align(_HEADER.size + meta_len)
+        self._pks = view[offset:offset + 8 * count].cast('q')
+        self._records_start = offset + 8 * count
+        offset = _align(self._records_start + self._record.size * count)
+        self._offsets = view[offset:offset + 8 * (n_strings + 1)].cast('q')
+        self._heap_start = offset + 8 * (n_strings + 1)
+        self._decoded: dict[int, T] = {}
+        self._added: dict[int, T] = {}
+        self._deleted: set[int] = set()
+
+    def _index(self, pk: int) -> int:
+        """ Номер записи с данным pk в файле или -1 """
+        i = bisect_left(self._pks, pk)
+        return i if i < len(self._pks) and self._pks[i] == pk else -1
+
+    def _string(self, raw: int) -> str | None:
+        if raw == -1:
+            return None
+        start = self._heap_start + self._offsets[raw]
+        end = self._heap_start + self._offsets[raw + 1]
+        return self._mm[start:end].decode()
+
+    def _decode(self, i: int) -> T:
+        raw = self._record.unpack_from(self._mm, self._records_start
+                                       + i * self._record.size)
+        values = {name: self._string(value) if isinstance(col, StrColumn)
+                  else col.decode(value)
+                  for (name, col), value in zip(self._columns.items(), raw)}
+        return self.cls(pk=self._pks[i], **values)  # type: ignore[no-any-return]
+
+    def __getitem__(self, pk: int) -> T:
+        if pk in self._added:
+            return self._added[pk]
+        obj = self._decoded.get(pk)
+        if obj is not None:
+            return obj
+        i = self._index(pk)
+        if i < 0 or pk in self._deleted:
+            raise KeyError(pk)
+        obj = self._decoded[pk] = self._decode(i)
+        return obj
+
+    def __setitem__(self, pk: int, obj: T) -> None:
+        if self._index(pk) < 0:
+            self._added[pk] = obj
+        else:
+            self._decoded[pk] = obj
+            self._deleted.discard(pk)
+
+    def __delitem__(self, pk: int) -> None:
+        if pk in self._added:
+            del self._added[pk]
+        elif self._index(pk) < 0 or pk in self._deleted:
+            raise KeyError(pk)
+        else:
+            self._decoded.pop(pk, None)
+            self._deleted.add(pk)
+
+    def __iter__(self) -> Iterator[int]:
+        deleted = self._deleted
+        for pk in self._pks:
+            if pk not in deleted:
+                yield pk
+        yield from self._added
+
+    def __len__(self) -> int:
+        return len(self._pks) - len(self._deleted) + len(self._added)
+
+    def __contains__(self, pk: object) -> bool:
+        if pk in self._added:
+            return True
+        return (isinstance(pk, int) and pk not in self._deleted
+                and self._index(pk) >= 0)
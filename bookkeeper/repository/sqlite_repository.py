@@ -1,34 +1,466 @@
-from typing import Any
+from typing import Any, Iterable, Iterator, Sequence, Union, get_args, get_origin
+from types import NoneType, UnionType
 from inspect import get_annotations
-from datetime import datetime
+from datetime import datetime, date
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from string import Template
+import os
+import threading
+import weakref
 
 import sqlite3
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.abstract_repository import AbstractRepository, Between, T
+from bookkeeper.utils import from_epoch_seconds, to_epoch_seconds
+
+SQL_TYPES: dict[type, str] = {
+    int: 'INTEGER',
+    float: 'REAL',
+    str: 'TEXT',
+    datetime: 'TEXT',
+    date: 'TEXT',
+}
+
+# размер кэша подготовленных запросов каждого соединения
+CACHED_STATEMENTS = 256
+
+
+def base_type(annotation: Any) -> Any:
+    """
+    Тип поля модели без учета None: для X | None - X,
+    для объединения нескольких типов - None.
+    """
+    if get_origin(annotation) in (Union, UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not NoneType]
+        return args[0] if len(args) == 1 else None
+    return annotation
+
+
+def sql_type(annotation: Any) -> str:
+    """
+    Тип столбца sqlite для аннотации поля модели.
+    Для объединения с None используется тип второго аргумента.
+    """
+    return SQL_TYPES.get(base_type(annotation), '')
+
+
+class Statements:
+    """
+    Тексты запросов к таблице модели, построенные один раз.
+    Все значения передаются параметрами, поэтому текст запроса не зависит
+    от значений и подготовленный запрос переиспользуется кэшем соединения.
+    table_name - название таблицы
+    columns - названия столбцов в порядке полей модели
+    """
+
+    def __init__(self, table_name: str, columns: Sequence[str]) -> None:
+        self.table_name = table_name
+        self.columns = tuple(columns)
+        self.fields = tuple(name for name in columns if name != 'pk')
+        self.select_all = f'SELECT * FROM {table_name}'
+        self.select = f'{self.select_all} WHERE pk = ?'
+        self.insert = (f'INSERT INTO {table_name} ({", ".join(self.fields)}) '
+                       f'VALUES ({", ".join("?" * len(self.fields))})')
+        self.insert_pk = (f'INSERT INTO {table_name} ({", ".join(self.columns)}) '
+                          f'VALUES ({", ".join("?" * len(self.columns))})')
+        self.delete = f'DELETE FROM {table_name} WHERE pk = ?'
+        self._updates: dict[tuple[str, ...], str] = {}
+        self._filters: dict[tuple[tuple[str, Any], ...], str] = {}
+        self.update = self.update_columns(self.fields)
+
+    def update_columns(self, names: tuple[str, ...]) -> str:
+        """ UPDATE столбцов names строки с заданным pk """
+        sql = self._updates.get(names)
+        if sql is None:
+            assignments = ', '.join(f'{name} = ?' for name in names)
+            sql = self._updates[names] = (f'UPDATE {self.table_name} '
+                                          f'SET {assignments} WHERE pk = ?')
+        return sql
+
+    def where(self, conditions: dict[str, Any]) -> tuple[str, list[Any]]:
+        """
+        SELECT строк, у которых значения столбцов равны заданным
+        (None - значение NULL) или лежат в интервалах Between,
+        и параметры этого запроса.
+        """
+        if not conditions:
+            return self.select_all, []
+        clause, params = self.condition(conditions)
+        return f'{self.select_all} WHERE {clause}', params
+
+    def condition(self, conditions: dict[str, Any]) -> tuple[str, list[Any]]:
+        """ Условие WHERE для словаря условий (см. where) и его параметры """
+        key = tuple((name, _shape(value)) for name, value in conditions.items())
+        clause = self._filters.get(key)
+        if clause is None:
+            for name in conditions:
+                if name not in self.columns:
+                    raise AttributeError(f'{self.table_name} has no column {name}')
+            clause = self._filters[key] = ' AND '.join(
+                _clause(name, shape) for name, shape in key)
+        params: list[Any] = []
+        for value in conditions.values():
+            if isinstance(value, Between):
+                params.extend(bound for bound in value if bound is not None)
+            elif value is not None:
+                params.append(value)
+        return clause, params
+
+
+def _shape(value: Any) -> Any:
+    # вид условия, определяющий текст запроса
+    if isinstance(value, Between):
+        return value.low is not None, value.high is not None
+    return value is None
+
+
+def _clause(name: str, shape: Any) -> str:
+    if shape is True:
+        return f'{name} IS NULL'
+    if shape is False:
+        return f'{name} = ?'
+    low, high = shape
+    parts = ([f'{name} >= ?'] if low else []) + ([f'{name} < ?'] if high else [])
+    return ' AND '.join(parts) or f'{name} IS NOT NULL'
+
+
+@lru_cache(maxsize=None)
+def compile_statements(cls: type, table_name: str) -> Statements:
+    """ Запросы для модели cls, общие для всех ее репозиториев """
+    return Statements(table_name, list(get_annotations(cls, eval_str=True)))
+
+
+def render_trigger(sql: str, table: str, name: str) -> str:
+    """
+    Текст триггера name таблицы table по шаблону sql
+    (см. SQLiteRepository.create_trigger)
+    """
+    return Template(sql).substitute(trigger=f'{table}_{name}', table=table)
+
+
+class _Connections(threading.local):
+    """ Открытые соединения текущего потока по имени файла базы данных """
+
+    def __init__(self) -> None:
+        self.by_file: dict[str, sqlite3.Connection] = {}
+        # списки, в которые собираются запросы (см. SQLiteRepository.trace_sql)
+        self.traces: dict[str, list[list[str]]] = {}
+
+
+_connections = _Connections()
+
+
+def _forget_connections() -> None:
+    # соединения, открытые до fork, нельзя использовать в дочернем процессе
+    _connections.by_file = {}
+    _connections.traces = {}
+
+
+if hasattr(os, 'register_at_fork'):  # только POSIX
+    os.register_at_fork(after_in_child=_forget_connections)
+
+
+def shared_connection(db_file: str) -> sqlite3.Connection:
+    """
+    Соединение с базой данных, общее для всех репозиториев текущего потока,
+    работающих с этим файлом. Кэш подготовленных запросов соединения
+    используется всеми этими репозиториями.
+    """
+    con = _connections.by_file.get(db_file)
+    if con is None:
+        con = sqlite3.connect(db_file, cached_statements=CACHED_STATEMENTS)
+        con.execute('PRAGMA foreign_keys = ON')
+        _connections.by_file[db_file] = con
+    return con
+
+
+def close_connections() -> None:
+    """ Закрыть все соединения текущего потока """
+    for con in _connections.by_file.values():
+        con.close()
+    _connections.by_file.clear()
 
 
 class SQLiteRepository(AbstractRepository[T]):
-    def __init__(self, db_file: str, cls: type):
+    """
+    Репозиторий, хранящий объекты в таблице базы данных sqlite.
+    db_file - файл базы данных
+    cls - класс модели, порядок полей которого совпадает
+    с порядком столбцов таблицы
+    table_name - название таблицы (по умолчанию - имя класса модели)
+    track_changes - запоминать значения полей загруженных объектов,
+    чтобы update записывал только измененные поля (значения хранятся,
+    пока существует объект; объекты без слабых ссылок обновляются целиком)
+    epoch_seconds - хранить поля типа datetime в столбцах INTEGER числом
+    секунд от начала эпохи (см. migrate_to_epoch); по умолчанию формат
+    определяется по типу столбцов существующей таблицы
+    """
+    def __init__(self, db_file: str, cls: type, table_name: str | None = None,
+                 track_changes: bool = False, epoch_seconds: bool | None = None):
         self.cls: type = cls
         self.db_file: str = db_file
-        self.table_name: str = cls.__name__.lower()
+        self.table_name: str = table_name or cls.__name__.lower()
         self.fields = get_annotations(cls, eval_str=True)
+        self.columns: list[str] = list(self.fields)
         self.fields.pop('pk')
+        self.statements = compile_statements(cls, self.table_name)
+        self.track_changes = track_changes
+        # id объекта -> (слабая ссылка на объект, pk, значения полей)
+        self._loaded: dict[int, tuple[weakref.ref[Any], int, tuple[Any, ...]]] = {}
+        self.datetime_columns = [name for name, annotation in self.fields.items()
+                                 if base_type(annotation) is datetime]
+        if epoch_seconds is None:
+            types = dict(self.execute(f'SELECT name, type FROM '
+                                      f'pragma_table_info(\'{self.table_name}\')'))
+            epoch_seconds = any(types.get(name, '').upper() == 'INTEGER'
+                                for name in self.datetime_columns)
+        self.epoch_seconds = epoch_seconds and bool(self.datetime_columns)
+        self._epoch_positions = [self.columns.index(name)
+                                 for name in self.datetime_columns]
+
+    def _remember(self, obj: T) -> T:
+        """ Запомнить значения полей объекта для отслеживания изменений """
+        if self.track_changes:
+            key = id(obj)
+            try:
+                ref = weakref.ref(obj, partial(self._expire, key))
+            except TypeError:
+                return obj
+            self._loaded[key] = (ref, obj.pk,
+                                 tuple(getattr(obj, name) for name in self.fields))
+        return obj
+
+    def _expire(self, key: int, ref: weakref.ref[Any]) -> None:
+        # объект удален сборщиком мусора
+        entry = self._loaded.get(key)
+        if entry is not None and entry[0] is ref:
+            del self._loaded[key]
+
+    def _forget(self, obj: T) -> None:
+        """ Не отслеживать изменения объекта до следующей загрузки """
+        self._loaded.pop(id(obj), None)
+
+    def _to_object(self, row: tuple[Any]) -> T:
+        """ Создать объект модели из строки таблицы """
+        if not self.epoch_seconds:
+            return self._remember(self.cls(*self.convert_object_datetime(row)))
+        values = list(row)
+        for i in self._epoch_positions:
+            if isinstance(values[i], int):
+                values[i] = from_epoch_seconds(values[i])
+        return self._remember(self.cls(*values))
+
+    def encode_value(self, name: str, value: Any) -> Any:
+        """
+        Значение поля name в том виде, в котором оно хранится в таблице,
+        для подстановки в запросы. Даты и время при хранении числом секунд
+        (date, datetime или строка ISO) переводятся в секунды,
+        остальные значения не изменяются.
+        """
+        if (self.epoch_seconds and name in self.datetime_columns
+                and value is not None and not isinstance(value, int)):
+            return to_epoch_seconds(value)
+        return value
+
+    def encode_where(self, where: dict[str, Any]) -> dict[str, Any]:
+        """ Условие get_all со значениями, закодированными encode_value """
+        return {name: Between(*(self.encode_value(name, bound) for bound in value))
+                if isinstance(value, Between) else self.encode_value(name, value)
+                for name, value in where.items()}
+
+    def _values(self, obj: T, names: Iterable[str]) -> list[Any]:
+        return [self.encode_value(name, getattr(obj, name)) for name in names]
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Соединение с базой данных (см. shared_connection) """
+        return shared_connection(self.db_file)
+
+    @contextmanager
+    def trace_sql(self) -> Iterator[list[str]]:
+        """
+        Собирать в список тексты запросов, которые текущий поток выполняет
+        через общее соединение с файлом базы данных (см. shared_connection),
+        до выхода из блока with. Блоки можно вкладывать; после выхода
+        из внешнего блока соединение работает без трассировки.
+        """
+        con = self._connect()
+        active = _connections.traces.setdefault(self.db_file, [])
+        sql: list[str] = []
+        if not active:
+            def collect(text: str) -> None:
+                for trace in active:
+                    trace.append(text)
+            con.set_trace_callback(collect)
+        active.append(sql)
+        try:
+            yield sql
+        finally:
+            active.pop()
+            if not active:
+                con.set_trace_callback(None)
+
+    def create_table(self) -> None:
+        """
+        Создать таблицу для модели, если она еще не существует.
+        Порядок столбцов совпадает с порядком полей модели,
+        pk - автоинкрементный первичный ключ.
+        """
+        columns = ', '.join(
+            'pk INTEGER PRIMARY KEY AUTOINCREMENT' if name == 'pk'
+            else f'{name} {self._column_type(name)}'.rstrip()
+            for name in self.columns)
+        with self._connect() as con:
+            con.execute(f'CREATE TABLE IF NOT EXISTS {self.table_name} ({columns})')
+        if self.epoch_seconds:
+            for name in self.datetime_columns:
+                self.ensure_column_index(name)
+
+    def _column_type(self, name: str) -> str:
+        if self.epoch_seconds and name in self.datetime_columns:
+            return 'INTEGER'
+        return sql_type(self.fields[name])
+
+    def ensure_index(self, name: str, expression: str) -> None:
+        """
+        Создать индекс, если он еще не существует.
+        name - название индекса
+        expression - список столбцов или выражений индекса
+        """
+        with self._connect() as con:
+            con.execute(f'CREATE INDEX IF NOT EXISTS {name} '
+                        f'ON {self.table_name} ({expression})')
+
+    def ensure_column_index(self, column: str) -> None:
+        """
+        Создать индекс {таблица}_{column}_idx, если в таблице еще нет
+        индекса, первый столбец которого - column.
+        """
+        indexes = self.execute(
+            'SELECT 1 FROM pragma_index_list(?) AS list, pragma_index_info(list.name) '
+            'AS info WHERE info.seqno = 0 AND info.name = ?',
+            (self.table_name, column))
+        if not indexes:
+            self.ensure_index(f'{self.table_name}_{column}_idx', column)
+
+    def create_trigger(self, name: str, sql: str) -> None:
+        """
+        Создать триггер таблицы, если его еще нет.
+        name - название триггера без названия таблицы: триггер
+        называется {таблица}_{name}
+        sql - текст CREATE TRIGGER IF NOT EXISTS, в котором $trigger
+        заменяется названием триггера, а $table - названием таблицы
+        """
+        with self._connect() as con:
+            self._create_trigger(con, name, sql)
+
+    def _create_trigger(self, con: sqlite3.Connection, name: str, sql: str) -> None:
+        con.execute(render_trigger(sql, self.table_name, name))
+
+    def has_trigger(self, name: str) -> bool:
+        """ Создан ли триггер name (см. create_trigger) """
+        return bool(self.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+                                 'AND name = ?', (f'{self.table_name}_{name}',)))
+
+    def migrate_to_epoch(self) -> int:
+        """
+        Перевести существующую таблицу с датами в виде текста на хранение
+        полей типа datetime числом секунд от начала эпохи. Таблица
+        пересоздается в одной транзакции, индексы таблицы сохраняются,
+        на столбцы дат создаются индексы. Строки, которые sqlite не может
+        разобрать как дату, превращаются в NULL. После миграции
+        репозиторий работает в новом формате.
+
+        Returns
+        -------
+        Количество перенесенных строк
+        """
+        self.epoch_seconds = bool(self.datetime_columns)
+        if not self.epoch_seconds:
+            return 0
+        with self._connect() as con:
+            count = self._rebuild_epoch(con, self.table_name,
+                                        'pk INTEGER PRIMARY KEY AUTOINCREMENT')
+        for name in self.datetime_columns:
+            self.ensure_column_index(name)
+        return count
+
+    def _rebuild_epoch(self, con: sqlite3.Connection, table: str, primary: str) -> int:
+        """
+        Пересоздать таблицу table со столбцами дат типа INTEGER и перенести
+        в нее строки, преобразовав даты в секунды. Индексы таблицы
+        и последний выданный pk сохраняются. primary - определение столбца pk.
+        """
+        new_table = f'{table}_epoch'
+        columns = ', '.join(self.columns)
+        converted = ', '.join(
+            f"CAST(strftime('%s', {name}) AS INTEGER)"
+            if name in self.datetime_columns else name for name in self.columns)
+        indexes = [sql for sql, in con.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' "
+            'AND tbl_name = ? AND sql IS NOT NULL', (table,))]
+        sequence = con.execute('SELECT seq FROM sqlite_sequence WHERE name = ?',
+                               (table,)).fetchone()
+        definition = ', '.join(
+            primary if name == 'pk' else f'{name} {self._column_type(name)}'.rstrip()
+            for name in self.columns)
+        con.execute(f'CREATE TABLE {new_table} ({definition})')
+        count: int = con.execute(f'INSERT INTO {new_table} ({columns}) '
+                                 f'SELECT {converted} FROM {table}').rowcount
+        con.execute(f'DROP TABLE {table}')
+        con.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+        if sequence is not None:
+            con.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) '
+                        'WHERE name = ?', (sequence[0], table))
+        for sql in indexes:
+            con.execute(sql)
+        return count
+
+    def source(self, low: date | datetime | None = None,
+               high: date | datetime | None = None) -> str:
+        """
+        Название таблицы (или подзапрос) для подстановки в FROM запроса
+        по строкам с датами в интервале [low, high). Для SQLiteRepository -
+        всегда сама таблица, секционированные репозитории возвращают
+        только подходящие секции.
+        """
+        return self.table_name
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> list[tuple[Any, ...]]:
+        """
+        Выполнить произвольный запрос и вернуть все полученные строки.
+        """
+        with self._connect() as con:
+            return con.execute(sql, params).fetchall()
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> list[T]:
+        """
+        Выполнить запрос SELECT, возвращающий все столбцы таблицы в порядке
+        полей модели (например, SELECT * FROM ...), и вернуть список объектов.
+        """
+        return self._select(sql, params)
+
+    def _select(self, sql: str, params: Sequence[Any]) -> list[T]:
+        rows = self._connect().execute(sql, params).fetchall()
+        return [self._to_object(row) for row in rows]
 
     def add(self, obj: T) -> int:
+        with self._connect() as con:
+            self._add(con, obj)
+        return obj.pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """ Добавить несколько объектов в одной транзакции """
+        with self._connect() as con:
+            return [self._add(con, obj) for obj in objs]
+
+    def _add(self, con: sqlite3.Connection, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
-        names = ', '.join(self.fields.keys())
-        placeholders = ', '.join('?' * len(self.fields))
-        values = [getattr(obj, i) for i in self.fields]
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(f'INSERT INTO {self.table_name} ({names}) '
-                        f'VALUES ({placeholders})', values)
-            con.commit()
-            obj.pk = cur.lastrowid
-        con.close()
+        pk = con.execute(self.statements.insert, self._values(obj, self.fields)).lastrowid
+        assert pk is not None
+        obj.pk = pk
+        self._remember(obj)
         return obj.pk
 
     def convert_object_datetime(self, temp: list[T] | tuple[T]) -> tuple[T]:
@@ -36,7 +468,7 @@ class SQLiteRepository(AbstractRepository[T]):
         converted_temp: tuple = tuple()
         for i, element in enumerate(temp):
             try:
-                converted_temp += (list(obj.__annotations__.values())[i](elememt),)
+                converted_temp += (list(obj.__annotations__.values())[i](element),)
             except TypeError:
                 if isinstance(temp[i], datetime):
                     converted_temp += (list(obj.__annotations__.values(
@@ -48,54 +480,74 @@ class SQLiteRepository(AbstractRepository[T]):
         return converted_temp
 
     def get(self, pk: int) -> T | None:
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            res = cur.execute(f'SELECT * FROM {self.table_name} WHERE pk = {pk}')
-            temp = res.fetchone()
-        con.close()
+        temp = self._connect().execute(self.statements.select, (pk,)).fetchone()
         if temp is None:
             return None
-        return self.cls(*self.convert_object_datetime(temp))
+        return self._to_object(temp)
 
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            res = cur.execute(f'SELECT * FROM {self.table_name}')
-        if where is None:
-            return [self.cls(*self.convert_object_datetime(temp))
-                    for temp in res.fetchall()]
-        objects = []
-        for temp in res.fetchall():
-            obj = self.cls(*self.convert_object_datetime(temp))
-            if all([getattr(obj, attr) == value for attr, value in where.items()]):
-                objects.append(obj)
-        con.close()
-        return objects
+        if where and self.epoch_seconds:
+            where = self.encode_where(where)
+        sql, params = self.statements.where(where or {})
+        return self._select(sql, params)
 
-    def update(self, obj: T) -> None:
+    def get_page(self, limit: int, before: int | None = None) -> list[T]:
+        if before is None:
+            return self._select(f'SELECT * FROM {self.table_name} '
+                                'ORDER BY pk DESC LIMIT ?', (limit,))
+        return self._select(f'SELECT * FROM {self.table_name} WHERE pk < ? '
+                            'ORDER BY pk DESC LIMIT ?', (before, limit))
+
+    def _changes(self, obj: T) -> tuple[list[str], list[Any]]:
+        """
+        Названия и значения полей, которые нужно записать при обновлении obj.
+        Без отслеживания изменений - все поля, иначе - только поля,
+        отличающиеся от загруженных из базы данных значений.
+        """
+        values = [getattr(obj, name) for name in self.fields]
+        entry = self._loaded.get(id(obj)) if self.track_changes else None
+        if entry is None or entry[0]() is not obj or entry[1] != obj.pk:
+            return list(self.fields), values
+        loaded = entry[2]
+        changed = [i for i, (old, new) in enumerate(zip(loaded, values)) if old != new]
+        names = list(self.fields)
+        return [names[i] for i in changed], [values[i] for i in changed]
+
+    def _update(self, con: sqlite3.Connection, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
-        names = list(self.fields.keys())
-        values = [getattr(obj, i) for i in self.fields]
-        pk = obj.pk
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            for i, element in enumerate(names):
-                try:
-                    cur.execute(f'UPDATE {self.table_name} SET {element}'
-                                f' = {repr(values[i])} WHERE pk = {pk}')
-                except sqlite3.OperationalError:
-                    cur.execute(f'UPDATE {self.table_name} SET {element}'
-                                f' = {repr(str(values[i]))} WHERE pk = {pk}')
-            con.commit()
-        con.close()
+        names, values = self._changes(obj)
+        values = [self.encode_value(name, value) for name, value in zip(names, values)]
+        if names:
+            con.execute(self.statements.update_columns(tuple(names)),
+                        values + [obj.pk])
+        self._remember(obj)
+
+    def update(self, obj: T) -> None:
+        with self._connect() as con:
+            self._update(con, obj)
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах в одной транзакции """
+        with self._connect() as con:
+            for obj in objs:
+                self._update(con, obj)
+
+    def put_many(self, objs: Iterable[T]) -> None:
+        """ Сохранить объекты с заданными pk в одной транзакции """
+        with self._connect() as con:
+            for obj in objs:
+                self._put(con, obj)
+
+    def _put(self, con: sqlite3.Connection, obj: T) -> None:
+        if obj.pk <= 0:
+            raise ValueError(f'trying to put object {obj} without `pk` attribute')
+        values = self._values(obj, self.fields)
+        if con.execute(self.statements.update, values + [obj.pk]).rowcount == 0:
+            con.execute(self.statements.insert_pk, self._values(obj, self.columns))
+        self._remember(obj)
 
     def delete(self, pk: int) -> None:
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            cur.execute(f'DELETE FROM {self.table_name} WHERE pk = {pk}')
-            row_count = cur.rowcount
-            if row_count == 0:
+        with self._connect() as con:
+            if con.execute(self.statements.delete, (pk,)).rowcount == 0:
                 raise KeyError
-            con.commit()
-        con.close()
@@ -0,0 +1,524 @@
+"""
+Локальный HTTP-сервис с JSON API для общего доступа к базе данных.
+
+Несколько клиентов (скрипты, веб-интерфейс) работают с одной базой данных
+через сервис, не открывая файл sqlite самостоятельно. Сервис работает
+на asyncio, запросы к базе данных выполняются в потоках: чтение - в пуле
+из readers потоков (у каждого потока свое соединение, см. shared_connection),
+запись - в одном потоке. Добавления от разных клиентов, пришедшие, пока
+выполняется предыдущая запись, объединяются в одну транзакцию.
+
+Запросы (collection - expenses, categories, budgets или recurring):
+    GET    /{collection}?поле=значение&поле=от..до&limit=100&before=pk
+    GET    /{collection}/{pk}
+    POST   /{collection}          объект или список объектов
+    PUT    /{collection}/{pk}
+    DELETE /{collection}/{pk}     категория удаляется с переносом расходов
+    GET    /reports/spend?start=YYYY-MM-DD&end=YYYY-MM-DD&period=month
+    GET    /budgets/status?day=YYYY-MM-DD
+    POST   /batch                 список запросов {"method", "path", "body"}
+
+Запуск из корня проекта:
+    python -m bookkeeper.server --db bookkeeper/main_db.db --port 8080
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from http import HTTPStatus
+from inspect import get_annotations
+from itertools import groupby
+from typing import Any, Callable
+from urllib.parse import parse_qsl, urlsplit
+
+from bookkeeper.budgeting.evaluation import BudgetEvaluator
+from bookkeeper.budgeting.reports import PERIODS, ReportRunner
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.recurring import RecurringExpense
+from bookkeeper.repository.abstract_repository import Between
+from bookkeeper.repository.cache import QueryCache
+from bookkeeper.repository.cascade import delete_category
+from bookkeeper.repository.sqlite_repository import (SQLiteRepository, base_type,
+                                                     shared_connection)
+
+MODELS: dict[str, type] = {'expenses': Expense, 'categories': Category,
+                           'budgets': Budget, 'recurring': RecurringExpense}
+DEFAULT_PAGE = 100
+MAX_PAGE = 1000
+MAX_BODY = 16 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    """ Ошибка обработки запроса с кодом ответа status """
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+_FIELDS: dict[type, dict[str, Any]] = {}
+
+
+def _fields(cls: type) -> dict[str, Any]:
+    """ Поля модели и их типы без учета None """
+    if cls not in _FIELDS:
+        _FIELDS[cls] = {name: base_type(annotation) for name, annotation
+                        in get_annotations(cls, eval_str=True).items()}
+    return _FIELDS[cls]
+
+
+def encode(obj: Any) -> dict[str, Any]:
+    """ Объект модели в виде словаря для JSON (даты - строки ISO) """
+    result = {}
+    for name in _fields(type(obj)):
+        value = getattr(obj, name)
+        if isinstance(value, datetime):
+            value = value.isoformat(sep=' ')
+        elif isinstance(value, date):
+            value = value.isoformat()
+        result[name] = value
+    return result
+
+
+def _parse(kind: Any, value: Any) -> Any:
+    """
+    Значение поля типа kind из JSON или строки запроса. Даты передаются
+    строками ISO; TypeError, если тип значения JSON не подходит полю.
+    """
+    if value is None or kind is None:
+        return value
+    if kind is int and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if not isinstance(value, str):
+        raise TypeError(f'{kind.__name__} expected, got {type(value).__name__}')
+    if kind is datetime:
+        return datetime.fromisoformat(value)
+    if kind is date:
+        return date.fromisoformat(value[:10])
+    if kind is int:
+        return int(value)
+    return value
+
+
+def decode(cls: type, data: Any, pk: int = 0) -> Any:
+    """ Объект модели cls из словаря JSON (поле pk словаря не учитывается) """
+    if not isinstance(data, dict):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'JSON object expected')
+    fields = _fields(cls)
+    unknown = set(data) - set(fields)
+    if unknown:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f'unknown fields: {sorted(unknown)}')
+    values = {}
+    for name, value in data.items():
+        if name == 'pk':
+            continue
+        try:
+            values[name] = _parse(fields[name], value)
+        except (TypeError, ValueError) as exc:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f'{name}: {exc}') from None
+    try:
+        return cls(**values, pk=pk)
+    except (TypeError, ValueError) as exc:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, str(exc)) from None
+
+
+def parse_where(cls: type, query: dict[str, str]) -> dict[str, Any]:
+    """
+    Условие get_all из параметров строки запроса: поле=значение,
+    поле=null или поле=от..до (полуинтервал, любая граница может быть пустой)
+    """
+    fields = _fields(cls)
+    where: dict[str, Any] = {}
+    for name, value in query.items():
+        if name not in fields:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f'unknown field {name!r}')
+        kind = fields[name]
+        try:
+            if value == 'null':
+                where[name] = None
+            elif '..' in value:
+                low, high = value.split('..', 1)
+                where[name] = Between(_parse(kind, low) if low else None,
+                                      _parse(kind, high) if high else None)
+            else:
+                where[name] = _parse(kind, value)
+        except ValueError as exc:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f'{name}: {exc}') from None
+    return where
+
+
+def _int(query: dict[str, str], name: str, default: int | None) -> int | None:
+    value = query.pop(name, None)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f'{name} must be an integer') from None
+
+
+class Ledger:
+    """
+    Репозитории базы данных и потоки для работы с ними.
+    db_file - файл базы данных (таблицы создаются при необходимости)
+    readers - количество потоков (и соединений) для чтения
+    wal - перевести базу данных в режим журнала WAL, в котором чтение
+    не ждет завершения записи
+    """
+
+    def __init__(self, db_file: str, readers: int = 4, wal: bool = False) -> None:
+        self.db_file = db_file
+        self.repos: dict[str, SQLiteRepository[Any]] = {
+            name: SQLiteRepository[Any](db_file, cls) for name, cls in MODELS.items()}
+        for repo in self.repos.values():
+            repo.create_table()
+        if wal:
+            self.repos['expenses'].execute('PRAGMA journal_mode = WAL')
+        self.cache = QueryCache()
+        self.report_runner = ReportRunner(self.repos['expenses'], workers=1,
+                                          cache=self.cache)
+        self.evaluator = BudgetEvaluator(
+            self.repos['expenses'], self.repos['budgets'],
+            self.repos['categories'], self.repos['recurring'], cache=self.cache)
+        self.readers = ThreadPoolExecutor(readers, thread_name_prefix='bookkeeper-read')
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix='bookkeeper-write')
+        self.commits = 0
+        self._pending: list[tuple[str, list[Any], asyncio.Future[list[int]]]] = []
+        self._flushing = False
+
+    async def read(self, func: Callable[..., Any], *args: Any) -> Any:
+        """ Выполнить func в потоке чтения """
+        return await asyncio.get_running_loop().run_in_executor(self.readers, func, *args)
+
+    async def write(self, func: Callable[..., Any], *args: Any) -> Any:
+        """ Выполнить func в потоке записи """
+        return await asyncio.get_running_loop().run_in_executor(self.writer, func, *args)
+
+    async def add(self, name: str, objs: list[Any]) -> list[int]:
+        """
+        Добавить объекты в коллекцию name. Добавления, ожидающие записи,
+        выполняются одной транзакцией.
+        """
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[list[int]] = loop.create_future()
+        self._pending.append((name, objs, future))
+        if not self._flushing:
+            self._flushing = True
+            loop.create_task(self._flush())
+        return await future
+
+    async def _flush(self) -> None:
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    results = await self.write(self._add_batch, batch)
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+                for (_, _, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self._flushing = False
+
+    def _add_batch(self, batch: list[tuple[str, list[Any], Any]]
+                   ) -> list[list[int] | Exception]:
+        """
+        Добавить объекты всех запросов пакета одной транзакцией. Если она
+        не удалась, запросы выполняются по отдельности, чтобы ошибка
+        одного клиента не отменяла добавления остальных.
+        """
+        try:
+            # pylint: disable=protected-access
+            with shared_connection(self.db_file) as con:
+                for name, objs, _ in batch:
+                    repo = self.repos[name]
+                    for obj in objs:
+                        repo._add(con, obj)
+        except Exception:  # pylint: disable=broad-exception-caught
+            results: list[list[int] | Exception] = []
+            for name, objs, _ in batch:
+                for obj in objs:
+                    obj.pk = 0
+                try:
+                    results.append(self.repos[name].add_many(objs))
+                    self.commits += 1
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    results.append(exc)
+            return results
+        self.commits += 1
+        return [[obj.pk for obj in objs] for _, objs, _ in batch]
+
+    def page(self, name: str, where: dict[str, Any], limit: int,
+             before: int | None) -> list[Any]:
+        """ До limit объектов, удовлетворяющих where, с pk < before, по убыванию pk """
+        repo = self.repos[name]
+        if not where:
+            return repo.get_page(limit, before)
+        if before is not None:
+            where = {**where, 'pk': Between(None, before)}
+        if repo.epoch_seconds:
+            where = repo.encode_where(where)
+        sql, params = repo.statements.where(where)
+        return repo.query(f'{sql} ORDER BY pk DESC LIMIT ?', [*params, limit])
+
+    def update(self, name: str, obj: Any) -> None:
+        """ Обновить объект; KeyError, если его нет """
+        repo = self.repos[name]
+        if repo.get(obj.pk) is None:
+            raise KeyError(obj.pk)
+        repo.update(obj)
+
+    def delete(self, name: str, pk: int) -> dict[str, int]:
+        """ Удалить объект (категорию - с переносом расходов и подкатегорий) """
+        if name == 'categories':
+            moved = delete_category(self.repos['categories'], self.repos['expenses'], pk)
+            return moved._asdict()
+        self.repos[name].delete(pk)
+        return {}
+
+    def spend(self, start: date, end: date, period: str) -> dict[str, dict[str, int]]:
+        """ Траты по категориям за периоды (см. ReportRunner.spend_by_period) """
+        parents = {cat.pk: cat.parent for cat in self.repos['categories'].get_all()}
+        report = self.report_runner.spend_by_period(start, end, period, parents)
+        return {key.isoformat(): {str(category): amount
+                                  for category, amount in totals.items()}
+                for key, totals in report.items()}
+
+    def status(self, day: date | None) -> list[dict[str, Any]]:
+        """ Состояние действующих бюджетов (см. BudgetEvaluator.evaluate) """
+        return [{**status._asdict(), 'start': status.start.isoformat(),
+                 'remaining': status.remaining, 'exceeded': status.exceeded}
+                for status in self.evaluator.evaluate(day)]
+
+    def close(self) -> None:
+        """ Дождаться завершения запросов и остановить потоки """
+        self.readers.shutdown()
+        self.writer.shutdown()
+
+
+class Service:
+    """
+    Обработка запросов HTTP к ledger.
+    """
+
+    def __init__(self, ledger: Ledger) -> None:
+        self.ledger = ledger
+
+    async def respond(self, method: str, target: str,
+                      body: bytes) -> tuple[HTTPStatus, Any]:
+        """ Код ответа и данные ответа (для преобразования в JSON) на запрос """
+        try:
+            try:
+                data = json.loads(body) if body else None
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, 'invalid JSON') from None
+            return await self.dispatch(method, target, data)
+        except HTTPError as exc:
+            return exc.status, {'error': str(exc)}
+        except KeyError as exc:
+            return HTTPStatus.NOT_FOUND, {'error': f'not found: {exc}'}
+        except (TypeError, ValueError) as exc:
+            return HTTPStatus.BAD_REQUEST, {'error': str(exc)}
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(exc)}
+
+    async def dispatch(self, method: str, target: str,
+                       data: Any) -> tuple[HTTPStatus, Any]:
+        """ Выполнить запрос; ошибки передаются исключениями """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        query = dict(parse_qsl(url.query))
+        if parts == ['batch']:
+            _allow(method, 'POST')
+            return HTTPStatus.OK, await self._batch(data)
+        if parts == ['reports', 'spend']:
+            _allow(method, 'GET')
+            return HTTPStatus.OK, await self._spend(query)
+        if parts == ['budgets', 'status']:
+            _allow(method, 'GET')
+            day = date.fromisoformat(query['day']) if 'day' in query else None
+            return HTTPStatus.OK, await self.ledger.read(self.ledger.status, day)
+        if not parts or parts[0] not in MODELS or len(parts) > 2:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f'no such resource: {url.path}')
+        if len(parts) == 1:
+            _allow(method, 'GET', 'POST')
+            if method == 'GET':
+                return HTTPStatus.OK, await self._list(parts[0], query)
+            return HTTPStatus.CREATED, await self._add(parts[0], data)
+        if not parts[1].isdigit():
+            raise HTTPError(HTTPStatus.NOT_FOUND, f'no such resource: {url.path}')
+        _allow(method, 'GET', 'PUT', 'DELETE')
+        return HTTPStatus.OK, await self._item(method, parts[0], int(parts[1]), data)
+
+    async def _spend(self, query: dict[str, str]) -> Any:
+        try:
+            start = date.fromisoformat(query['start'])
+            end = date.fromisoformat(query['end'])
+        except (KeyError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            'start and end (YYYY-MM-DD) are required') from None
+        period = query.get('period', 'month')
+        if period not in PERIODS:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f'period must be one of {PERIODS}')
+        return await self.ledger.read(self.ledger.spend, start, end, period)
+
+    async def _add(self, name: str, data: Any) -> dict[str, Any]:
+        items = data if isinstance(data, list) else [data]
+        objs = [decode(MODELS[name], item) for item in items]
+        pks = await self.ledger.add(name, objs) if objs else []
+        return {'pks': pks} if isinstance(data, list) else {'pk': pks[0]}
+
+    async def _item(self, method: str, name: str, pk: int, data: Any) -> Any:
+        if method == 'GET':
+            obj = await self.ledger.read(self.ledger.repos[name].get, pk)
+            if obj is None:
+                raise KeyError(pk)
+            return encode(obj)
+        if method == 'PUT':
+            obj = decode(MODELS[name], data, pk)
+            await self.ledger.write(self.ledger.update, name, obj)
+            return encode(obj)
+        return await self.ledger.write(self.ledger.delete, name, pk)
+
+    async def _list(self, name: str, query: dict[str, str]) -> dict[str, Any]:
+        limit = min(max(_int(query, 'limit', DEFAULT_PAGE) or 0, 1), MAX_PAGE)
+        before = _int(query, 'before', None)
+        where = parse_where(MODELS[name], query)
+        items = await self.ledger.read(self.ledger.page, name, where, limit, before)
+        return {'items': [encode(obj) for obj in items],
+                'next': items[-1].pk if len(items) == limit else None}
+
+    async def _batch(self, data: Any) -> list[dict[str, Any]]:
+        """
+        Пакет запросов. Подряд идущие запросы с одним методом выполняются
+        одновременно (добавления - одной транзакцией), группы - по порядку.
+        """
+        if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'list of requests expected')
+        result: list[dict[str, Any]] = []
+        for _, group in groupby(data, key=lambda item: item.get('method')):
+            responses = await asyncio.gather(*(
+                self.respond(str(item.get('method', 'GET')), str(item.get('path', '')),
+                             json.dumps(item['body']).encode() if 'body' in item else b'')
+                for item in group))
+            result.extend({'status': status.value, 'body': body}
+                          for status, body in responses)
+        return result
+
+    async def serve_client(self, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter) -> None:
+        """ Обработка запросов одного соединения (HTTP/1.1 keep-alive) """
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as exc:
+                    writer.write(_response(exc.status, {'error': str(exc)}, False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, target, keep_alive, body = request
+                status, payload = await self.respond(method, target, body)
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.Server:
+        """ Начать прием соединений """
+        return await asyncio.start_server(self.serve_client, host, port)
+
+
+def _allow(method: str, *allowed: str) -> None:
+    if method not in allowed:
+        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED,
+                        f'{method} not allowed, expected one of {allowed}')
+
+
+async def _read_request(reader: asyncio.StreamReader
+                        ) -> tuple[str, str, bool, bytes] | None:
+    """ Метод, путь, keep-alive и тело следующего запроса (None - соединение закрыто) """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode('latin1').split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'malformed request line') from None
+    headers = {}
+    while (header := await reader.readline()) not in (b'\r\n', b'\n', b''):
+        name, _, value = header.decode('latin1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'malformed Content-Length') from None
+    if length > MAX_BODY:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'request body too large')
+    body = await reader.readexactly(length) if length else b''
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' and (version == 'HTTP/1.1'
+                                            or connection == 'keep-alive')
+    return method.upper(), target, keep_alive, body
+
+
+def _response(status: HTTPStatus, payload: Any, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    head = (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    return head.encode('latin1') + body
+
+
+async def serve(db_file: str, host: str, port: int, readers: int, wal: bool) -> None:
+    """ Запустить сервис и обрабатывать запросы до остановки """
+    ledger = Ledger(db_file, readers, wal)
+    server = await Service(ledger).start(host, port)
+    address = server.sockets[0].getsockname()
+    print(f'listening on http://{address[0]}:{address[1]}', file=sys.stderr, flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        ledger.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--db', default='main_db.db', help='файл базы данных')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='порт (0 - любой свободный)')
+    parser.add_argument('--readers', type=int, default=4,
+                        help='количество потоков для чтения')
+    parser.add_argument('--wal', action='store_true',
+                        help='перевести базу данных в режим журнала WAL')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.readers, args.wal))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,35 @@
 """
 Простой тестовый скрипт для терминала
+
+Команды:
+    categories - список категорий
+    expenses - список расходов
+    <сумма> <категория> - добавить расход (категория - без учета регистра)
+Пустые строки и строки, начинающиеся с #, пропускаются.
+
+В интерактивном режиме команды читаются из терминала по одной.
+Если указан файл (или '-' для stdin) или stdin перенаправлен,
+включается пакетный режим: расходы записываются группами по --batch-size
+в одной транзакции, ошибки выводятся в stderr с номером строки, в конце
+выводится количество команд и скорость обработки.
+
+Запуск из корня проекта:
+    python -m bookkeeper.simple_client
+    python -m bookkeeper.simple_client --db main_db.db commands.txt
+    cat commands.txt | python -m bookkeeper.simple_client
 """
 
+import argparse
+import sys
+import time
+from typing import Iterable, TextIO
+
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
-from bookkeeper.models.budget import Budget
-from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.category_index import CategoryIndex
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
 from bookkeeper.utils import read_tree
 
-cat_repo = SQLiteRepository[Category]('main_db.db', Category)
-exp_repo = SQLiteRepository[Expense]('main_db.db', Expense)
-bud_repo = SQLiteRepository[Budget]('main_db.db', Budget)
-
 cats = '''
 продукты
     мясо
@@ -25,24 +42,121 @@ cats = '''
 
 # Category.create_from_tree(read_tree(cats), cat_repo)
 
-while True:
-    try:
-        cmd = input('$> ')
-    except EOFError:
-        break
-    if not cmd:
-        continue
-    if cmd == 'categories':
-        print(*cat_repo.get_all(), sep='\n')
-    elif cmd == 'expenses':
-        print(*exp_repo.get_all(), sep='\n')
-    elif cmd[0].isdecimal():
-        amount, name = cmd.split(maxsplit=1)
+
+class Client:
+    """
+    Выполнение команд клиента.
+    db_file - файл базы данных
+    batch_size - количество расходов, записываемых в одной транзакции
+    (1 - каждый расход записывается и выводится сразу)
+    out - поток для вывода результатов команд
+
+    Категории загружаются один раз в индекс в оперативной памяти
+    (см. CategoryIndex), поэтому поиск категории не обращается к базе данных.
+    """
+
+    def __init__(self, db_file: str, batch_size: int = 1,
+                 out: TextIO = sys.stdout) -> None:
+        self.cat_repo = SQLiteRepository[Category](db_file, Category)
+        self.exp_repo = SQLiteRepository[Expense](db_file, Expense)
+        self.categories = CategoryIndex(self.cat_repo)
+        self.batch_size = batch_size
+        self.out = out
+        self.pending: list[Expense] = []
+        self.commands = 0
+        self.added = 0
+
+    def execute(self, cmd: str) -> None:
+        """ Выполнить команду; при ошибке - ValueError с ее описанием """
+        cmd = cmd.strip()
+        if not cmd or cmd.startswith('#'):
+            return
+        self.commands += 1
+        if cmd == 'categories':
+            self.flush()
+            print(*self.cat_repo.get_all(), sep='\n', file=self.out)
+        elif cmd == 'expenses':
+            self.flush()
+            print(*self.exp_repo.get_all(), sep='\n', file=self.out)
+        elif cmd[0].isdecimal():
+            amount, *name = cmd.split(maxsplit=1)
+            if not amount.isdecimal() or not name:
+                raise ValueError(f'ожидается "<сумма> <категория>": {cmd}')
+            pk = self.categories.find(name[0])
+            if pk is None:
+                raise ValueError(f'категория {name[0]} не найдена')
+            exp = Expense(int(amount), pk)
+            self.pending.append(exp)
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+            if self.batch_size == 1:
+                print(exp, file=self.out)
+        else:
+            raise ValueError(f'неизвестная команда: {cmd}')
+
+    def flush(self) -> None:
+        """ Записать накопленные расходы в одной транзакции """
+        if self.pending:
+            self.exp_repo.add_many(self.pending)
+            self.added += len(self.pending)
+            self.pending = []
+
+    def run_batch(self, lines: Iterable[str], errors: TextIO = sys.stderr) -> int:
+        """
+        Выполнить команды из lines, ошибки вывести в errors
+        с номером строки. Возвращает количество ошибок.
+        """
+        failed = 0
+        for number, line in enumerate(lines, 1):
+            try:
+                self.execute(line)
+            except ValueError as error:
+                failed += 1
+                print(f'{number}: {error}', file=errors)
+        self.flush()
+        return failed
+
+
+def interactive(client: Client) -> None:
+    """ Чтение команд из терминала """
+    while True:
         try:
-            cat = cat_repo.get_all({'name': name})[0]
-        except IndexError:
-            print(f'категория {name} не найдена')
-            continue
-        exp = Expense(int(amount), cat.pk)
-        exp_repo.add(exp)
-        print(exp)
+            cmd = input('$> ')
+        except EOFError:
+            break
+        try:
+            client.execute(cmd)
+        except ValueError as error:
+            print(error)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """ Точка входа; возвращает код завершения """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('file', nargs='?',
+                        help="файл с командами ('-' - stdin) для пакетного режима")
+    parser.add_argument('--db', default='main_db.db', help='файл базы данных')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='расходов в одной транзакции в пакетном режиме')
+    args = parser.parse_args(argv)
+
+    if args.file is None and sys.stdin.isatty():
+        interactive(Client(args.db))
+        return 0
+
+    client = Client(args.db, max(args.batch_size, 1))
+    started = time.perf_counter()
+    if args.file in (None, '-'):
+        failed = client.run_batch(sys.stdin)
+    else:
+        with open(args.file, encoding='utf-8') as commands:
+            failed = client.run_batch(commands)
+    seconds = time.perf_counter() - started
+    print(f'{client.commands} commands ({client.added} expenses added, '
+          f'{failed} errors) in {seconds:.2f} s: '
+          f'{client.commands / max(seconds, 1e-9):.0f} commands/s', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Перенос изменений из одной базы данных приложения в другую
+(см. bookkeeper.repository.changes).
+
+Переносятся расходы, категории, бюджеты и повторяющиеся расходы,
+измененные после предыдущей синхронизации: номер последнего
+перенесенного изменения хранится в базе-получателе (таблица sync_state)
+отдельно для каждого источника. Журнал изменений включается в обеих
+базах при первой синхронизации (все записи источника переносятся
+как добавленные) и сжимается после каждой (compact_changes), поэтому
+его размер не превышает количества записей, которые когда-либо были
+в базе.
+
+Синхронизация односторонняя: получатель - копия источника, его записи
+заменяются записями источника. Вместе с номером изменения источника
+запоминается номер последнего изменения получателя; если после него
+в получателе что-то изменили (или при первой синхронизации в нем уже
+есть записи), синхронизация не выполняется (SyncConflict), чтобы
+не потерять эти изменения.
+
+Расходы, перенесенные в архив (см. repository.archive), в журнале
+выглядят удаленными, поэтому вместе с изменениями переносятся итоги
+архивированных расходов: таблица итогов получателя заменяется
+таблицей итогов источника.
+
+Запуск из корня проекта:
+    python -m bookkeeper.sync server.db laptop.db
+"""
+
+import argparse
+import os
+import time
+from typing import Any
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.recurring import RecurringExpense
+from bookkeeper.repository.archive import create_summary, summary_table
+from bookkeeper.repository.changes import (SyncConflict, SyncResult, compact_changes,
+                                           enable_changes, last_seq, sync_changes)
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, shared_connection
+from bookkeeper.utils import from_epoch_seconds
+
+MODELS = (Expense, Category, Budget, RecurringExpense)
+STATE_TABLE = 'sync_state'
+
+
+def sync_state(db_file: str, source: str) -> tuple[int, int]:
+    """
+    Номер последнего изменения источника source, перенесенного в db_file,
+    и номер последнего изменения db_file после этого переноса
+    """
+    con = shared_connection(db_file)
+    con.execute(f'CREATE TABLE IF NOT EXISTS {STATE_TABLE} (source TEXT PRIMARY KEY, '
+                'seq INTEGER NOT NULL, target_seq INTEGER NOT NULL)')
+    row = con.execute(f'SELECT seq, target_seq FROM {STATE_TABLE} WHERE source = ?',
+                      (source,)).fetchone()
+    return (0, 0) if row is None else row
+
+
+def copy_summary(source: SQLiteRepository[Expense],
+                 target: SQLiteRepository[Expense]) -> int:
+    """
+    Заменить итоги архивированных расходов target итогами source
+    (даты переводятся в формат хранения target), вернуть количество строк
+    """
+    summary = summary_table(source)
+    if summary is None:
+        return 0
+    rows = [(str(from_epoch_seconds(day))
+             if isinstance(day, int) and not target.epoch_seconds
+             else target.encode_value('expense_date', day), *values)
+            for day, *values in source.execute(
+                f'SELECT expense_date, category, amount, count FROM {summary}')]
+    with shared_connection(target.db_file) as con:
+        create_summary(con, target)
+        con.execute(f'DELETE FROM {summary}')
+        con.executemany(f'INSERT INTO {summary} (expense_date, category, amount, count) '
+                        'VALUES (?, ?, ?, ?)', rows)
+    return len(rows)
+
+
+def sync(source: str, target: str, since: int | None = None,
+         batch_size: int = 1000) -> SyncResult:
+    """
+    Перенести изменения базы данных source в target, начиная с номера
+    since (по умолчанию - после предыдущей синхронизации), и итоги
+    архивированных расходов, запомнить номера последних изменений
+    и сжать журналы. Если target изменили после предыдущей
+    синхронизации, возбуждается SyncConflict.
+    """
+    key = os.path.abspath(source)
+    synced, target_since = sync_state(target, key)
+    if since is None:
+        since = synced
+    pairs = []
+    for cls in MODELS:
+        source_repo = SQLiteRepository[Any](source, cls)
+        target_repo = SQLiteRepository[Any](target, cls)
+        source_repo.create_table()
+        target_repo.create_table()
+        enable_changes(source_repo)
+        enable_changes(target_repo)
+        pairs.append((source_repo, target_repo))
+    result = sync_changes(pairs, since, batch_size, target_since)
+    copy_summary(*pairs[0])
+    with shared_connection(target) as con:
+        con.execute(f'INSERT OR REPLACE INTO {STATE_TABLE} (source, seq, target_seq) '
+                    'VALUES (?, ?, ?)', (key, result.seq, last_seq(target)))
+    compact_changes(source)
+    compact_changes(target)
+    return result
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Точка входа """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('source', help='база данных, из которой переносятся изменения')
+    parser.add_argument('target', help='база данных, в которую переносятся изменения')
+    parser.add_argument('--since', type=int,
+                        help='перенести изменения с номером больше заданного')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        result = sync(args.source, args.target, args.since, args.batch_size)
+    except SyncConflict as error:
+        parser.exit(1, f'{error}\n')
+    print(f'{result.changes} changes up to #{result.seq}: {result.saved} saved, '
+          f'{result.deleted} deleted in {time.perf_counter() - started:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@
 Вспомогательные функции
 """
 
+from datetime import date, datetime, timedelta
 from typing import Iterable, Iterator
 
 
@@ -61,3 +62,121 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
         last_name = name
         last_indent = indent
     return result
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_SECOND = timedelta(seconds=1)
+
+
+def to_timestamp(value: datetime) -> int:
+    """
+    Перевести дату и время в целое число микросекунд от начала эпохи.
+    Часовой пояс не учитывается: наивное время переводится "как есть",
+    поэтому деление результата на число микросекунд в сутках дает
+    номер календарного дня.
+
+    Parameters
+    ----------
+    value - дата и время
+
+    Returns
+    -------
+    Количество микросекунд от 1970-01-01 00:00:00
+    """
+    return (value.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+
+
+def from_timestamp(value: int) -> datetime:
+    """
+    Обратное преобразование к to_timestamp.
+
+    Parameters
+    ----------
+    value - количество микросекунд от начала эпохи
+
+    Returns
+    -------
+    Наивный объект datetime
+    """
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def to_epoch_seconds(value: datetime | date | str) -> int:
+    """
+    Перевести дату и время в целое число секунд от начала эпохи (доли
+    секунды отбрасываются). Дата без времени соответствует полуночи,
+    строка разбирается в формате ISO. Часовой пояс не учитывается,
+    как и в to_timestamp.
+
+    Parameters
+    ----------
+    value - дата и время
+
+    Returns
+    -------
+    Количество секунд от 1970-01-01 00:00:00
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return (value.replace(tzinfo=None) - _EPOCH) // _SECOND
+
+
+def from_epoch_seconds(value: int) -> datetime:
+    """
+    Обратное преобразование к to_epoch_seconds.
+
+    Parameters
+    ----------
+    value - количество секунд от начала эпохи
+
+    Returns
+    -------
+    Наивный объект datetime
+    """
+    return _EPOCH + timedelta(seconds=value)
+
+
+def as_date(value: date | str | None) -> date | None:
+    """
+    Привести значение даты к типу date. Принимаются объекты date и datetime,
+    строки в формате ISO ('YYYY-MM-DD' с необязательным временем, так даты
+    возвращает sqlite) и None.
+
+    Parameters
+    ----------
+    value - дата в одном из поддерживаемых представлений
+
+    Returns
+    -------
+    Объект date или None
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+
+def as_datetime(value: datetime | date | str | None) -> datetime | None:
+    """
+    Привести значение даты и времени к типу datetime. Принимаются объекты
+    datetime, date (полночь), строки в формате ISO и None.
+
+    Parameters
+    ----------
+    value - дата и время в одном из поддерживаемых представлений
+
+    Returns
+    -------
+    Объект datetime или None
+    """
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(value)
@@ -1,12 +1,16 @@
 """
 Виджет для работы с бюджетом.
 """
-from datetime import datetime, timedelta, date
+from datetime import datetime, time, date
 from PySide6 import QtWidgets, QtCore
 
 from bookkeeper.view.utils import LabeledInput, HistoryTable, LabeledBox
 from bookkeeper.repository.sqlite_repository import AbstractRepository
 from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.budgeting.evaluation import BudgetEvaluator, period_start
+from bookkeeper.budgeting.forecast import SpendForecaster
+from bookkeeper.repository.cache import QueryCache
 
 
 def start_date(dayss: int) -> datetime:
@@ -21,41 +25,50 @@ def start_date(dayss: int) -> datetime:
     Возвращаемое значение
     Дата начала данного периода в формате YYYY-MM-DD.
     """
-    if dayss == 7:
-        return datetime.strptime(str(date.today() -
-                                     timedelta(days=datetime.weekday(
-                                         date.today()))), '%Y-%m-%d')
-    if dayss in [28, 29, 30, 31]:
-        return datetime.strptime(str(date.today() -
-                                     timedelta(days=int(datetime.strftime(
-                                         datetime.now(), '%d'))-1)),
-                                 '%Y-%m-%d')
-    return datetime.strptime(str(datetime.today().date()), '%Y-%m-%d')
+    today = date.today()
+    if dayss == 7 or dayss in [28, 29, 30, 31]:
+        today = period_start(dayss, today)
+    return datetime.combine(today, time())
 
 
 class ActiveBudgets(QtWidgets.QWidget):
     """
     Виджет, показывающий текущие траты и ограничения,
     дату и день недели.
-    В случае превышения ограничения
-    выдается окно с соответствующей информацией.
+    В случае превышения любого из действующих бюджетов (в том числе
+    бюджетов отдельных категорий) выдается окно с соответствующей информацией.
     Обновление каждые 0.5 секунды для обработки трат и новых бюджетов.
+    Прогноз трат на конец периода (см. SpendForecaster) учитывает
+    новые расходы инкрементально и пересчитывается целиком после
+    изменения или удаления расходов. Первый расчет прогноза - полный
+    проход по расходам, поэтому столбец Forecast заполняется после
+    показа окна.
     """
     def __init__(self, exp_repo: AbstractRepository,
-                 bud_repo: AbstractRepository[Budget], *args, **kwargs):
+                 bud_repo: AbstractRepository[Budget],
+                 cat_repo: AbstractRepository[Category] | None = None,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.exp_repo = exp_repo
         self.bud_repo = bud_repo
-        self.rows_columns = (('Day', 'Week', 'Month'), ('Paid', 'Limit'))
-
-        self.data: list[list[int]] = []
+        self.cat_repo = cat_repo
+        # таблица обновляется по таймеру, траты пересчитываются
+        # только после изменения расходов или категорий
+        self.cache = QueryCache()
+        self.evaluator = BudgetEvaluator(exp_repo, bud_repo, cat_repo, cache=self.cache)
+        self.resolver = self.evaluator.resolver
+        self.forecaster = SpendForecaster(exp_repo, cat_repo)
+        self.rows_columns = (('Day', 'Week', 'Month'), ('Paid', 'Limit', 'Forecast'))
+
+        self.data: list[list[int | str]] = []
+        self.limits: list[int | None] = []
+        self.forecast: list[int | str] = ['-', '-', '-']
+        self.forecast_ready = False
         self.table = HistoryTable(self.rows_columns[0], self.rows_columns[1])
         self.set_data()
-        if self.data[0][0] > self.data[0][1] or \
-                self.data[1][0] > self.data[1][1] or \
-                self.data[2][0] > self.data[2][1]:
-            QtWidgets.QMessageBox.critical(self, "You'll be poor!",
-                                           'You shouldn\'t spend that much!!!')
+        QtCore.QTimer.singleShot(0, self.load_forecast)
+        # проверка после показа окна: модальное сообщение не задерживает запуск
+        QtCore.QTimer.singleShot(0, self.warn_exceeded)
 
         self.layout = QtWidgets.QVBoxLayout()
         self.layout.addWidget(QtWidgets.QLabel('Budgets'))
@@ -85,33 +98,73 @@ class ActiveBudgets(QtWidgets.QWidget):
     def set_data(self) -> None:
         """
         Подсчет трат за нужные периоды. Отрисовка таблицы бюджетов и трат.
+        Ограничения - последние установленные общие бюджеты на день,
+        неделю и месяц (см. BudgetResolver).
         Вызывается по таймеру. 
         
         Возвращаемое значение
         None
         """
-        data_bud = []
+        self.limits = []
         for i in [1, 7, 30]:
-            data_bud.append(self.bud_repo.get_all({'length': i})[::-1][0].amount)
-        got_exp = self.exp_repo.get_all()[::-1]
-        day_amount, week_amount, month_amount = 0, 0, 0
-        for exp in got_exp:
-            exp_date = datetime.strptime(exp.expense_date, '%Y-%m-%d %H:%M:%S')
-            if exp_date >= start_date(1):
-                month_amount += exp.amount
-                day_amount += exp.amount
-                week_amount += exp.amount
-            elif exp_date >= start_date(7):
-                month_amount += exp.amount
-                week_amount += exp.amount
-            elif exp_date >= start_date(30):
-                month_amount += exp.amount
-        self.data = [[day_amount, data_bud[0]],
-                     [week_amount, data_bud[1]],
-                     [month_amount, data_bud[2]]]
+            budget = self.resolver.resolve(None, i, carry_over=True)
+            self.limits.append(budget.amount if budget is not None else None)
+        data_bud = ['-' if limit is None else limit for limit in self.limits]
+        today = date.today()
+        day_amount, week_amount, month_amount = self.evaluator.totals(
+            [period_start(i, today) for i in [1, 7, 30]], today).get(0, [0, 0, 0])
+        if self.forecast_ready:
+            self.forecaster.refresh()
+            self.forecast = [self.forecaster.project(0, i, today).projected
+                             for i in [1, 7, 30]]
+        self.data = [[day_amount, data_bud[0], self.forecast[0]],
+                     [week_amount, data_bud[1], self.forecast[1]],
+                     [month_amount, data_bud[2], self.forecast[2]]]
 
         self.table.set_data(self.data)
 
+    def load_forecast(self) -> None:
+        """
+        Первый расчет прогноза трат и заполнение столбца Forecast.
+
+        Возвращаемое значение
+        None
+        """
+        self.forecast_ready = True
+        self.set_data()
+
+    def warn_exceeded(self) -> None:
+        """
+        Сообщение о превышенных бюджетах, если они есть.
+
+        Возвращаемое значение
+        None
+        """
+        exceeded = self.exceeded()
+        if exceeded:
+            QtWidgets.QMessageBox.critical(self, "You'll be poor!",
+                                           'You shouldn\'t spend that much!!!\n'
+                                           + '\n'.join(exceeded))
+
+    def exceeded(self) -> list[str]:
+        """
+        Описания всех действующих бюджетов, ограничение которых превышено.
+
+        Возвращаемое значение
+        Список строк вида 'категория, N days: потрачено / ограничение'.
+        """
+        result = []
+        for status in self.evaluator.evaluate():
+            if not status.exceeded:
+                continue
+            name = 'all'
+            if status.category and self.cat_repo is not None:
+                cat = self.cat_repo.get(status.category)
+                name = cat.name if cat is not None else str(status.category)
+            result.append(f'{name}, {status.length} days: '
+                          f'{status.spent} / {status.limit}')
+        return result
+
 
 class BudgetManager(QtWidgets.QWidget):
     """
@@ -178,12 +231,14 @@ class BudgetTab(QtWidgets.QWidget):
     ограничениями и виджета для редактирования ограничений.
     """
     def __init__(self, exp_repo: AbstractRepository,
-                 bud_repo: AbstractRepository[Budget], *args, **kwargs):
+                 bud_repo: AbstractRepository[Budget],
+                 cat_repo: AbstractRepository[Category] | None = None,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.exp_repo = exp_repo
         self.bud_repo = bud_repo
         self.layout = QtWidgets.QVBoxLayout()
-        self.act_bud = ActiveBudgets(self.exp_repo, self.bud_repo)
+        self.act_bud = ActiveBudgets(self.exp_repo, self.bud_repo, cat_repo)
         self.edit_bud = BudgetManager(self.bud_repo)
         self.layout.addWidget(self.act_bud)
         self.layout.addWidget(self.edit_bud)
@@ -6,26 +6,25 @@ from PySide6 import QtWidgets, QtCore
 from bookkeeper.view.utils import LabeledInput, HistoryTable, \
     LabeledBox, add_del_buttons_widget
 from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.cascade import delete_category
+from bookkeeper.repository.category_index import CategoryIndex, category_index
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
 
 
-def parent_to_pk(repo: AbstractRepository, name: str) -> int | None:
+def parent_to_pk(index: CategoryIndex, name: str) -> int | None:
     """
     Нахождение идентификатора категории по названию.
     Используется для обработки названий родительских категорий.
     
     Параметры 
-    repo - репозиторий, по которому ведётся поиск.
+    index - индекс названий категорий, по которому ведётся поиск.
     name - имя категории, идентификатор которой нужно узнать.
     
     Возвращаемые значения
     Индетификатор или None.
     """
-    try:
-        return repo.get_all({'name': name.lower()})[0].pk
-    except IndexError:
-        return None
+    return index.find(name)
 
 
 class CategoriesExists(QtWidgets.QWidget):
@@ -43,10 +42,11 @@ class CategoriesExists(QtWidgets.QWidget):
     def __init__(self, cat_repo: AbstractRepository[Category], *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.cat_repo = cat_repo
+        self.cat_index = category_index(cat_repo)
         self.columns = ('Category', 'Parent')
         self.data = []
-        self.table = HistoryTable(columns=self.columns,
-                                  n_rows=len(self.cat_repo.get_all()))
+        self.pks: list[int] = []
+        self.table = HistoryTable(columns=self.columns, n_rows=0)
         self.set_data()
         self.layout = QtWidgets.QVBoxLayout()
         self.layout.addWidget(QtWidgets.QLabel('Categories'))
@@ -67,18 +67,21 @@ class CategoriesExists(QtWidgets.QWidget):
         None
         """
         new_val = self.table.item(row, column).text().lower()
-        pk = self.cat_repo.get_all()[::-1][row].pk
-        changed_row = self.cat_repo.get(pk)
+        changed_row = self.cat_repo.get(self.pks[row])
+        if changed_row is None:
+            # категория уже удалена
+            return None
         if column == 0:
             changed_row.name = new_val
         else:
-            parent_pk = parent_to_pk(self.cat_repo, new_val)
+            parent_pk = parent_to_pk(self.cat_index, new_val)
             if parent_pk is not None:
                 changed_row.parent = parent_pk
             else:
                 QtWidgets.QMessageBox.critical(self, 'Error', 'Parant doesn\'t exist')
                 return None
         self.cat_repo.update(changed_row)
+        self.cat_index.update(changed_row)
         return None
 
     def set_data(self) -> None:
@@ -89,9 +92,10 @@ class CategoriesExists(QtWidgets.QWidget):
         None
         """
         self.data = []
-        got_all = self.cat_repo.get_all()
+        got_all = self.cat_repo.get_all()[::-1]
+        self.pks = [cat.pk for cat in got_all]
         if got_all:
-            for cat in got_all[::-1]:
+            for cat in got_all:
                 try:
                     temp = [cat.name,
                             self.cat_repo.get(int(cat.parent)).name]
@@ -188,7 +192,8 @@ class CategoryManager(QtWidgets.QWidget):
         Возвращаемые значения
         None
         """
-        parent_pk = parent_to_pk(self.cat_repo, parent)
+        cat_index = self.cat_ex.cat_index
+        parent_pk = parent_to_pk(cat_index, parent)
         cat = Category(name.lower(), parent_pk)
         if parent != '' and parent_pk is None:
             QtWidgets.QMessageBox.critical(self, 'Error',
@@ -196,19 +201,17 @@ class CategoryManager(QtWidgets.QWidget):
             return
         if mode == 'add':
             self.cat_repo.add(cat)
+            cat_index.add(cat)
         elif mode == 'delete':
-            cat_pk = self.cat_repo.get_all({'name': name.lower(),
-                                            'parent': parent_pk})[0].pk
+            cat_pk = cat_index.find_in(parent_pk, name)
+            if cat_pk is None:
+                QtWidgets.QMessageBox.critical(self, 'Error',
+                                               'Category doesn\'t exist!')
+                return
             if cat_pk == 255:
                 return
-            self.cat_repo.delete(cat_pk)
-            for exp in self.exp_repo.get_all({'category': cat_pk}):
-                new_exp = Expense(exp.amount, parent_pk, exp.expense_date,
-                                  exp.added_date, exp.comment, exp.pk)
-                self.exp_repo.update(new_exp)
-            for cat in self.cat_repo.get_all({'parent': cat_pk}):
-                new_cat = Category(cat.name, parent_pk, cat.pk)
-                self.cat_repo.update(new_cat)
+            delete_category(self.cat_repo, self.exp_repo, cat_pk)
+            cat_index.refresh()
 
     def add(self) -> None:
         """
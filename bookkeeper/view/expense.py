@@ -7,6 +7,7 @@ from PySide6 import QtWidgets, QtCore
 from bookkeeper.view.utils import LabeledInput, HistoryTable, \
     LabeledBox, add_del_buttons_widget
 from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.category_index import category_index
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.category import Category
 
@@ -18,22 +19,37 @@ class ExpenseHistory(QtWidgets.QWidget):
     Двойным щелчком мыши активируется режим редактирования,
     нажатие клавиши Enter сохраняет изменения. 
     Если ошибиться в формате данных, появится сообщение об ошибке.
+
+    Расходы загружаются страницами по page_size от последних добавленных:
+    первая страница - при вызове set_data, следующие - в фоне (по таймеру,
+    пока загружено меньше preload строк) и при прокрутке к концу таблицы.
     """
+    loaded = QtCore.Signal(int)
+
     def __init__(self, exp_repo: AbstractRepository[Expense],
-                 cat_repo: AbstractRepository[Category], *args, **kwargs):
+                 cat_repo: AbstractRepository[Category],
+                 page_size: int = 200, preload: int = 1000, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.exp_repo = exp_repo
         self.cat_repo = cat_repo
+        self.cat_index = category_index(cat_repo)
+        self.page_size = page_size
+        self.preload = preload
         self.columns = ('Date', 'Paid', 'Category', 'Comment')
-        self.table = HistoryTable(columns=self.columns,
-                                  n_rows=len(self.exp_repo.get_all()))
-        self.data: list[list[str]] = []
-        self.set_data()
+        self.table = HistoryTable(columns=self.columns, n_rows=0)
+        self.data: list[list[object]] = []
+        self.pks: list[int] = []
+        self.cat_names: dict[int, str] = {}
+        self.exhausted = True
         self.layout = QtWidgets.QVBoxLayout()
         self.layout.addWidget(QtWidgets.QLabel('History'))
         self.layout.addWidget(self.table)
         self.setLayout(self.layout)
 
+        self.prefetch = QtCore.QTimer(self)
+        self.prefetch.setInterval(0)
+        self.prefetch.timeout.connect(self.fetch_more)
+        self.table.verticalScrollBar().valueChanged.connect(self.handle_scroll)
         self.table.cellChanged.connect(self.handle_cell_changed)
 
     def handle_cell_changed(self, row: int, column: int) -> None:
@@ -48,16 +64,17 @@ class ExpenseHistory(QtWidgets.QWidget):
         None
         """
         new_val = self.table.item(row, column).text()
-        pk = self.exp_repo.get_all()[::-1][row].pk
-        changed_row = self.exp_repo.get(pk)
+        changed_row = self.exp_repo.get(self.pks[row])
         try:
             if column == 0:
                 changed_row.added_date = datetime.strptime(new_val, '%Y-%m-%d %H:%M:%S')
             elif column == 1:
                 changed_row.amount = int(new_val)
             elif column == 2:
-                changed_row.category = self.cat_repo.get_all(
-                    {'name': new_val.lower()})[0].pk
+                category = self.cat_index.find(new_val)
+                if category is None:
+                    raise ValueError(f'unknown category {new_val!r}')
+                changed_row.category = category
             else:
                 changed_row.comment = new_val
             self.exp_repo.update(changed_row)
@@ -66,19 +83,58 @@ class ExpenseHistory(QtWidgets.QWidget):
 
     def set_data(self) -> None:
         """
-        Таблица истории расходов.
+        Таблица истории расходов: загрузка заново с первой страницы.
         
         Возвращаемые значения
         None
         """
         self.data = []
-        got_all = self.exp_repo.get_all()
-        if got_all:
-            for exp in got_all[::-1]:
-                temp = [exp.expense_date, exp.amount,
-                        self.cat_repo.get(int(exp.category)).name, exp.comment]
-                self.data.append(temp)
-        self.table.set_data(self.data)
+        self.pks = []
+        self.cat_names = {cat.pk: cat.name for cat in self.cat_repo.get_all()}
+        self.table.set_data([])
+        self.exhausted = False
+        self.fetch_more()
+
+    def fetch_more(self) -> None:
+        """
+        Загрузка следующей страницы расходов в конец таблицы.
+
+        Возвращаемые значения
+        None
+        """
+        if self.exhausted:
+            self.prefetch.stop()
+            return
+        page = self.exp_repo.get_page(self.page_size,
+                                      self.pks[-1] if self.pks else None)
+        # у расходов удаленной категории верхнего уровня категории нет
+        rows = [[exp.expense_date, exp.amount,
+                 self.cat_names.get(int(exp.category), '')
+                 if exp.category is not None else '', exp.comment]
+                for exp in page]
+        self.data.extend(rows)
+        self.pks.extend(exp.pk for exp in page)
+        self.table.append_data(rows)
+        self.exhausted = len(page) < self.page_size
+        if self.exhausted or len(self.pks) >= self.preload:
+            self.prefetch.stop()
+        elif not self.prefetch.isActive():
+            self.prefetch.start()
+        self.loaded.emit(len(self.pks))
+
+    def handle_scroll(self, value: int) -> None:
+        """
+        Догрузка расходов при прокрутке к концу таблицы.
+
+        Параметры
+        value - положение полосы прокрутки.
+
+        Возвращаемые значения
+        None
+        """
+        bar = self.table.verticalScrollBar()
+        if value >= bar.maximum() - bar.pageStep():
+            self.fetch_more()
 
 
 class ExpenseManager(QtWidgets.QWidget):
@@ -134,6 +190,7 @@ class ExpenseManager(QtWidgets.QWidget):
         Возвращаемые значения
         None
         """
+        self.exp_hist.cat_index.refresh()
         self.cat_list = [cat.name.capitalize() for
                          cat in self.cat_repo.get_all()]
         self.cat_choice.box.clear()
@@ -200,9 +257,12 @@ class ExpenseManager(QtWidgets.QWidget):
         cat - название категории.
         
         Возвращаемые значения
-        None
+        Идентификатор категории; ValueError, если категории нет.
         """
-        return self.cat_repo.get_all({'name': cat.lower()})[0].pk
+        cat_pk = self.exp_hist.cat_index.find(cat)
+        if cat_pk is None:
+            raise ValueError(f'unknown category {cat!r}')
+        return cat_pk
 
     def add(self) -> None:
         """
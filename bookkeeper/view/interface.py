@@ -30,7 +30,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.resize(1280, 760)
 
         self.expense = ExpenseTab(self.exp_repo, self.cat_repo)
-        self.budget = BudgetTab(self.exp_repo, self.bud_repo)
+        self.budget = BudgetTab(self.exp_repo, self.bud_repo, self.cat_repo)
         self.category = CategoriesTab(self.cat_repo, self.exp_repo)
 
         self.expense.setMinimumWidth(600)
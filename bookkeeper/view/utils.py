@@ -2,6 +2,8 @@
 Часто использующиеся вспомогательные
 функции и виджеты
 """
+from typing import Sequence
+
 from PySide6 import QtWidgets
 
 
@@ -99,16 +101,39 @@ class HistoryTable(QtWidgets.QTableWidget):
             self.setVerticalHeaderLabels(rows)
         self.setHorizontalHeaderLabels(columns)
 
-    def set_data(self, data: list[list[int | str]]) -> None:
+    def set_data(self, data: Sequence[Sequence[object]]) -> None:
         """
-        Заполнение таблицы.
-        
+        Заполнение таблицы. Количество строк становится равным
+        количеству строк данных. Сигнал cellChanged при заполнении
+        не отправляется: он означает изменение ячейки пользователем.
+
         Параметры
         data - данные, которыми заполняется таблица.
-        
+
+        Возвращаемые значения
+        None
+        """
+        self._fill(data, 0)
+
+    def append_data(self, data: Sequence[Sequence[object]]) -> None:
+        """
+        Добавление строк в конец таблицы (для постепенной загрузки).
+
+        Параметры
+        data - данные добавляемых строк.
+
         Возвращаемые значения
         None
         """
-        for i, row in enumerate(data):
-            for number, x in enumerate(row):
-                self.setItem(i, number, QtWidgets.QTableWidgetItem(str(x).capitalize()))
+        self._fill(data, self.rowCount())
+
+    def _fill(self, data: Sequence[Sequence[object]], start: int) -> None:
+        blocked = self.blockSignals(True)
+        try:
+            self.setRowCount(start + len(data))
+            for i, row in enumerate(data, start):
+                for number, x in enumerate(row):
+                    self.setItem(i, number,
+                                 QtWidgets.QTableWidgetItem(str(x).capitalize()))
+        finally:
+            self.blockSignals(blocked)
@@ -0,0 +1,132 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.budgeting.evaluation import (BudgetEvaluator, BudgetStatus,
+                                             period_start, rollup)
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.recurring import RecurringExpense
+from bookkeeper.repository.cache import QueryCache
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+DAY = date(2023, 3, 15)  # среда
+
+
+def make_repo(kind, cls, tmp_path):
+    if kind == 'memory':
+        return MemoryRepository()
+    if kind == 'columnar':
+        return ColumnarMemoryRepository(cls)
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), cls,
+                            epoch_seconds=kind == 'sqlite-epoch')
+    repo.create_table()
+    return repo
+
+
+@pytest.fixture(params=['memory', 'columnar', 'sqlite', 'sqlite-epoch'])
+def repos(request, tmp_path):
+    return [make_repo(request.param, cls, tmp_path)
+            for cls in (Expense, Budget, Category)]
+
+
+@pytest.fixture
+def evaluator(repos):
+    exp_repo, bud_repo, cat_repo = repos
+    food, meat, books = Category('food'), Category('meat'), Category('books')
+    cat_repo.add(food)
+    meat.parent = food.pk
+    cat_repo.add(meat)
+    cat_repo.add(books)
+    for amount, cat, moment in [
+            (100, meat, datetime(2023, 3, 15, 10)),
+            (200, food, datetime(2023, 3, 14, 23, 59)),
+            (400, books, datetime(2023, 3, 13)),
+            (800, meat, datetime(2023, 3, 1, 0, 1)),
+            (1600, books, datetime(2023, 2, 28, 23)),
+            (3200, food, datetime(2023, 3, 16, 8))]:
+        exp_repo.add(Expense(amount, cat.pk, expense_date=moment, added_date=moment))
+    for bud in [Budget(250, 0, 1, date(2023, 3, 1)),
+                Budget(1000, food.pk, 7, date(2023, 3, 13)),
+                Budget(1000, meat.pk, 30, date(2023, 3, 1)),
+                Budget(10, books.pk, 1, date(2023, 3, 20))]:
+        bud_repo.add(bud)
+    return BudgetEvaluator(exp_repo, bud_repo, cat_repo)
+
+
+def test_period_start():
+    assert period_start(1, DAY) == DAY
+    assert period_start(7, DAY) == date(2023, 3, 13)
+    assert period_start(30, DAY) == date(2023, 3, 1)
+    assert period_start(3, DAY) == date(2023, 3, 13)
+
+
+def test_rollup():
+    totals = {3: [1, 2], 2: [10, 20], 5: [100, 200]}
+    parents = {1: None, 2: 1, 3: 2, 5: None}
+    assert rollup(totals, parents, 2) == {
+        3: [1, 2], 2: [11, 22], 1: [11, 22], 5: [100, 200], 0: [111, 222]}
+
+
+def test_totals(evaluator):
+    starts = [date(2023, 3, 15), date(2023, 3, 13), date(2023, 3, 1)]
+    totals = evaluator.totals(starts, DAY)
+    food, meat, books = [c.pk for c in evaluator.cat_repo.get_all()]
+    assert totals[meat] == [100, 100, 900]
+    assert totals[food] == [100, 300, 1100]
+    assert totals[books] == [0, 400, 400]
+    assert totals[0] == [100, 700, 1500]
+
+
+def test_totals_with_recurring(evaluator):
+    starts = [date(2023, 3, 15), date(2023, 3, 13), date(2023, 3, 1)]
+    food, meat, _ = [c.pk for c in evaluator.cat_repo.get_all()]
+    evaluator.rule_repo = MemoryRepository()
+    evaluator.rule_repo.add(RecurringExpense(50, meat, datetime(2023, 1, 10)))
+    evaluator.rule_repo.add(RecurringExpense(5, food, datetime(2023, 1, 1), unit='day',
+                                             materialized=datetime(2023, 3, 14)))
+    totals = evaluator.totals(starts, DAY)
+    assert totals[meat] == [100, 100, 950]
+    assert totals[food] == [100 + 5, 300 + 10, 1100 + 50 + 10]
+    assert totals[0] == [100 + 5, 700 + 10, 1500 + 50 + 10]
+
+
+def test_cached_totals(evaluator):
+    starts = [date(2023, 3, 13), date(2023, 3, 1)]
+    evaluator.cache = QueryCache()
+    evaluator.cache.watch([evaluator.exp_repo, evaluator.cat_repo])
+    assert evaluator.totals(starts, DAY) == evaluator.totals(starts, DAY)
+    evaluator.exp_repo.add(Expense(5, 1, expense_date=datetime(2023, 3, 14)))
+    assert evaluator.totals(starts, DAY)[0] == [705, 1505]
+    stats = evaluator.cache.stats()
+    if isinstance(evaluator.exp_repo, SQLiteRepository):
+        assert (stats.hits, stats.misses) == (1, 2)
+    else:
+        assert stats.bypassed == 3
+
+
+def test_evaluate(evaluator):
+    food, meat, _ = [c.pk for c in evaluator.cat_repo.get_all()]
+    statuses = sorted(evaluator.evaluate(DAY), key=lambda s: s.length)
+    assert [tuple(s) for s in statuses] == [
+        (1, 0, 1, DAY, 250, 100),
+        (2, food, 7, date(2023, 3, 13), 1000, 300),
+        (3, meat, 30, date(2023, 3, 1), 1000, 900)]
+    assert not any(s.exceeded for s in statuses)
+
+
+def test_status():
+    status = BudgetStatus(1, 0, 7, DAY, 100, 150)
+    assert status.exceeded
+    assert status.remaining == -50
+
+
+def test_without_categories(repos):
+    exp_repo, bud_repo, _ = repos
+    exp_repo.add(Expense(100, 1, expense_date=datetime(2023, 3, 15)))
+    bud_repo.add(Budget(50, 0, 1, DAY))
+    statuses = BudgetEvaluator(exp_repo, bud_repo).evaluate(DAY)
+    assert [(s.spent, s.exceeded) for s in statuses] == [(100, True)]
@@ -0,0 +1,142 @@
+from datetime import date, datetime
+from math import sqrt
+
+import pytest
+
+from bookkeeper.budgeting.forecast import (BudgetForecast, SpendForecaster, SpendStats,
+                                           period_end)
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.archive import archive_expenses
+from bookkeeper.repository.cascade import delete_category
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+DAY = date(2023, 3, 15)  # среда
+
+
+@pytest.fixture(params=['memory', 'columnar', 'sqlite', 'sqlite-epoch', 'partitioned'])
+def repos(request, tmp_path):
+    cat_repo = MemoryRepository()
+    if request.param == 'memory':
+        return MemoryRepository(), cat_repo
+    if request.param == 'columnar':
+        return ColumnarMemoryRepository(Expense), cat_repo
+    db_file = str(tmp_path / 'test.db')
+    if request.param == 'partitioned':
+        exp_repo = PartitionedSQLiteRepository(db_file, Expense)
+    else:
+        exp_repo = SQLiteRepository(db_file, Expense,
+                                    epoch_seconds=request.param == 'sqlite-epoch')
+    exp_repo.create_table()
+    return exp_repo, cat_repo
+
+
+@pytest.fixture
+def forecaster(repos):
+    exp_repo, cat_repo = repos
+    food, meat = Category('food'), Category('meat')
+    cat_repo.add(food)
+    meat.parent = food.pk
+    cat_repo.add(meat)
+    # 100 в день на мясо с 2023-03-02 по 2023-03-15, 50 на еду каждый второй день
+    exp_repo.add_many([Expense(100, meat.pk, datetime(2023, 3, day, 12))
+                       for day in range(2, 16)]
+                      + [Expense(50, food.pk, datetime(2023, 3, day, 9))
+                         for day in range(2, 16, 2)]
+                      + [Expense(1000, 0, datetime(2023, 2, 1))])
+    forecaster = SpendForecaster(exp_repo, cat_repo, window=14)
+    assert forecaster.refresh() == 14 + 7 + 1
+    return forecaster
+
+
+def test_period_end():
+    assert period_end(1, DAY) == date(2023, 3, 16)
+    assert period_end(7, date(2023, 3, 13)) == date(2023, 3, 20)
+    assert period_end(30, date(2023, 2, 1)) == date(2023, 3, 1)
+    assert period_end(31, date(2023, 12, 1)) == date(2024, 1, 1)
+
+
+def test_stats(forecaster):
+    meat = forecaster.stats(2, DAY)
+    assert meat == SpendStats(2, date(2023, 3, 2), date(2023, 3, 16), 1400, 100.0, 0.0)
+    food = forecaster.stats(1, DAY)
+    assert food.total == 1400 + 350
+    assert food.mean == 125.0
+    assert food.std == pytest.approx(25.0)
+    assert food.weekly == 875.0
+    assert forecaster.stats(0, date(2023, 2, 1)).total == 1000
+    assert list(forecaster.daily(1, date(2023, 3, 1), date(2023, 3, 4))) == [0, 150, 100]
+
+
+def test_forecast(forecaster):
+    budgets = [Budget(3000, 1, 30, date(2023, 3, 1), pk=1),
+               Budget(600, 2, 7, date(2023, 3, 1), pk=2)]
+    month, week = forecaster.forecast(budgets, DAY)
+    # с 16 по 31 марта остается 16 дней
+    assert month == BudgetForecast(1, 1, date(2023, 3, 1), date(2023, 4, 1), 3000,
+                                   1750, 1750 + 16 * 125, 25.0 * sqrt(16))
+    assert month.exceeded
+    assert week == BudgetForecast(2, 2, date(2023, 3, 13), date(2023, 3, 20), 600,
+                                  300, 300 + 4 * 100, 0.0)
+    assert week.exceeded
+    assert forecaster.project(0, 1, DAY).projected == 100
+
+
+def test_incremental(forecaster):
+    exp_repo = forecaster.exp_repo
+    assert forecaster.refresh() == 0
+    exp_repo.add(Expense(700, 2, datetime(2023, 3, 15, 20)))
+    exp_repo.add(Expense(5, 2, datetime(2022, 12, 31)))
+    assert forecaster.refresh() == 2
+    assert forecaster.stats(2, DAY).total == 1400 + 700
+    assert forecaster.stats(2, date(2022, 12, 31)).total == 5
+    changed = exp_repo.get_all({'amount': 700})[0]
+    forecaster.remove(changed)
+    changed.amount = 70
+    exp_repo.update(changed)
+    forecaster.add(changed)
+    assert forecaster.stats(2, DAY).total == 1400 + 70
+    assert forecaster.rebuild() == 14 + 7 + 1 + 2
+    assert forecaster.stats(2, DAY).total == 1400 + 70
+
+
+def test_changed_expenses(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    exp_repo = SQLiteRepository(db_file, Expense)
+    cat_repo = SQLiteRepository(db_file, Category)
+    for repo in (exp_repo, cat_repo):
+        repo.create_table()
+    cat_repo.add_many([Category('food'), Category('meat', 1)])
+    exp_repo.add_many([Expense(10, 2, datetime(2023, 3, day)) for day in range(1, 11)])
+    forecaster = SpendForecaster(exp_repo, cat_repo, window=10)
+    assert forecaster.refresh() == 10
+    exp_repo.add(Expense(5, 1, datetime(2023, 3, 10)))
+    assert forecaster.refresh() == 1
+    changed = exp_repo.get(1)
+    changed.amount = 100
+    exp_repo.update(changed)
+    exp_repo.delete(2)
+    exp_repo.add(Expense(7, 2, datetime(2023, 3, 10)))
+    assert forecaster.refresh() == 11
+    assert forecaster.stats(2, date(2023, 3, 10)).total == 100 + 80 + 7
+    delete_category(cat_repo, exp_repo, 2)
+    forecaster.refresh()
+    assert forecaster.stats(2, date(2023, 3, 10)).total == 0
+    assert forecaster.stats(1, date(2023, 3, 10)).total == 100 + 80 + 7 + 5
+    archive_expenses(exp_repo, str(tmp_path / 'archive.db'), date(2023, 3, 6))
+    forecaster.refresh()
+    assert forecaster.stats(0, date(2023, 3, 10)).total == 192
+
+
+def test_archived_expenses(tmp_path):
+    exp_repo = SQLiteRepository(str(tmp_path / 'test.db'), Expense)
+    exp_repo.create_table()
+    exp_repo.add_many([Expense(10, 1, datetime(2023, 3, day)) for day in range(1, 11)])
+    archive_expenses(exp_repo, str(tmp_path / 'archive.db'), date(2023, 3, 6))
+    forecaster = SpendForecaster(exp_repo, window=10)
+    forecaster.refresh()
+    assert forecaster.stats(0, date(2023, 3, 10)).total == 100
@@ -0,0 +1,123 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from bookkeeper.budgeting.recurring import (RecurringScheduler, count_between,
+                                            first_index, occurrence, occurrences,
+                                            pending_amount, pending_totals)
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.recurring import RecurringExpense
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import as_datetime
+
+RENT = RecurringExpense(30000, 1, datetime(2023, 1, 31, 9), comment='аренда')
+
+
+@pytest.fixture(params=['memory', 'columnar', 'sqlite', 'sqlite-epoch'])
+def repos(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepository(), MemoryRepository()
+    if request.param == 'columnar':
+        return (ColumnarMemoryRepository(RecurringExpense),
+                ColumnarMemoryRepository(Expense))
+    result = []
+    for cls in (RecurringExpense, Expense):
+        repo = SQLiteRepository(str(tmp_path / 'test.db'), cls,
+                                epoch_seconds=request.param == 'sqlite-epoch')
+        repo.create_table()
+        result.append(repo)
+    return result
+
+
+def test_occurrence_months():
+    assert [occurrence(RENT, k) for k in range(4)] == [
+        datetime(2023, 1, 31, 9), datetime(2023, 2, 28, 9),
+        datetime(2023, 3, 31, 9), datetime(2023, 4, 30, 9)]
+    leap = RecurringExpense(1, 1, datetime(2020, 2, 29), unit='year')
+    assert [occurrence(leap, k) for k in (1, 4)] == [datetime(2021, 2, 28),
+                                                     datetime(2024, 2, 29)]
+    quarter = RecurringExpense(1, 1, datetime(2022, 11, 15), every=3)
+    assert occurrence(quarter, 2) == datetime(2023, 5, 15)
+
+
+@pytest.mark.parametrize('unit, every', [('day', 1), ('day', 3), ('week', 2),
+                                         ('month', 1), ('month', 5), ('year', 1)])
+def test_count_matches_occurrences(unit, every):
+    rule = RecurringExpense(1, 1, datetime(2023, 1, 31, 9), every=every, unit=unit,
+                            end_date=datetime(2026, 6, 1))
+    moments = [occurrence(rule, k) for k in range(1500)]
+    moments = [moment for moment in moments if moment < rule.end_date]
+    bounds = [datetime(2022, 12, 1), datetime(2023, 1, 31, 9), datetime(2023, 2, 28),
+              datetime(2023, 3, 1), datetime(2024, 2, 29, 9, 0, 1), datetime(2027, 1, 1)]
+    for low in bounds:
+        expected = [m for m in moments if m >= low][:1]
+        assert moments[first_index(rule, low):][:1] == expected
+        for high in bounds:
+            expected = [m for m in moments if low <= m < high]
+            assert list(occurrences(rule, low, high)) == expected
+            assert count_between(rule, low, high) == len(expected)
+
+
+def test_pending_totals():
+    rules = [RecurringExpense(100, 1, datetime(2023, 1, 10), unit='week'),
+             RecurringExpense(7, None, datetime(2023, 1, 1), unit='day',
+                              materialized=datetime(2023, 1, 20))]
+    starts = [date(2023, 1, 1), date(2023, 1, 15)]
+    assert pending_totals(rules, starts, date(2023, 2, 1)) == {
+        1: [400, 300], 0: [7 * 12, 7 * 12]}
+    assert pending_amount(rules, date(2023, 1, 1), date(2023, 1, 21)) == 200 + 7
+    assert pending_totals(rules, starts, date(2023, 1, 1)) == {}
+
+
+def test_materialize(repos):
+    rule_repo, exp_repo = repos
+    rule_repo.add(RecurringExpense(RENT.amount, 1, RENT.start_date, comment='аренда'))
+    rule_repo.add(RecurringExpense(5, 2, datetime(2023, 2, 1, 12), every=2, unit='week',
+                                   end_date=datetime(2023, 3, 20)))
+    scheduler = RecurringScheduler(rule_repo, exp_repo, batch_size=2)
+    assert scheduler.materialize(datetime(2023, 3, 1)) == 2 + 2
+    assert scheduler.materialize(datetime(2023, 3, 1)) == 0
+    assert scheduler.materialize(datetime(2023, 6, 1)) == 3 + 2
+    expenses = sorted(exp_repo.get_all(), key=lambda exp: (exp.category, exp.pk))
+    assert [(exp.amount, exp.category, as_datetime(exp.expense_date), exp.comment)
+            for exp in expenses] == [
+        (30000, 1, datetime(2023, 1, 31, 9), 'аренда'),
+        (30000, 1, datetime(2023, 2, 28, 9), 'аренда'),
+        (30000, 1, datetime(2023, 3, 31, 9), 'аренда'),
+        (30000, 1, datetime(2023, 4, 30, 9), 'аренда'),
+        (30000, 1, datetime(2023, 5, 31, 9), 'аренда'),
+        (5, 2, datetime(2023, 2, 1, 12), ''),
+        (5, 2, datetime(2023, 2, 15, 12), ''),
+        (5, 2, datetime(2023, 3, 1, 12), ''),
+        (5, 2, datetime(2023, 3, 15, 12), '')]
+    rent, sub = sorted(rule_repo.get_all(), key=lambda rule: rule.pk)
+    assert as_datetime(rent.materialized) == datetime(2023, 6, 1)
+    assert as_datetime(sub.materialized) == datetime(2023, 3, 20)
+    # созданные повторения больше не учитываются аналитически
+    assert scheduler.pending_totals([date(2023, 1, 1)], date(2023, 8, 1)) == {
+        1: [60000]}
+
+
+def test_materialize_is_atomic(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    rule_repo = SQLiteRepository(db_file, RecurringExpense)
+    exp_repo = SQLiteRepository(db_file, Expense)
+    rule_repo.create_table()
+    exp_repo.create_table()
+    rule_repo.add(RecurringExpense(10, 1, datetime(2023, 1, 1), unit='day'))
+    rule_repo.execute('CREATE TRIGGER fail BEFORE UPDATE ON recurringexpense '
+                      "BEGIN SELECT RAISE(ABORT, 'fail'); END")
+    with pytest.raises(sqlite3.IntegrityError):
+        RecurringScheduler(rule_repo, exp_repo).materialize(datetime(2023, 2, 1))
+    assert exp_repo.get_all() == []
+    assert rule_repo.get(1).materialized is None
+
+
+def test_year_projection_without_rows():
+    rule = RecurringExpense(3, 1, datetime(2023, 1, 1, 8), unit='day')
+    starts = [date(2023, 1, 1) + timedelta(days=k) for k in range(0, 365, 30)]
+    totals = pending_totals([rule], starts, date(2024, 1, 1))
+    assert totals[1] == [3 * (365 - k) for k in range(0, 365, 30)]
@@ -0,0 +1,106 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.budgeting.reports import (BudgetPeriod, ReportRunner, date_chunks,
+                                          period_key)
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.recurring import RecurringExpense
+from bookkeeper.repository.cache import QueryCache
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+START, END = date(2022, 12, 1), date(2023, 3, 1)
+PARENTS = {1: None, 2: 1, 3: None}  # 2 - подкатегория 1
+
+
+@pytest.fixture(params=['sqlite', 'sqlite-epoch', 'partitioned'])
+def exp_repo(request, tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    if request.param == 'partitioned':
+        repo = PartitionedSQLiteRepository(db_file, Expense)
+    else:
+        repo = SQLiteRepository(db_file, Expense,
+                                epoch_seconds=request.param == 'sqlite-epoch')
+    repo.create_table()
+    repo.add_many(Expense(amount, cat, expense_date=moment) for amount, cat, moment in [
+        (1, 1, datetime(2022, 11, 30, 23, 59)),
+        (10, 1, datetime(2022, 12, 1)),
+        (20, 2, datetime(2022, 12, 31, 23, 59)),
+        (40, 3, datetime(2023, 1, 1, 12)),
+        (80, 2, datetime(2023, 2, 10, 8)),
+        (160, 3, datetime(2023, 2, 28, 23)),
+        (320, 1, datetime(2023, 3, 1))])
+    return repo
+
+
+def test_date_chunks():
+    assert date_chunks(START, END, 3) == [
+        (date(2022, 12, 1), date(2022, 12, 31)), (date(2022, 12, 31), date(2023, 1, 30)),
+        (date(2023, 1, 30), date(2023, 3, 1))]
+    assert date_chunks(START, date(2022, 12, 3), 5) == [
+        (date(2022, 12, 1), date(2022, 12, 2)), (date(2022, 12, 2), date(2022, 12, 3))]
+    assert date_chunks(END, START, 2) == []
+
+
+def test_period_key():
+    day = date(2023, 2, 10)
+    assert period_key(day, 'day') == day
+    assert period_key(day, 'month') == date(2023, 2, 1)
+    assert period_key(day, 'year') == date(2023, 1, 1)
+    with pytest.raises(ValueError):
+        period_key(day, 'week')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_daily_totals(exp_repo, workers):
+    runner = ReportRunner(exp_repo, workers, chunks_per_worker=3)
+    assert runner.daily_totals(START, END) == {
+        (date(2022, 12, 1), 1): 10, (date(2022, 12, 31), 2): 20,
+        (date(2023, 1, 1), 3): 40, (date(2023, 2, 10), 2): 80,
+        (date(2023, 2, 28), 3): 160}
+
+
+def test_cached_daily_totals(exp_repo):
+    runner = ReportRunner(exp_repo, 1, cache=QueryCache())
+    assert runner.daily_totals(START, END) == runner.daily_totals(START, END)
+    exp_repo.add(Expense(5, 1, expense_date=datetime(2022, 12, 1, 10)))
+    assert runner.daily_totals(START, END)[date(2022, 12, 1), 1] == 15
+    stats = runner.cache.stats()
+    assert (stats.hits, stats.misses) == (1, 2)
+
+
+def test_spend_by_period(exp_repo):
+    runner = ReportRunner(exp_repo, 1)
+    assert runner.spend_by_period(START, END, 'month', PARENTS) == {
+        date(2022, 12, 1): {0: 30, 1: 30, 2: 20},
+        date(2023, 1, 1): {0: 40, 3: 40},
+        date(2023, 2, 1): {0: 240, 1: 80, 2: 80, 3: 160}}
+    assert runner.spend_by_period(START, END, 'year') == {
+        date(2022, 1, 1): {0: 30, 1: 10, 2: 20},
+        date(2023, 1, 1): {0: 280, 2: 80, 3: 200}}
+
+
+def test_budget_history(exp_repo):
+    runner = ReportRunner(exp_repo, 1)
+    budgets = [Budget(50, 1, 31, date(2022, 12, 1), date(2023, 2, 1), pk=1),
+               Budget(100, 0, 60, date(2023, 1, 1), date(2023, 3, 1), pk=2)]
+    assert runner.budget_history(budgets, PARENTS) == [
+        BudgetPeriod(1, 1, date(2022, 12, 1), date(2023, 1, 1), 50, 30),
+        BudgetPeriod(1, 1, date(2023, 1, 1), date(2023, 2, 1), 50, 0),
+        BudgetPeriod(2, 0, date(2023, 1, 1), date(2023, 3, 1), 100, 280)]
+    assert runner.budget_history([]) == []
+
+
+def test_budget_history_with_recurring(exp_repo):
+    runner = ReportRunner(exp_repo, 1)
+    budgets = [Budget(50, 1, 31, date(2022, 12, 1), date(2023, 2, 1), pk=1),
+               Budget(100, 0, 60, date(2023, 1, 1), date(2023, 3, 1), pk=2)]
+    rules = [RecurringExpense(5, 2, datetime(2023, 1, 15)),
+             RecurringExpense(7, 3, datetime(2022, 12, 25), unit='week',
+                              end_date=datetime(2023, 1, 10))]
+    assert runner.budget_history(budgets, PARENTS, rules) == [
+        BudgetPeriod(1, 1, date(2022, 12, 1), date(2023, 1, 1), 50, 30),
+        BudgetPeriod(1, 1, date(2023, 1, 1), date(2023, 2, 1), 50, 5),
+        BudgetPeriod(2, 0, date(2023, 1, 1), date(2023, 3, 1), 100, 280 + 10 + 14)]
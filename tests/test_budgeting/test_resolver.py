@@ -0,0 +1,94 @@
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.budgeting.resolver import (BudgetResolver, SQLiteBudgetResolver,
+                                           budget_resolver)
+from bookkeeper.models.budget import Budget
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repo(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepository()
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), Budget)
+    repo.create_table()
+    return repo
+
+
+@pytest.fixture
+def budgets(repo):
+    objects = [
+        Budget(1000, None, 7, date(2023, 3, 6)),
+        Budget(2000, 0, 7, date(2023, 3, 13)),
+        Budget(2500, 0, 7, date(2023, 3, 13)),
+        Budget(500, 5, 7, date(2023, 3, 6), end_date=None),
+        Budget(30000, 0, 30, date(2023, 3, 1)),
+        Budget(100, 0, 1, datetime(2023, 3, 10)),
+    ]
+    for b in objects:
+        repo.add(b)
+    return objects
+
+
+def test_factory(repo):
+    resolver = budget_resolver(repo)
+    if isinstance(repo, SQLiteRepository):
+        assert isinstance(resolver, SQLiteBudgetResolver)
+    else:
+        assert type(resolver) is BudgetResolver
+
+
+def test_resolve(repo, budgets):
+    resolver = budget_resolver(repo)
+    assert resolver.resolve(None, 7, date(2023, 3, 5)) is None
+    assert resolver.resolve(None, 7, date(2023, 3, 6)).pk == budgets[0].pk
+    assert resolver.resolve(0, 7, date(2023, 3, 12)).pk == budgets[0].pk
+    assert resolver.resolve(0, 7, date(2023, 3, 13)).pk == budgets[2].pk
+    assert resolver.resolve(5, 7, date(2023, 3, 8)).pk == budgets[3].pk
+    assert resolver.resolve(5, 30, date(2023, 3, 8)) is None
+    assert resolver.resolve(0, 30, date(2023, 3, 30)).pk == budgets[4].pk
+    assert resolver.resolve(0, 1, date(2023, 3, 10)).pk == budgets[5].pk
+
+
+def test_expired(repo, budgets):
+    resolver = budget_resolver(repo)
+    assert resolver.resolve(0, 7, date(2023, 3, 20)) is None
+    assert resolver.resolve(0, 7, date(2023, 3, 20), carry_over=True).pk == budgets[2].pk
+    assert resolver.resolve(0, 1, date(2023, 3, 11)) is None
+
+
+def test_active(repo, budgets):
+    resolver = budget_resolver(repo)
+    active = resolver.active(date(2023, 3, 14))
+    assert {b.pk for b in active} == {budgets[2].pk, budgets[4].pk}
+    active = resolver.active(date(2023, 3, 14), carry_over=True)
+    assert {b.pk for b in active} == {b.pk for b in budgets[2:]}
+
+
+def test_add():
+    repo = MemoryRepository()
+    resolver = BudgetResolver(repo)
+    assert resolver.resolve(0, 7, date(2023, 3, 6)) is None
+    bud = Budget(1000, 0, 7, date(2023, 3, 6))
+    repo.add(bud)
+    resolver.add(bud)
+    assert resolver.resolve(0, 7, date(2023, 3, 7)) is bud
+
+
+def test_sqlite_uses_index(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), Budget)
+    repo.create_table()
+    SQLiteBudgetResolver(repo)
+    with sqlite3.connect(repo.db_file) as con:
+        plan = con.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM budget '
+            'WHERE IFNULL(category, 0) = 1 AND length = 7 '
+            'AND IFNULL(start_date, \'\') < \'2023-03-07\' '
+            'ORDER BY IFNULL(start_date, \'\') DESC, pk DESC LIMIT 1').fetchall()
+    con.close()
+    assert 'budget_period_idx' in str(plan)
+    assert 'TEMP B-TREE' not in str(plan)
@@ -1,9 +1,10 @@
-from datetime import datetime, timedelta
+from dataclasses import FrozenInstanceError
+from datetime import date, datetime, timedelta
 
 import pytest
 
 from bookkeeper.repository.memory_repository import MemoryRepository
-from bookkeeper.models.budget import Budget
+from bookkeeper.models.budget import Budget, BudgetRecord, week_start
 
 
 @pytest.fixture
@@ -31,3 +32,26 @@ def test_can_add_to_repo(repo):
     bud = Budget(100, 1, 7)
     pk = repo.add(bud)
     assert bud.pk == pk
+
+
+def test_default_dates_computed_on_creation():
+    bud = Budget(100)
+    assert bud.start_date == week_start()
+    assert bud.start_date.weekday() == 0
+    assert bud.end_date == bud.start_date + timedelta(days=7)
+
+
+def test_has_no_dict():
+    assert not hasattr(Budget(100), '__dict__')
+
+
+def test_freeze_thaw():
+    bud = Budget(100, 1, 30, date(2023, 3, 1), pk=5)
+    rec = bud.freeze()
+    assert isinstance(rec, BudgetRecord)
+    assert rec.start_day == date(2023, 3, 1).toordinal()
+    assert rec.end_date == date(2023, 3, 31)
+    assert rec.thaw() == bud
+    with pytest.raises(FrozenInstanceError):
+        rec.amount = 1
+    assert Budget(100, 1, 30, '2023-03-01', '2023-03-31', pk=5).freeze() == rec
@@ -1,11 +1,12 @@
 """
 Тесты для категорий расходов
 """
+from dataclasses import FrozenInstanceError
 from inspect import isgenerator
 
 import pytest
 
-from bookkeeper.models.category import Category
+from bookkeeper.models.category import Category, CategoryRecord
 from bookkeeper.repository.memory_repository import MemoryRepository
 
 
@@ -46,6 +47,19 @@ def test_eq():
     assert c1 == c2
 
 
+def test_has_no_dict():
+    assert not hasattr(Category('name'), '__dict__')
+
+
+def test_freeze_thaw():
+    c = Category(name='name', parent=1, pk=2)
+    rec = c.freeze()
+    assert isinstance(rec, CategoryRecord)
+    assert rec.thaw() == c
+    with pytest.raises(FrozenInstanceError):
+        rec.name = 'test'
+
+
 def test_get_parent(repo):
     c1 = Category(name='parent')
     pk = repo.add(c1)
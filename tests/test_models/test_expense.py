@@ -1,9 +1,10 @@
+from dataclasses import FrozenInstanceError
 from datetime import datetime
 
 import pytest
 
 from bookkeeper.repository.memory_repository import MemoryRepository
-from bookkeeper.models.expense import Expense
+from bookkeeper.models.expense import Expense, ExpenseRecord
 
 
 @pytest.fixture
@@ -28,3 +29,23 @@ def test_can_add_to_repo(repo):
     e = Expense(100, 1)
     pk = repo.add(e)
     assert e.pk == pk
+
+
+def test_freeze_thaw():
+    e = Expense(100, 1, expense_date=datetime(2023, 3, 12, 17, 6),
+                added_date=datetime(2023, 3, 12, 17, 7, 1, 5), comment='test', pk=3)
+    rec = e.freeze()
+    assert isinstance(rec, ExpenseRecord)
+    assert rec.expense_date == e.expense_date
+    assert rec.added_date == e.added_date
+    assert rec.thaw() == e
+    assert hash(rec) == hash(e.freeze())
+    with pytest.raises(FrozenInstanceError):
+        rec.amount = 1
+
+
+def test_freeze_str_dates():
+    # так даты возвращает SQLiteRepository с датами в виде текста
+    e = Expense(100, 1, '2023-03-12 17:06:00', '2023-03-12 17:07:01.000005', pk=3)
+    assert e.freeze() == Expense(100, 1, datetime(2023, 3, 12, 17, 6),
+                                 datetime(2023, 3, 12, 17, 7, 1, 5), pk=3).freeze()
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.models.recurring import RecurringExpense
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+def test_create_brief():
+    rule = RecurringExpense(100, 1)
+    assert rule.unit == 'month'
+    assert rule.every == 1
+    assert rule.end_date is None
+    assert rule.materialized is None
+    assert isinstance(rule.start_date, datetime)
+
+
+def test_invalid_rule():
+    with pytest.raises(ValueError):
+        RecurringExpense(100, 1, unit='fortnight')
+    with pytest.raises(ValueError):
+        RecurringExpense(100, 1, every=0)
+
+
+def test_can_add_to_repo():
+    repo = MemoryRepository()
+    rule = RecurringExpense(100, 1, comment='аренда')
+    pk = repo.add(rule)
+    assert rule.pk == pk
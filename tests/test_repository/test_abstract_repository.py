@@ -1,4 +1,14 @@
-from bookkeeper.repository.abstract_repository import AbstractRepository
+from datetime import datetime
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository, Between
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.log_repository import LogRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import as_datetime
 
 import pytest
 
@@ -15,6 +25,77 @@ def test_can_create_subclass():
         def get_all(self, where=None): pass
         def update(self, obj): pass
         def delete(self, pk): pass
+        def put_many(self, objs): pass
 
     t = Test()
     assert isinstance(t, AbstractRepository)
+
+
+def test_between():
+    assert 1 in Between(1, 3)
+    assert 3 not in Between(1, 3)
+    assert 0 not in Between(1)
+    assert 100 in Between(None, 101)
+    assert None not in Between()
+
+
+def test_add_many():
+    repo = MemoryRepository()
+    objects = [Category(str(i)) for i in range(3)]
+    assert repo.add_many(objects) == [1, 2, 3]
+    assert repo.get_all({'pk': Between(2)}) == objects[1:]
+
+
+def test_get_page():
+    repo = MemoryRepository()
+    objects = [Category(str(i)) for i in range(5)]
+    repo.add_many(objects)
+    assert repo.get_page(2) == [objects[4], objects[3]]
+    assert repo.get_page(2, before=4) == [objects[2], objects[1]]
+    assert repo.get_page(10, before=2) == [objects[0]]
+    assert repo.get_page(2, before=1) == []
+
+
+def test_put_many_is_abstract():
+    class Test(AbstractRepository):
+        def add(self, obj): pass
+        def get(self, pk): pass
+        def get_all(self, where=None): pass
+        def update(self, obj): pass
+        def delete(self, pk): pass
+
+    with pytest.raises(TypeError):
+        Test()
+
+
+@pytest.fixture(params=['memory', 'columnar', 'sqlite', 'partitioned', 'log'])
+def any_repo(request, tmp_path):
+    if request.param == 'memory':
+        repo = MemoryRepository()
+    elif request.param == 'columnar':
+        repo = ColumnarMemoryRepository(Expense)
+    elif request.param == 'log':
+        repo = LogRepository(str(tmp_path / 'test.log'), Expense)
+    else:
+        cls = (PartitionedSQLiteRepository if request.param == 'partitioned'
+               else SQLiteRepository)
+        repo = cls(str(tmp_path / 'test.db'), Expense)
+        repo.create_table()
+    yield repo
+    if request.param == 'log':
+        repo.close()
+
+
+def test_put_many(any_repo):
+    any_repo.add_many([Expense(k, 1, datetime(2023, 1, k)) for k in (1, 2, 3)])
+    any_repo.delete(2)
+    any_repo.put_many([Expense(20, 2, datetime(2023, 2, 1), pk=2),
+                       Expense(30, 3, datetime(2023, 3, 1), pk=3),
+                       Expense(70, 7, datetime(2023, 7, 1), pk=7)])
+    assert any_repo.add(Expense(8, 1, datetime(2023, 8, 1))) == 8
+    assert [(exp.pk, exp.amount, exp.category)
+            for exp in sorted(any_repo.get_all(), key=lambda exp: exp.pk)] == [
+        (1, 1, 1), (2, 20, 2), (3, 30, 3), (7, 70, 7), (8, 8, 1)]
+    assert as_datetime(any_repo.get(3).expense_date) == datetime(2023, 3, 1)
+    with pytest.raises(ValueError):
+        any_repo.put_many([Expense(1, 1)])
@@ -0,0 +1,61 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.budgeting.evaluation import category_totals
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.archive import archive_expenses, archived_rows, summary_table
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture(params=['sqlite', 'sqlite-epoch', 'partitioned'])
+def repo(request, tmp_path):
+    partitioned = request.param == 'partitioned'
+    cls = PartitionedSQLiteRepository if partitioned else SQLiteRepository
+    repo = cls(str(tmp_path / 'test.db'), Expense,
+               epoch_seconds=request.param != 'sqlite')
+    repo.create_table()
+    return repo
+
+
+def make_expenses(repo):
+    objects = [Expense(100 * (i + 1), i % 2, expense_date=datetime(2023, month, day, 12),
+                       comment=f'#{i}')
+               for i, (month, day) in enumerate([(1, 5), (1, 5), (1, 5), (2, 7),
+                                                 (3, 1), (3, 20)])]
+    repo.add_many(objects)
+    return objects
+
+
+def test_archive_expenses(repo, tmp_path):
+    objects = make_expenses(repo)
+    periods = [date(2023, 1, 1), date(2023, 1, 5), date(2023, 2, 1), date(2023, 3, 1)]
+    totals = category_totals(repo, periods, date(2023, 4, 1))
+    assert summary_table(repo) is None
+
+    archive_file = str(tmp_path / 'archive.db')
+    result = archive_expenses(repo, archive_file, date(2023, 3, 1))
+    assert result == (4, 2, 3)
+    assert [obj.pk for obj in repo.get_all()] == [5, 6]
+    assert summary_table(repo) == 'expense_summary'
+    assert category_totals(repo, periods, date(2023, 4, 1)) == totals
+    rows = list(archived_rows(archive_file))
+    assert [row[-1] for row in rows] == [1, 2, 3, 4]
+    comment = repo.columns.index('comment')
+    assert [row[comment] for row in rows] == ['#0', '#1', '#2', '#3']
+    assert len(list(archived_rows(archive_file, month='2023-02'))) == 1
+
+    # повторный запуск дополняет архив и итоги
+    assert archive_expenses(repo, archive_file, date(2023, 4, 1)) == (2, 1, 5)
+    assert repo.get_all() == []
+    assert category_totals(repo, periods, date(2023, 4, 1)) == totals
+    assert len(list(archived_rows(archive_file))) == len(objects)
+    assert repo.add(Expense(1, 1, expense_date=datetime(2023, 4, 1))) == 7
+
+
+def test_archive_nothing(repo, tmp_path):
+    make_expenses(repo)
+    assert archive_expenses(repo, str(tmp_path / 'archive.db'),
+                            date(2022, 1, 1)) == (0, 0, 0)
+    assert len(repo.get_all()) == 6
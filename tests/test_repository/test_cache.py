@@ -0,0 +1,151 @@
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.cache import (CacheStats, QueryCache, approximate_size,
+                                         enable_versions, table_version)
+from bookkeeper.repository.cascade import delete_category
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, shared_connection
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'test.db')
+
+
+@pytest.fixture
+def exp_repo(db_file):
+    repo = SQLiteRepository(db_file, Expense)
+    repo.create_table()
+    return repo
+
+
+@pytest.fixture
+def cat_repo(db_file):
+    repo = SQLiteRepository(db_file, Category)
+    repo.create_table()
+    return repo
+
+
+def test_versions(exp_repo, cat_repo, db_file):
+    enable_versions(exp_repo)
+    enable_versions(cat_repo)
+    enable_versions(exp_repo)
+    assert table_version(exp_repo) == table_version(cat_repo) == 0
+    exp_repo.add_many([Expense(10, 1), Expense(20, 2)])
+    exp = exp_repo.get(1)
+    exp.amount = 15
+    exp_repo.update(exp)
+    exp_repo.delete(2)
+    assert table_version(exp_repo) == 4
+    with shared_connection(db_file) as con:
+        con.execute('UPDATE expense SET amount = amount + 1')
+    assert table_version(exp_repo) == 5
+    cat_repo.add(Category('food'))
+    delete_category(cat_repo, exp_repo, 1)
+    assert table_version(cat_repo) == 2
+    assert table_version(exp_repo) == 6
+
+
+def test_get(exp_repo, cat_repo):
+    cache = QueryCache()
+    cache.watch([exp_repo, cat_repo])
+    calls = []
+
+    def total():
+        calls.append(1)
+        return sum(exp.amount for exp in exp_repo.get_all())
+
+    exp_repo.add(Expense(10, 1))
+    assert cache.get('total', [exp_repo, cat_repo], total) == 10
+    assert cache.get('total', [exp_repo, cat_repo], total) == 10
+    assert len(calls) == 1
+    cat_repo.add(Category('food'))
+    assert cache.get('total', [exp_repo, cat_repo], total) == 10
+    exp_repo.add(Expense(20, 1))
+    assert cache.get('total', [exp_repo, cat_repo], total) == 30
+    assert cache.get('total', [exp_repo], total) == 30
+    assert len(calls) == 4
+    stats = cache.stats()
+    assert stats[:5] == (1, 4, 0, 0, 2)
+    assert stats.hit_ratio == 0.2
+    cache.clear()
+    assert cache.stats()[:6] == (1, 4, 0, 0, 0, 0)
+
+
+def test_get_all(exp_repo):
+    cache = QueryCache()
+    cache.watch([exp_repo])
+    exp_repo.add_many([Expense(10, 1), Expense(20, 2)])
+    objs = cache.get_all(exp_repo, {'category': 1})
+    assert [exp.amount for exp in objs] == [10]
+    objs[0].amount = 100
+    with exp_repo.trace_sql() as queries:
+        assert [exp.amount for exp in cache.get_all(exp_repo, {'category': 1})] == [10]
+    assert not [sql for sql in queries if 'FROM expense' in sql]
+    assert [exp.amount for exp in cache.get_all(exp_repo)] == [10, 20]
+
+
+def test_bypassed(db_file, exp_repo, tmp_path):
+    cache = QueryCache()
+    repos = [MemoryRepository(),  # таблицы не созданы:
+             PartitionedSQLiteRepository(str(tmp_path / 'other.db'), Expense),
+             SQLiteRepository(db_file, Category)]
+    cache.watch(repos)
+    for repo in repos + [exp_repo]:  # exp_repo не подключен
+        assert cache.get('key', [repo], lambda: 1) == 1
+        assert cache.get('key', [repo], lambda: 2) == 2
+    assert cache.stats() == CacheStats(0, 0, 8, 0, 0, 0)
+    # чтение не создает таблицу версий и триггеры
+    assert not exp_repo.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+
+
+def test_partitioned(tmp_path):
+    repo = PartitionedSQLiteRepository(str(tmp_path / 'test.db'), Expense)
+    repo.create_table()
+    repo.add(Expense(10, 1, datetime(2024, 1, 5)))
+    cache = QueryCache()
+    cache.watch([repo])
+    enable_versions(repo)
+
+    def total():
+        return sum(exp.amount for exp in repo.get_all())
+
+    assert cache.get('total', [repo], total) == 10
+    repo.add(Expense(20, 1, datetime(2024, 2, 5)))  # новая секция
+    assert table_version(repo) == 1
+    assert cache.get('total', [repo], total) == 30
+    exp = repo.get(1)
+    exp.amount = 15
+    repo.update(exp)
+    assert cache.get('total', [repo], total) == 35
+    assert cache.get('total', [repo], total) == 35
+    assert cache.stats()[:3] == (1, 3, 0)
+
+
+def test_eviction(exp_repo):
+    value = list(range(100))
+    size = approximate_size(value)
+    cache = QueryCache(max_bytes=2 * size)
+    cache.watch([exp_repo])
+    for key in ('a', 'b', 'a', 'c'):
+        cache.get(key, [exp_repo], lambda: list(value))
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions) == (1, 3, 1)
+    assert (stats.entries, stats.size) == (2, 2 * size)
+    cache.get('a', [exp_repo], list)
+    assert cache.stats().hits == 2  # 'b' удален как давно не запрашивавшийся
+    cache.get('big', [exp_repo], lambda: list(range(1000)))
+    assert cache.stats().entries == 2
+
+
+def test_approximate_size():
+    assert approximate_size(1) == approximate_size(2)
+    assert approximate_size([]) < approximate_size([1]) < approximate_size([1, 2])
+    exps = [Expense(k, 1, datetime(2023, 1, 1)) for k in range(1000)]
+    assert approximate_size(exps) > 1000 * approximate_size(exps[0]) * 0.9
+    assert approximate_size({k: [k] for k in range(100)}) > approximate_size([0] * 100)
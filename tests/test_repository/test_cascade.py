@@ -0,0 +1,149 @@
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.budgeting.evaluation import category_totals
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.archive import archive_expenses
+from bookkeeper.repository.cascade import CascadeResult, delete_category
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture(params=['memory', 'columnar', 'sqlite', 'partitioned'])
+def repos(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepository[Category](), MemoryRepository[Expense]()
+    if request.param == 'columnar':
+        return ColumnarMemoryRepository(Category), ColumnarMemoryRepository(Expense)
+    db_file = str(tmp_path / 'test.db')
+    exp_cls = (PartitionedSQLiteRepository if request.param == 'partitioned'
+               else SQLiteRepository)
+    cat_repo = SQLiteRepository(db_file, Category)
+    exp_repo = exp_cls(db_file, Expense)
+    cat_repo.create_table()
+    exp_repo.create_table()
+    return cat_repo, exp_repo
+
+
+def make_ledger(cat_repo, exp_repo):
+    """ продукты (1) -> мясо (2) -> сырое мясо (3), фрукты (4) """
+    cat_repo.add_many([Category('продукты'), Category('мясо', 1),
+                       Category('сырое мясо', 2), Category('фрукты', 1)])
+    exp_repo.add_many([Expense(100 * (i + 1), i % 4 + 1,
+                               expense_date=datetime(2023, 1 + i % 3, 1 + i, 12))
+                       for i in range(8)])
+
+
+def categories(exp_repo):
+    return sorted((exp.pk, exp.category) for exp in exp_repo.get_all())
+
+
+def test_delete_category(repos):
+    cat_repo, exp_repo = repos
+    make_ledger(cat_repo, exp_repo)
+    assert delete_category(cat_repo, exp_repo, 2) == CascadeResult(2, 1)
+    assert cat_repo.get(2) is None
+    assert cat_repo.get(3).parent == 1
+    assert cat_repo.get(4).parent == 1
+    assert categories(exp_repo) == [(1, 1), (2, 1), (3, 3), (4, 4),
+                                    (5, 1), (6, 1), (7, 3), (8, 4)]
+
+
+def test_delete_top_level(tmp_path):
+    cat_repo = SQLiteRepository(str(tmp_path / 'test.db'), Category)
+    exp_repo = SQLiteRepository(str(tmp_path / 'test.db'), Expense)
+    cat_repo.create_table()
+    exp_repo.create_table()
+    make_ledger(cat_repo, exp_repo)
+    assert delete_category(cat_repo, exp_repo, 1) == CascadeResult(2, 2)
+    assert [cat.parent for cat in cat_repo.get_all()] == [None, 2, None]
+    assert [exp.category for exp in exp_repo.get_all({'category': None})] == [None] * 2
+
+
+def test_delete_self_parented():
+    cat_repo, exp_repo = MemoryRepository[Category](), MemoryRepository[Expense]()
+    cat_repo.add(Category('другое', 1))
+    cat_repo.add(Category('разное', 1))
+    exp_repo.add(Expense(10, 1))
+    assert delete_category(cat_repo, exp_repo, 1) == CascadeResult(1, 1)
+    assert cat_repo.get(2).parent is None
+    assert exp_repo.get(1).category is None
+
+
+def test_delete_missing(repos):
+    cat_repo, exp_repo = repos
+    make_ledger(cat_repo, exp_repo)
+    before = categories(exp_repo)
+    with pytest.raises(KeyError):
+        delete_category(cat_repo, exp_repo, 100)
+    assert categories(exp_repo) == before
+    assert len(cat_repo.get_all()) == 4
+
+
+def test_failure_rolls_back(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    cat_repo = SQLiteRepository(db_file, Category)
+    exp_repo = SQLiteRepository(db_file, Expense)
+    cat_repo.create_table()
+    exp_repo.create_table()
+    make_ledger(cat_repo, exp_repo)
+    before = categories(exp_repo)
+    cat_repo.execute('CREATE TRIGGER fail BEFORE DELETE ON category '
+                     "BEGIN SELECT RAISE(ABORT, 'fail'); END")
+    with pytest.raises(sqlite3.IntegrityError):
+        delete_category(cat_repo, exp_repo, 2)
+    assert categories(exp_repo) == before
+    assert cat_repo.get(3).parent == 2
+
+
+def test_memory_failure_rolls_back():
+    class FailingRepository(MemoryRepository):
+        def delete(self, pk):
+            raise RuntimeError('fail')
+
+    cat_repo, exp_repo = FailingRepository(), MemoryRepository[Expense]()
+    make_ledger(cat_repo, exp_repo)
+    before = categories(exp_repo)
+    with pytest.raises(RuntimeError):
+        delete_category(cat_repo, exp_repo, 2)
+    assert categories(exp_repo) == before
+    assert cat_repo.get(3).parent == 2
+    assert [exp.pk for exp in exp_repo.get_all({'category': 2})] == [2, 6]
+
+
+def test_delete_top_level_merges_summary(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    cat_repo = SQLiteRepository(db_file, Category)
+    exp_repo = SQLiteRepository(db_file, Expense)
+    cat_repo.create_table()
+    exp_repo.create_table()
+    cat_repo.add(Category('продукты'))
+    exp_repo.add_many([Expense(10, 1, datetime(2023, 1, 1, 12)),
+                       Expense(20, None, datetime(2023, 1, 1, 13))])
+    archive_expenses(exp_repo, str(tmp_path / 'archive.db'), date(2023, 1, 2))
+    delete_category(cat_repo, exp_repo, 1)
+    assert exp_repo.execute('SELECT category, amount, count FROM expense_summary') == [
+        (0, 30, 2)]
+
+
+def test_delete_merges_summary(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    cat_repo = SQLiteRepository(db_file, Category)
+    exp_repo = SQLiteRepository(db_file, Expense)
+    cat_repo.create_table()
+    exp_repo.create_table()
+    make_ledger(cat_repo, exp_repo)
+    periods = [date(2023, 1, 1), date(2023, 2, 1), date(2023, 3, 1)]
+    totals = category_totals(exp_repo, periods, date(2023, 4, 1))
+    archive_expenses(exp_repo, str(tmp_path / 'archive.db'), date(2023, 1, 7))
+    delete_category(cat_repo, exp_repo, 2)
+    after = category_totals(exp_repo, periods, date(2023, 4, 1))
+    assert 2 not in after
+    assert after[1] == [a + b for a, b in zip(totals[1], totals[2])]
+    assert exp_repo.execute('SELECT COUNT(*) FROM expense_summary '
+                            'WHERE category = 2') == [(0,)]
@@ -0,0 +1,89 @@
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.category_index import (CategoryIndex, SQLiteCategoryIndex,
+                                                  category_index)
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repo(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepository()
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), Category)
+    repo.create_table()
+    return repo
+
+
+@pytest.fixture
+def cats(repo):
+    # мясо - и в продуктах, и в кормах для животных
+    return Category.create_from_tree([('продукты', None), ('мясо', 'продукты'),
+                                      ('корма', None), ('meat', 'корма')], repo)
+
+
+def test_factory(repo):
+    index = category_index(repo)
+    assert type(index) is (CategoryIndex if isinstance(repo, MemoryRepository)
+                           else SQLiteCategoryIndex)
+
+
+def test_find(repo, cats):
+    index = category_index(repo)
+    products, meat, feed, feed_meat = [cat.pk for cat in cats]
+    assert index.find('Продукты') == products
+    assert index.find(' мясо ') == meat
+    assert index.find('MEAT') == feed_meat
+    assert index.find('рыба') is None
+    assert index.find_in(None, 'корма') == feed
+    assert index.find_in(feed, 'Meat') == feed_meat
+    assert index.find_in(products, 'корма') is None
+    assert index.find_path(['продукты', 'мясо']) == meat
+    assert index.find_path(['корма', 'мясо']) is None
+    assert index.path(feed_meat) == ['корма', 'meat']
+    assert index.path(100) == []
+
+
+def test_duplicate_names(repo, cats):
+    index = category_index(repo)
+    feed = cats[2].pk
+    dup = Category('мясо', feed)
+    repo.add(dup)
+    index.add(dup)
+    assert index.find('мясо') == cats[1].pk
+    assert index.find_in(feed, 'мясо') == dup.pk
+    repo.delete(cats[1].pk)
+    index.remove(cats[1].pk)
+    assert index.find('мясо') == dup.pk
+
+
+def test_update(repo, cats):
+    index = category_index(repo)
+    meat = cats[1]
+    meat.name = 'говядина'
+    repo.update(meat)
+    index.update(meat)
+    assert index.find('мясо') is None
+    assert index.find('Говядина') == meat.pk
+
+
+def test_self_parent_is_top_level(repo):
+    other = Category('другое')
+    repo.add(other)
+    other.parent = other.pk
+    repo.update(other)
+    child = Category('книги', other.pk)
+    repo.add(child)
+    index = category_index(repo)
+    assert index.find_path(['другое', 'книги']) == child.pk
+    assert index.path(child.pk) == ['другое', 'книги']
+
+
+def test_sqlite_uses_index(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), Category)
+    repo.create_table()
+    category_index(repo)
+    plan = repo.execute('EXPLAIN QUERY PLAN SELECT MIN(pk) FROM category '
+                        'WHERE name COLLATE NOCASE IN (?, ?)', ('a', 'a'))
+    assert 'category_name_idx' in str(plan)
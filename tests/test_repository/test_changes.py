@@ -0,0 +1,249 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.archive import archive_expenses, summary_table
+from bookkeeper.repository.cascade import delete_category
+from bookkeeper.repository.changes import (Change, SyncConflict, SyncResult,
+                                           compact_changes, enable_changes, last_seq,
+                                           local_changes, read_changes, sync_changes)
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.sync import copy_summary, sync
+from bookkeeper.utils import as_datetime
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'source.db')
+
+
+@pytest.fixture
+def source(db_file):
+    repos = []
+    for cls in (Expense, Category):
+        repo = SQLiteRepository(db_file, cls)
+        repo.create_table()
+        enable_changes(repo)
+        repos.append(repo)
+    return repos
+
+
+def state(repo):
+    return sorted((obj.pk, obj.amount, obj.category, as_datetime(obj.expense_date))
+                  for obj in repo.get_all())
+
+
+def test_change_log(source, db_file):
+    exp_repo, cat_repo = source
+    assert last_seq(db_file) == 0
+    cat_repo.add(Category('food'))
+    exp_repo.add_many([Expense(10, 1), Expense(20, 1)])
+    exp = exp_repo.get(1)
+    exp.amount = 15
+    exp_repo.update(exp)
+    exp_repo.delete(2)
+    enable_changes(exp_repo)
+    assert read_changes(db_file) == [
+        Change(1, 'category', 1, 'insert', 1),
+        Change(2, 'expense', 1, 'insert', 1),
+        Change(3, 'expense', 2, 'insert', 1),
+        Change(4, 'expense', 1, 'update', 2),
+        Change(5, 'expense', 2, 'delete', 2)]
+    assert read_changes(db_file, 3, limit=1) == [Change(4, 'expense', 1, 'update', 2)]
+    assert last_seq(db_file) == 5
+    assert compact_changes(db_file) == 2
+    exp_repo.update(exp)
+    assert read_changes(db_file, 3) == [Change(4, 'expense', 1, 'update', 2),
+                                        Change(5, 'expense', 2, 'delete', 2),
+                                        Change(6, 'expense', 1, 'update', 3)]
+
+
+def test_bulk_sql_is_captured(source, db_file, tmp_path):
+    exp_repo, cat_repo = source
+    cat_repo.add_many([Category('food'), Category('meat', 1)])
+    exp_repo.add_many([Expense(k, 2, datetime(2023, 1, k)) for k in range(1, 6)])
+    since = last_seq(db_file)
+    delete_category(cat_repo, exp_repo, 2)
+    archive_expenses(exp_repo, str(tmp_path / 'archive.db'), date(2023, 1, 3))
+    ops = [(change.table, change.pk, change.op)
+           for change in read_changes(db_file, since)]
+    assert ops.count(('category', 2, 'delete')) == 1
+    assert sum(op == 'update' for table, _, op in ops if table == 'expense') == 5
+    assert sorted(pk for table, pk, op in ops
+                  if op == 'delete' and table == 'expense') == [1, 2]
+
+
+@pytest.mark.parametrize('target_kind', ['memory', 'columnar', 'sqlite-epoch'])
+def test_sync(source, db_file, tmp_path, target_kind):
+    exp_repo, cat_repo = source
+    if target_kind == 'memory':
+        target = MemoryRepository()
+    elif target_kind == 'columnar':
+        target = ColumnarMemoryRepository(Expense)
+    else:
+        target = SQLiteRepository(str(tmp_path / 'target.db'), Expense,
+                                  epoch_seconds=True)
+        target.create_table()
+    exp_repo.add_many([Expense(k, 1, datetime(2023, 1, k)) for k in range(1, 11)])
+    result = sync_changes([(exp_repo, target)], batch_size=3)
+    assert result == SyncResult(10, 10, 10, 0)
+    assert state(target) == state(exp_repo)
+
+    exp_repo.delete(3)
+    changed = exp_repo.get(5)
+    changed.amount = 50
+    exp_repo.update(changed)
+    exp_repo.add(Expense(11, 2, datetime(2023, 2, 1)))
+    exp_repo.delete(11)
+    exp_repo.add(Expense(12, 2, datetime(2023, 2, 2)))
+    cat_repo.add(Category('food'))
+    result = sync_changes([(exp_repo, target)], result.seq, batch_size=4)
+    # добавленный и удаленный расход переносится как удаление
+    assert result == SyncResult(16, 6, 2, 1)
+    assert state(target) == state(exp_repo)
+    assert sync_changes([(exp_repo, target)], result.seq) == SyncResult(16, 0, 0, 0)
+
+
+def test_sync_reads_only_changes(source, db_file, tmp_path):
+    exp_repo, _ = source
+    exp_repo.add_many([Expense(k, 1) for k in range(1000)])
+    target = SQLiteRepository(str(tmp_path / 'target.db'), Expense)
+    target.create_table()
+    seq = sync_changes([(exp_repo, target)]).seq
+    exp_repo.add(Expense(5, 5))
+    with exp_repo.trace_sql() as queries:
+        assert sync_changes([(exp_repo, target)], seq).saved == 1
+    assert [sql for sql in queries if 'FROM expense' in sql] == [
+        'SELECT * FROM expense WHERE pk IN (1001)']
+
+
+def test_partitioned(db_file, tmp_path):
+    repo = PartitionedSQLiteRepository(db_file, Expense)
+    repo.create_table()
+    repo.add(Expense(10, 1, datetime(2024, 1, 5)))
+    enable_changes(repo)
+    enable_changes(repo)
+    repo.add(Expense(20, 1, datetime(2024, 2, 5)))
+    exp = repo.get(1)
+    exp.amount = 15
+    repo.update(exp)
+    repo.delete(2)
+    assert read_changes(db_file) == [
+        Change(1, 'expense', 1, 'insert', 1),
+        Change(2, 'expense', 2, 'insert', 1),
+        Change(3, 'expense', 1, 'update', 2),
+        Change(4, 'expense', 2, 'delete', 2)]
+    target = SQLiteRepository(str(tmp_path / 'target.db'), Expense)
+    target.create_table()
+    sync_changes([(repo, target)])
+    assert state(target) == state(repo)
+
+
+def test_sync_databases(tmp_path):
+    server, laptop = str(tmp_path / 'server.db'), str(tmp_path / 'laptop.db')
+    assert sync(server, laptop) == SyncResult(0, 0, 0, 0)
+    exp_repo = SQLiteRepository(server, Expense)
+    cat_repo = SQLiteRepository(server, Category)
+    cat_repo.add(Category('food'))
+    exp_repo.add_many([Expense(10, 1), Expense(20, 1)])
+    assert sync(server, laptop) == SyncResult(3, 3, 3, 0)
+    exp_repo.delete(1)
+    assert sync(server, laptop) == SyncResult(4, 1, 0, 1)
+    assert [exp.amount for exp in SQLiteRepository(laptop, Expense).get_all()] == [20]
+    assert [cat.name for cat in SQLiteRepository(laptop, Category).get_all()] == ['food']
+    # журнал сжимается после синхронизации: добавление удаленного расхода удалено
+    assert sync(server, laptop, since=0).changes == 3
+
+
+def test_sync_conflict(tmp_path):
+    server, laptop = str(tmp_path / 'server.db'), str(tmp_path / 'laptop.db')
+    exp_repo = SQLiteRepository(server, Expense)
+    exp_repo.create_table()
+    exp_repo.add_many([Expense(10, 1), Expense(20, 1)])
+    sync(server, laptop)
+    assert sync(server, laptop) == SyncResult(2, 0, 0, 0)
+    local = SQLiteRepository(laptop, Expense)
+    exp = local.get(1)
+    exp.amount = 15
+    local.update(exp)
+    exp_repo.delete(1)
+    with pytest.raises(SyncConflict) as error:
+        sync(server, laptop)
+    assert [(change.table, change.pk, change.op) for change in error.value.changes] == [
+        ('expense', 1, 'update')]
+    assert [exp.amount for exp in local.get_all()] == [15, 20]
+    # первая синхронизация в базу, где уже есть записи
+    copy = str(tmp_path / 'copy.db')
+    assert sync(laptop, copy).saved == 2
+    with pytest.raises(SyncConflict):
+        sync(server, copy)
+
+
+def test_sync_target_without_log(source, tmp_path):
+    exp_repo, _ = source
+    target = SQLiteRepository(str(tmp_path / 'target.db'), Expense)
+    target.create_table()
+    with pytest.raises(ValueError):
+        sync_changes([(exp_repo, target)], target_since=0)
+    enable_changes(target)
+    assert local_changes([target], 0) == []
+    exp_repo.add(Expense(10, 1))
+    assert sync_changes([(exp_repo, target)], target_since=0).saved == 1
+    assert local_changes([target], 0) == [Change(1, 'expense', 1, 'insert', 1)]
+
+
+def test_deleted_while_disabled(db_file):
+    repo = SQLiteRepository(db_file, Expense)
+    repo.create_table()
+    enable_changes(repo)
+    repo.add_many([Expense(10, 1), Expense(20, 1)])
+    repo.migrate_to_epoch()  # таблица пересоздается без триггеров
+    repo.delete(1)
+    enable_changes(repo)
+    assert read_changes(db_file, 2) == [Change(3, 'expense', 1, 'delete', 2),
+                                        Change(4, 'expense', 2, 'insert', 2)]
+
+
+def test_enable_on_existing_rows(db_file):
+    repo = SQLiteRepository(db_file, Category)
+    repo.create_table()
+    repo.add_many([Category('food'), Category('books')])
+    enable_changes(repo)
+    repo.delete(1)
+    assert read_changes(db_file) == [Change(1, 'category', 1, 'insert', 1),
+                                     Change(2, 'category', 2, 'insert', 1),
+                                     Change(3, 'category', 1, 'delete', 2)]
+
+
+def test_sync_archived(tmp_path):
+    server, laptop = str(tmp_path / 'server.db'), str(tmp_path / 'laptop.db')
+    exp_repo = SQLiteRepository(server, Expense)
+    exp_repo.create_table()
+    exp_repo.add_many([Expense(k, 1 + k % 2, datetime(2023, 1, k)) for k in range(1, 11)])
+    assert sync(server, laptop).saved == 10
+    archive_expenses(exp_repo, str(tmp_path / 'archive.db'), date(2023, 1, 6))
+    assert sync(server, laptop).deleted == 5
+    target = SQLiteRepository(laptop, Expense)
+    assert state(target) == state(exp_repo)
+    summary = 'SELECT * FROM expense_summary ORDER BY 1, 2'
+    assert target.execute(summary) == exp_repo.execute(summary)
+    assert sum(row[2] for row in target.execute(summary)) == 1 + 2 + 3 + 4 + 5
+
+
+def test_copy_summary_formats(tmp_path):
+    source = SQLiteRepository(str(tmp_path / 'source.db'), Expense, epoch_seconds=True)
+    source.create_table()
+    target = SQLiteRepository(str(tmp_path / 'target.db'), Expense)
+    target.create_table()
+    assert copy_summary(source, target) == 0
+    assert summary_table(target) is None
+    source.add_many([Expense(10, 1, datetime(2023, 1, 1, 12)), Expense(5, 0)])
+    archive_expenses(source, str(tmp_path / 'archive.db'), date(2023, 1, 2))
+    assert copy_summary(source, target) == 1
+    assert target.execute('SELECT * FROM expense_summary') == [
+        ('2023-01-01 00:00:00', 1, 10, 1)]
@@ -0,0 +1,114 @@
+import json
+import struct
+from array import array
+from dataclasses import astuple
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.column_files import (ColumnFiles, export_table, import_table,
+                                                read_npy, write_npy)
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def make_repo(kind, cls, tmp_path, name='test.db'):
+    if kind == 'memory':
+        return MemoryRepository()
+    if kind == 'columnar':
+        return ColumnarMemoryRepository(cls)
+    db_file = str(tmp_path / name)
+    if kind == 'partitioned':
+        repo = PartitionedSQLiteRepository(db_file, cls)
+    else:
+        repo = SQLiteRepository(db_file, cls, epoch_seconds=kind == 'sqlite-epoch')
+    repo.create_table()
+    return repo
+
+
+def rows(objs):
+    # SQLiteRepository с датами в виде текста может вернуть даты строками
+    return [tuple(map(str, astuple(obj))) for obj in objs]
+
+
+EXPENSES = [Expense(100, 1, datetime(2023, 1, 1, 12, 30), datetime(2023, 1, 2), 'хлеб'),
+            Expense(250, 2, datetime(1969, 12, 31, 23), datetime(2023, 2, 1), ''),
+            Expense(7, 1, datetime(2023, 3, 1), datetime(2023, 3, 1), 'хлеб')]
+
+
+def test_npy_format(tmp_path):
+    path = str(tmp_path / 'a.npy')
+    write_npy(path, '<i8', array('q', [1, -2, 3]))
+    with open(path, 'rb') as file:
+        data = file.read()
+    assert data[:8] == b'\x93NUMPY\x01\x00'
+    (header_len,) = struct.unpack('<H', data[8:10])
+    assert (10 + header_len) % 64 == 0
+    assert "'descr': '<i8'" in data[10:10 + header_len].decode()
+    assert list(read_npy(path)) == [1, -2, 3]
+    (tmp_path / 'b.npy').write_bytes(b'not npy')
+    with pytest.raises(ValueError):
+        read_npy(str(tmp_path / 'b.npy'))
+
+
+@pytest.mark.parametrize('source', ['memory', 'sqlite', 'sqlite-epoch'])
+@pytest.mark.parametrize('target', ['columnar', 'sqlite', 'sqlite-epoch', 'partitioned'])
+def test_expenses_round_trip(tmp_path, source, target):
+    repo = make_repo(source, Expense, tmp_path)
+    repo.add_many(Expense(e.amount, e.category, e.expense_date, e.added_date, e.comment)
+                  for e in EXPENSES)
+    repo.delete(2)
+    directory = str(tmp_path / 'expense')
+    assert export_table(repo, Expense, directory) == 2
+    files = ColumnFiles(directory, Expense)
+    assert len(files) == 2
+    assert list(files.column('pk')) == [1, 3]
+    assert list(files.column('amount')) == [100, 7]
+    assert files.strings('comment') == ['хлеб']
+    assert rows(files.objects()) == rows(repo.get_all())
+    copy = make_repo(target, Expense, tmp_path, 'copy.db')
+    assert import_table(directory, copy, Expense) == 2
+    assert rows(copy.get_all()) == rows(repo.get_all())
+    assert copy.add(Expense(1, 1)) == 4
+
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite'])
+def test_nullable_fields(tmp_path, kind):
+    cat_repo = make_repo(kind, Category, tmp_path)
+    Category.create_from_tree([('продукты', None), ('мясо', 'продукты')], cat_repo)
+    bud_repo = make_repo(kind, Budget, tmp_path)
+    bud_repo.add_many([Budget(100, 1, 7, date(2023, 3, 6)), Budget(50, 2, 1)])
+    for repo, cls in [(cat_repo, Category), (bud_repo, Budget)]:
+        directory = str(tmp_path / cls.__name__)
+        export_table(repo, cls, directory)
+        copy = make_repo(kind, cls, tmp_path, 'copy.db')
+        import_table(directory, copy, cls)
+        assert rows(copy.get_all()) == rows(repo.get_all())
+    assert list(read_npy(str(tmp_path / 'Budget' / 'start_date.npy')))[0] == (
+        date(2023, 3, 6) - date(1970, 1, 1)).days
+
+
+@pytest.mark.parametrize('target', ['memory', 'columnar'])
+def test_import_keeps_references(tmp_path, target):
+    repo = MemoryRepository[Category]()
+    repo.put_many([Category('b', pk=2), Category('c', 2, pk=3)])
+    directory = str(tmp_path / 'category')
+    export_table(repo, Category, directory)
+    copy = make_repo(target, Category, tmp_path)
+    import_table(directory, copy, Category)
+    assert [(cat.pk, cat.name, cat.parent) for cat in copy.get_all()] == [
+        (2, 'b', None), (3, 'c', 2)]
+
+
+def test_wrong_model(tmp_path):
+    directory = str(tmp_path / 'category')
+    export_table(MemoryRepository(), Category, directory)
+    with open(f'{directory}/meta.json', encoding='utf-8') as file:
+        assert json.load(file)['count'] == 0
+    with pytest.raises(ValueError):
+        ColumnFiles(directory, Expense)
@@ -0,0 +1,180 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from bookkeeper.repository.abstract_repository import Between
+from bookkeeper.repository.columnar_repository import ColumnarMemoryRepository
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.category import Category
+
+import pytest
+
+
+@pytest.fixture
+def repo():
+    return ColumnarMemoryRepository(Expense)
+
+
+def make_expenses(repo, n=5):
+    objects = [Expense(i * 10, i % 2, expense_date=datetime(2023, 3, i + 1, 12, 30),
+                       comment=f'comment {i % 3}') for i in range(n)]
+    for o in objects:
+        repo.add(o)
+    return objects
+
+
+def test_crud(repo):
+    obj = Expense(100, 1, comment='test')
+    pk = repo.add(obj)
+    assert obj.pk == pk
+    assert repo.get(pk) == obj
+    obj2 = Expense(200, 2, comment='other', pk=pk)
+    repo.update(obj2)
+    assert repo.get(pk) == obj2
+    repo.delete(pk)
+    assert repo.get(pk) is None
+
+
+def test_get_returns_new_object(repo):
+    obj = Expense(100, 1)
+    pk = repo.add(obj)
+    assert repo.get(pk) is not obj
+
+
+def test_cannot_add_with_pk(repo):
+    with pytest.raises(ValueError):
+        repo.add(Expense(100, 1, pk=1))
+
+
+def test_cannot_add_without_pk(repo):
+    with pytest.raises(ValueError):
+        repo.add(0)
+
+
+def test_cannot_add_wrong_type(repo):
+    with pytest.raises(TypeError):
+        repo.add(Expense('100', 1))
+    assert repo.get_all() == []
+
+
+def test_cannot_delete_unexistent(repo):
+    with pytest.raises(KeyError):
+        repo.delete(1)
+
+
+def test_cannot_update_without_pk(repo):
+    with pytest.raises(ValueError):
+        repo.update(Expense(100, 1))
+
+
+def test_cannot_update_unexistent(repo):
+    with pytest.raises(KeyError):
+        repo.update(Expense(100, 1, pk=10))
+
+
+def test_get_all(repo):
+    objects = make_expenses(repo)
+    assert repo.get_all() == objects
+
+
+def test_get_all_with_condition(repo):
+    objects = make_expenses(repo)
+    assert repo.get_all({'amount': 20}) == [objects[2]]
+    assert repo.get_all({'category': 1}) == objects[1::2]
+    assert repo.get_all({'comment': 'comment 0', 'category': 1}) == [objects[3]]
+    assert repo.get_all({'expense_date': datetime(2023, 3, 2, 12, 30)}) == [objects[1]]
+    assert repo.get_all({'pk': objects[4].pk}) == [objects[4]]
+
+
+def test_get_all_no_match(repo):
+    make_expenses(repo)
+    assert repo.get_all({'comment': 'missing'}) == []
+    assert repo.get_all({'amount': 'string'}) == []
+    assert repo.get_all({'expense_date': '2023-03-01 12:30:00'}) == []
+    with pytest.raises(AttributeError):
+        repo.get_all({'missing': 1})
+
+
+def test_delete_reuses_slots(repo):
+    objects = make_expenses(repo)
+    repo.delete(objects[1].pk)
+    repo.delete(objects[3].pk)
+    assert repo.get_all({'category': 1}) == []
+    new = Expense(1000, 1)
+    repo.add(new)
+    assert new.pk == objects[-1].pk + 1
+    assert len(repo._pks) == len(objects)
+    assert repo.get_all() == [objects[0], objects[2], objects[4], new]
+
+
+def test_nullable_and_date_fields():
+    @dataclass
+    class Custom:
+        name: str | None = None
+        parent: int | None = None
+        day: date = date(2023, 1, 1)
+        ratio: float = 0.5
+        pk: int = 0
+
+    repo = ColumnarMemoryRepository(Custom)
+    objects = [Custom(), Custom('a', 1, date(2024, 2, 29), 1.5)]
+    for o in objects:
+        repo.add(o)
+    assert repo.get_all() == objects
+    assert repo.get_all({'parent': None}) == [objects[0]]
+    assert repo.get_all({'name': None}) == [objects[0]]
+    assert repo.get_all({'ratio': 1.5}) == [objects[1]]
+
+
+def test_unsupported_field_type():
+    @dataclass
+    class Custom:
+        data: list
+        pk: int = 0
+
+    with pytest.raises(TypeError):
+        ColumnarMemoryRepository(Custom)
+
+
+def test_category_model():
+    repo = ColumnarMemoryRepository(Category)
+    root = Category('root')
+    repo.add(root)
+    child = Category('child', root.pk)
+    repo.add(child)
+    assert child.get_parent(repo) == root
+    assert [c.name for c in root.get_subcategories(repo)] == ['child']
+
+
+def test_raw_rows(repo):
+    objects = make_expenses(repo)
+    repo.delete(objects[0].pk)
+    stamp = repo.encode_value('expense_date', datetime(2023, 3, 3, 12, 30))
+    rows = list(repo.raw_rows('pk', 'amount', 'expense_date'))
+    assert sorted(rows)[1] == (objects[2].pk, 20, stamp)
+    assert len(rows) == 4
+
+
+def test_get_all_between(repo):
+    objects = make_expenses(repo)
+    assert repo.get_all({'expense_date': Between(datetime(2023, 3, 2),
+                                                 datetime(2023, 3, 4))}) == objects[1:3]
+    assert repo.get_all({'amount': Between(20), 'category': 0}) == objects[2::2]
+    assert repo.get_all({'comment': Between('comment 1')}) == [
+        o for o in objects if o.comment >= 'comment 1']
+    assert repo.get_all({'pk': Between(None, 3)}) == objects[:2]
+
+
+def test_between_bound_types(repo):
+    objects = make_expenses(repo)
+    assert repo.get_all({'expense_date': Between(date(2023, 3, 2),
+                                                 '2023-03-04')}) == objects[1:3]
+    assert repo.get_all({'amount': Between(15.5, 30)}) == objects[2:3]
+    budgets = ColumnarMemoryRepository(Budget)
+    budgets.add_many([Budget(100, 1, 7, date(2023, 3, day)) for day in (1, 2, 3)])
+    assert [b.pk for b in budgets.get_all({'start_date': Between(
+        datetime(2023, 3, 1, 12), datetime(2023, 3, 3))})] == [2]
+    with pytest.raises(ValueError):
+        repo.get_all({'expense_date': Between(1)})
+    with pytest.raises(ValueError):
+        repo.get_all({'comment': Between(1)})
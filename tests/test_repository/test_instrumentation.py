@@ -0,0 +1,84 @@
+import logging
+from dataclasses import dataclass
+
+import pytest
+
+from bookkeeper.repository.instrumentation import (BUCKETS, MethodStats,
+                                                   RepositoryStats, instrument,
+                                                   uninstrument)
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, shared_connection
+
+
+@dataclass
+class Custom:
+    name: str = 'test'
+    pk: int = 0
+
+
+@pytest.fixture
+def sqlite_repo(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), Custom)
+    repo.create_table()
+    return repo
+
+
+def test_method_stats():
+    stats = MethodStats()
+    stats.record(0.002, 3)
+    stats.record(0.5, 0)
+    assert stats.calls == 2
+    assert stats.rows == 3
+    assert stats.max == 0.5
+    assert stats.mean == pytest.approx(0.251)
+    assert sum(stats.histogram) == 2
+    assert stats.histogram[BUCKETS.index(1e-2)] == 1
+
+
+def test_counts_calls():
+    stats = RepositoryStats()
+    repo = instrument(MemoryRepository(), stats, 'memory')
+    for _ in range(3):
+        repo.add(Custom())
+    repo.get(1)
+    repo.get(100)
+    assert len(repo.get_all()) == 3
+    with pytest.raises(KeyError):
+        repo.delete(100)
+    data = stats.as_dict()
+    assert data['memory.add']['calls'] == 3
+    assert data['memory.get']['calls'] == 2
+    assert data['memory.get']['rows'] == 1
+    assert data['memory.get_all']['rows'] == 3
+    assert data['memory.delete']['calls'] == 1
+    assert 'memory.get_all' in stats.report()
+
+
+def test_uninstrument():
+    stats = RepositoryStats()
+    repo = MemoryRepository()
+    instrument(repo, stats)
+    instrument(repo, stats)
+    repo.add(Custom())
+    uninstrument(repo)
+    repo.add(Custom())
+    assert stats.as_dict()['MemoryRepository.add']['calls'] == 1
+
+
+def test_sql_and_slow_log(sqlite_repo, caplog):
+    stats = RepositoryStats(slow_threshold=0)
+    instrument(sqlite_repo, stats)
+    with caplog.at_level(logging.WARNING, 'bookkeeper.repository.slow'):
+        sqlite_repo.add(Custom())
+        sqlite_repo.get_all()
+    assert [c.method for c in stats.slow_calls] == ['add', 'get_all']
+    assert any('INSERT INTO custom' in sql for sql in stats.slow_calls[0].sql)
+    assert stats.slow_calls[1].sql == ('SELECT * FROM custom',)
+    assert 'SQLiteRepository[custom].get_all' in caplog.text
+    # вложенная трассировка продолжается после инструментированного вызова
+    with sqlite_repo.trace_sql() as trace:
+        sqlite_repo.get_all()
+        shared_connection(sqlite_repo.db_file).execute('SELECT 2')
+    assert trace == ['SELECT * FROM custom', 'SELECT 2']
+    stats.reset()
+    assert stats.as_dict() == {}
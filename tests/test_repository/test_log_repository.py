@@ -0,0 +1,132 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.log_repository import LogRepository
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'expenses.log')
+
+
+@pytest.fixture
+def repo(path):
+    repo = LogRepository(path, Expense)
+    yield repo
+    repo.close()
+
+
+def test_crud(repo):
+    obj = Expense(100, 1, datetime(2023, 1, 1), datetime(2023, 1, 2), 'хлеб')
+    pk = repo.add(obj)
+    assert obj.pk == pk == 1
+    assert repo.get(pk) == obj
+    obj.amount = 200
+    assert repo.get(pk).amount == 100
+    repo.update(obj)
+    assert repo.get(pk) == obj
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+    with pytest.raises(KeyError):
+        repo.update(obj)
+
+
+def test_cannot_add_with_pk(repo):
+    with pytest.raises(ValueError):
+        repo.add(Expense(1, 1, pk=1))
+    with pytest.raises(ValueError):
+        repo.update(Expense(1, 1))
+
+
+def test_get_all(repo):
+    objects = [Expense(i, i % 2) for i in range(5)]
+    assert repo.add_many(objects) == [1, 2, 3, 4, 5]
+    repo.delete(2)
+    assert repo.get_all() == [objects[0], *objects[2:]]
+    assert repo.get_all({'category': 0}) == [objects[0], objects[2], objects[4]]
+
+
+def test_reopen(path):
+    repo = LogRepository(path, Category, checkpoint_every=3)
+    repo.add_many([Category('продукты'), Category('мясо', 1), Category('книги')])
+    repo.update(Category('рыба', 1, pk=2))
+    repo.delete(3)
+    # процесс завершился без close: после контрольной точки - 2 записи
+    reopened = LogRepository(path, Category)
+    assert reopened.replayed == 2
+    assert reopened.get_all() == [Category('продукты', pk=1), Category('рыба', 1, pk=2)]
+    assert reopened.add(Category('одежда')) == 4
+    reopened.close()
+    assert LogRepository(path, Category).replayed == 0
+
+
+def test_torn_tail(path):
+    repo = LogRepository(path, Category)
+    repo.add_many([Category('продукты'), Category('мясо', 1)])
+    size = os.path.getsize(path)
+    with open(path, 'r+b') as file:
+        file.truncate(size - 3)
+    reopened = LogRepository(path, Category)
+    assert reopened.get_all() == [Category('продукты', pk=1)]
+    assert os.path.getsize(path) < size - 3
+    assert reopened.add(Category('книги')) == 2
+
+
+def test_not_a_log(path):
+    with open(path, 'wb') as file:
+        file.write(b'abc')
+    with pytest.raises(ValueError):
+        LogRepository(path, Category)
+
+
+def test_compact(path):
+    repo = LogRepository(path, Category, compact_ratio=None)
+    cats = [Category(str(i)) for i in range(100)]
+    repo.add_many(cats)
+    for cat in cats[:50]:
+        repo.delete(cat.pk)
+    for cat in cats[50:]:
+        cat.name += '!'
+        repo.update(cat)
+    size = os.path.getsize(path)
+    repo.compact()
+    assert os.path.getsize(path) < size / 3
+    assert repo.get_all() == cats[50:]
+    assert repo.add(Category('новая')) == 101
+    repo.close()
+    reopened = LogRepository(path, Category)
+    assert reopened.replayed == 0
+    assert reopened.get_all()[-1] == Category('новая', pk=101)
+    os.remove(reopened.checkpoint_path)
+    assert LogRepository(path, Category).get_all() == reopened.get_all()
+
+
+def test_background_compaction(path):
+    repo = LogRepository(path, Category)
+    cat = Category('x' * 1000)
+    repo.add(cat)
+    for i in range(2000):
+        cat.name = str(i) * 500
+        repo.update(cat)
+    repo.close()
+    assert repo.generation > 0
+    assert os.path.getsize(path) < 1 << 20
+    assert LogRepository(path, Category).get(1) == cat
+
+
+def test_without_pread(path, monkeypatch):
+    # в Windows нет os.pread
+    monkeypatch.delattr(os, 'pread', raising=False)
+    repo = LogRepository(path, Category, compact_ratio=None)
+    repo.add_many([Category(str(i)) for i in range(10)])
+    repo.delete(1)
+    repo.compact()
+    assert [cat.name for cat in repo.get_all()] == [str(i) for i in range(1, 10)]
+    repo.close()
+    assert LogRepository(path, Category).get(10) == Category('9', pk=10)
@@ -1,3 +1,8 @@
+from datetime import datetime
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.recurring import RecurringExpense
 from bookkeeper.repository.memory_repository import MemoryRepository
 
 import pytest
@@ -69,3 +74,75 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_column_index():
+    repo = MemoryRepository()
+    repo.add_many([Expense(k, k % 3) for k in range(9)])
+    repo.ensure_column_index('category')
+    repo.add(Expense(100, 1))
+    changed = repo.get(2)
+    changed.category = 2
+    repo.update(changed)
+    repo.delete(5)
+    assert [exp.pk for exp in repo.get_all({'category': 1})] == [8, 10]
+    assert [exp.pk for exp in repo.get_all({'category': 2, 'amount': 5})] == [6]
+    assert repo.get_all({'category': 7}) == []
+
+
+def test_snapshot(tmp_path):
+    path = str(tmp_path / 'expenses.snap')
+    repo = MemoryRepository()
+    objects = [Expense(100, 1, datetime(2023, 1, 1), datetime(2023, 1, 2), 'хлеб'),
+               Expense(250, 2, datetime(2023, 2, 1, 12, 30), comment=''),
+               Expense(7, 1, comment='хлеб')]
+    repo.add_many(objects)
+    repo.delete(2)
+    assert repo.save_snapshot(path, Expense) == 2
+    loaded = MemoryRepository.load_snapshot(path, Expense)
+    assert loaded.get_all() == [objects[0], objects[2]]
+    assert loaded.get(2) is None
+    assert loaded.get(1) is loaded.get(1)
+    assert loaded.add(Expense(1, 1)) == 4
+    assert loaded.get_all({'comment': 'хлеб'}) == [objects[0], objects[2]]
+
+
+def test_snapshot_several_strings(tmp_path):
+    path = str(tmp_path / 'recurring.snap')
+    repo = MemoryRepository()
+    objects = [RecurringExpense(500, 1, datetime(2023, 1, 1), unit='week',
+                                comment='rent'),
+               RecurringExpense(5, 2, datetime(2023, 1, 2), unit='day', comment='coffee',
+                                end_date=datetime(2023, 6, 1))]
+    repo.add_many(objects)
+    repo.save_snapshot(path, RecurringExpense)
+    loaded = MemoryRepository.load_snapshot(path, RecurringExpense)
+    assert loaded.get_all() == objects
+
+
+def test_snapshot_changes(tmp_path):
+    path = str(tmp_path / 'categories.snap')
+    repo = MemoryRepository()
+    repo.add_many([Category('продукты'), Category('мясо', 1)])
+    repo.save_snapshot(path, Category)
+    loaded = MemoryRepository.load_snapshot(path, Category)
+    loaded.update(Category('рыба', 1, pk=2))
+    loaded.delete(1)
+    with pytest.raises(KeyError):
+        loaded.delete(1)
+    pk = loaded.add(Category('книги'))
+    assert [c.name for c in loaded.get_all()] == ['рыба', 'книги']
+    loaded.save_snapshot(path, Category)
+    reloaded = MemoryRepository.load_snapshot(path, Category)
+    assert reloaded.get_all() == [Category('рыба', 1, pk=2), Category('книги', pk=pk)]
+    assert reloaded.add(Category('одежда')) == pk + 1
+
+
+def test_snapshot_wrong_model(tmp_path):
+    path = str(tmp_path / 'categories.snap')
+    MemoryRepository().save_snapshot(path, Category)
+    with pytest.raises(ValueError):
+        MemoryRepository.load_snapshot(path, Expense)
+    (tmp_path / 'bad.snap').write_bytes(b'0' * 64)
+    with pytest.raises(ValueError):
+        MemoryRepository.load_snapshot(str(tmp_path / 'bad.snap'), Category)
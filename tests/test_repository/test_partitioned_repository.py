@@ -0,0 +1,132 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.budgeting.evaluation import category_totals
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import Between
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture(params=[False, True])
+def repo(request, tmp_path):
+    repo = PartitionedSQLiteRepository(str(tmp_path / 'test.db'), Expense,
+                                       epoch_seconds=request.param)
+    repo.create_table()
+    return repo
+
+
+def pks(objects):
+    return [obj.pk for obj in objects]
+
+
+def make_expenses(repo):
+    objects = [Expense(100 * (i + 1), i % 2, expense_date=datetime(2023, month, 10),
+                       added_date=datetime(2023, month, 10))
+               for i, month in enumerate([1, 1, 2, 3, 3])]
+    repo.add_many(objects)
+    return objects
+
+
+def test_crud(repo):
+    assert repo.get_all() == []
+    moment = datetime(2023, 3, 10)
+    obj = Expense(100, 1, expense_date=moment, added_date=moment)
+    pk = repo.add(obj)
+    assert repo.partitions() == ['expense_2023_03']
+    assert repo.get(pk).amount == 100
+    obj.amount = 200
+    repo.update(obj)
+    assert repo.get(pk).amount == 200
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+    with pytest.raises(ValueError):
+        repo.add(obj)
+
+
+def test_partitions_and_routing(repo):
+    objects = make_expenses(repo)
+    assert [o.pk for o in objects] == [1, 2, 3, 4, 5]
+    assert repo.partitions() == ['expense_2023_01', 'expense_2023_02', 'expense_2023_03']
+    assert repo.partitions_for(date(2023, 2, 15)) == ['expense_2023_02',
+                                                      'expense_2023_03']
+    assert repo.partitions_for(None, date(2023, 2, 1)) == ['expense_2023_01']
+    assert pks(repo.get_all()) == pks(objects)
+    assert pks(repo.get_all({'category': 0})) == [1, 3, 5]
+    recent = repo.get_all({'expense_date': Between(datetime(2023, 2, 1))})
+    assert pks(recent) == [3, 4, 5]
+    assert pks(repo.get_all({'expense_date': datetime(2023, 1, 10),
+                             'category': 1})) == [2]
+    assert repo.get_all({'expense_date': datetime(2022, 1, 10)}) == []
+    assert repo.execute('SELECT COUNT(*) FROM expense') == [(5,)]
+
+
+def test_update_moves_partition(repo):
+    objects = make_expenses(repo)
+    objects[0].expense_date = datetime(2023, 4, 1)
+    repo.update(objects[0])
+    assert str(repo.get(objects[0].pk).expense_date) == '2023-04-01 00:00:00'
+    assert pks(repo.get_all({'expense_date': Between(datetime(2023, 4, 1))})) == [1]
+    assert pks(repo.get_all()) == pks(objects)
+    assert repo.add(Expense(1, 1, expense_date=datetime(2023, 1, 1))) == 6
+
+
+def test_current_month_reads_one_partition(repo):
+    make_expenses(repo)
+    with repo.trace_sql() as trace:
+        repo.get_all({'expense_date': Between(datetime(2023, 3, 1))})
+    selects = [sql for sql in trace if sql.startswith('SELECT *')]
+    assert len(selects) == 1
+    assert 'expense_2023_03' in selects[0] and 'expense_2023_01' not in selects[0]
+    assert repo.source(date(2023, 3, 1), date(2023, 3, 31)) == 'expense_2023_03'
+
+
+def test_category_totals(repo):
+    make_expenses(repo)
+    assert category_totals(repo, [date(2023, 1, 1), date(2023, 3, 1)],
+                           date(2023, 4, 1)) == {0: [900, 500], 1: [600, 400]}
+
+
+def test_partition_table(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    plain = SQLiteRepository(db_file, Expense, table_name='old')
+    plain.create_table()
+    objects = make_expenses(plain)
+    plain.delete(objects.pop(1).pk)
+    repo = PartitionedSQLiteRepository(db_file, Expense, period='year')
+    assert repo.partition_table('old') == 4
+    assert repo.partitions() == ['expense_2023']
+    assert pks(repo.get_all()) == pks(objects)
+    assert repo.get(objects[-1].pk).amount == objects[-1].amount
+    assert repo.add(Expense(1, 1, expense_date=datetime(2022, 5, 1))) == 6
+    assert repo.partitions() == ['expense_2022', 'expense_2023']
+
+
+def test_get_page(repo):
+    make_expenses(repo)
+    assert pks(repo.get_page(2)) == [5, 4]
+    assert pks(repo.get_page(3, before=4)) == [3, 2, 1]
+    assert repo.get_page(2, before=1) == []
+
+
+def test_migrate_to_epoch(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    repo = PartitionedSQLiteRepository(db_file, Expense)
+    repo.create_table()
+    assert not repo.epoch_seconds
+    objects = make_expenses(repo)
+    repo.ensure_index('amount_idx', 'amount')
+    assert repo.migrate_to_epoch() == 5
+    assert repo.get_all() == objects
+    migrated = PartitionedSQLiteRepository(db_file, Expense)
+    assert migrated.epoch_seconds
+    assert pks(migrated.get_all({'expense_date': Between(date(2023, 3, 1))})) == [4, 5]
+    indexes = {name for name, in repo.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'expense_2023_01_amount_idx', 'expense_2023_03_added_date_idx',
+            'expense_2023_02_expense_date_idx'} <= indexes
+    assert repo.execute('SELECT COUNT(*) FROM expense') == [(5,)]
+    assert repo.add(Expense(1, 1, expense_date=datetime(2023, 3, 1))) == 6
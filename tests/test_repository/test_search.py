@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import Between
+from bookkeeper.repository.partitioned_repository import PartitionedSQLiteRepository
+from bookkeeper.repository.search import create_search_index, match_query, search
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@pytest.fixture(params=['sqlite', 'sqlite-epoch', 'partitioned'])
+def repo(request, tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    if request.param == 'partitioned':
+        repo = PartitionedSQLiteRepository(db_file, Expense)
+    else:
+        repo = SQLiteRepository(db_file, Expense,
+                                epoch_seconds=request.param == 'sqlite-epoch')
+    repo.create_table()
+    return repo
+
+
+def pks(objects):
+    return [obj.pk for obj in objects]
+
+
+def make_expenses(repo):
+    comments = ['Молоко и хлеб', 'молочный коктейль', 'хлеб', 'Новый год: подарки',
+                'год новый', '']
+    objects = [Expense(100, i % 2, expense_date=datetime(2023, i + 1, 1), comment=c)
+               for i, c in enumerate(comments)]
+    repo.add_many(objects)
+    return objects
+
+
+def test_match_query():
+    assert match_query('молоко хлеб') == '"молоко" "хлеб"'
+    assert match_query('мол* "новый год"') == '"мол"* "новый год"'
+    assert match_query('a OR b: "c') == '"a" "OR" "b:" "c"'
+    assert match_query(' * "" ') == ''
+
+
+def test_search(repo):
+    make_expenses(repo)
+    create_search_index(repo)
+    assert pks(search(repo, 'хлеб')) == [3, 1]
+    assert pks(search(repo, 'МОЛОКО')) == [1]
+    assert sorted(pks(search(repo, 'мол*'))) == [1, 2]
+    assert pks(search(repo, '"новый год"')) == [4]
+    assert sorted(pks(search(repo, 'новый год'))) == [4, 5]
+    assert search(repo, 'мясо') == []
+    assert search(repo, '') == []
+    assert pks(search(repo, 'хлеб', limit=1)) == [3]
+    assert pks(search(repo, 'мол*', {'category': 1})) == [2]
+    may = Between(datetime(2023, 5, 1))
+    assert pks(search(repo, 'год', {'expense_date': may})) == [5]
+
+
+def test_index_follows_changes(repo):
+    objects = make_expenses(repo)
+    create_search_index(repo)
+    pk = repo.add(Expense(1, 1, comment='свежий хлеб'))
+    assert pk in pks(search(repo, 'хлеб'))
+    objects[0].comment = 'сыр'
+    repo.update(objects[0])
+    assert pks(search(repo, 'сыр')) == [1]
+    assert 1 not in pks(search(repo, 'хлеб'))
+    repo.delete(3)
+    assert pks(search(repo, 'хлеб')) == [pk]
+    create_search_index(repo)
+    assert pks(search(repo, 'хлеб')) == [pk]
+
+
+def test_partitioned(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    repo = PartitionedSQLiteRepository(db_file, Expense)
+    repo.create_table()
+    create_search_index(repo)
+    objects = make_expenses(repo)
+    # секции созданы после индекса, в том числе другим репозиторием
+    other = PartitionedSQLiteRepository(db_file, Expense)
+    pk = other.add(Expense(1, 1, datetime(2024, 1, 1), comment='хлеб'))
+    assert sorted(pks(search(repo, 'хлеб'))) == [1, 3, pk]
+    objects[0].expense_date = datetime(2022, 1, 1)
+    objects[0].comment = 'сыр'
+    repo.update(objects[0])
+    assert pks(search(repo, 'сыр')) == [1]
+    assert repo.migrate_to_epoch() == 7
+    repo.delete(3)
+    assert pks(search(repo, 'хлеб')) == [pk]
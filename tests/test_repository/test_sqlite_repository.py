@@ -1,5 +1,9 @@
 import datetime
+import subprocess
+import sys
+from contextlib import ExitStack
 
+from bookkeeper.repository.abstract_repository import Between
 from bookkeeper.repository.sqlite_repository import SQLiteRepository  # CustomClass
 from dataclasses import dataclass
 import pytest
@@ -86,3 +90,196 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'test_float': 1.4352}) == [objects[0]]
     assert repo.get_all({'name': 'bruhhh'}) == objects
+
+
+def test_create_table_and_query(tmp_path, custom_class):
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), custom_class)
+    repo.create_table()
+    repo.create_table()
+    objects = [custom_class(name=str(i)) for i in range(3)]
+    for o in objects:
+        repo.add(o)
+    assert repo.get_all() == objects
+    repo.ensure_index('custom_name_idx', 'name')
+    assert repo.query('SELECT * FROM custom WHERE name > ? ORDER BY pk', ('0',)) \
+        == objects[1:]
+
+
+def test_custom_table_name(tmp_path, custom_class):
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), custom_class, 'other')
+    repo.create_table()
+    obj = custom_class()
+    repo.add(obj)
+    assert repo.get(obj.pk) == obj
+
+
+@pytest.fixture
+def traced_repo(tmp_path, custom_class):
+    with ExitStack() as stack:
+        def make(**kwargs):
+            repo = SQLiteRepository(str(tmp_path / 'test.db'), custom_class, **kwargs)
+            repo.create_table()
+            repo.traced = stack.enter_context(repo.trace_sql())
+            return repo
+        yield make
+
+
+def updates(repo):
+    return [sql for sql in repo.traced if sql.startswith('UPDATE')]
+
+
+def test_update_single_statement(traced_repo, custom_class):
+    repo = traced_repo()
+    obj = custom_class()
+    repo.add(obj)
+    obj.name = "it's"
+    repo.update(obj)
+    assert updates(repo) == [
+        "UPDATE custom SET name = 'it''s', date = '2023-03-10 00:00:00', "
+        "test_float = 1.2345 WHERE pk = 1"]
+    assert repo.get(obj.pk) == obj
+
+
+def test_update_tracks_changes(traced_repo, custom_class):
+    repo = traced_repo(track_changes=True)
+    obj = custom_class()
+    repo.add(obj)
+    loaded = repo.get(obj.pk)
+    repo.update(loaded)
+    assert updates(repo) == []
+    loaded.test_float = 2.5
+    repo.update(loaded)
+    assert updates(repo) == ['UPDATE custom SET test_float = 2.5 WHERE pk = 1']
+    assert repo.get(obj.pk).test_float == 2.5
+
+
+def test_tracked_values_belong_to_object(traced_repo, custom_class):
+    repo = traced_repo(track_changes=True)
+    repo.add(custom_class())
+    loaded = repo.get(1)
+    SQLiteRepository(repo.db_file, custom_class).update(custom_class(name='other', pk=1))
+    repo.update(custom_class(pk=1))
+    assert repo.get(1).name == 'bebra'
+    repo.traced.clear()
+    repo.update(loaded)
+    assert updates(repo) == []
+    del loaded
+    repo.get_all()
+    assert not repo._loaded
+
+
+def test_update_many(traced_repo, custom_class):
+    repo = traced_repo()
+    objects = [custom_class(name=str(i)) for i in range(3)]
+    for o in objects:
+        repo.add(o)
+    for o in objects:
+        o.name += '!'
+    repo.traced.clear()
+    repo.update_many(objects)
+    assert repo.get_all() == objects
+    assert repo.traced.count('COMMIT') == 1
+    with pytest.raises(ValueError):
+        repo.update_many([objects[0], custom_class(name='new')])
+
+
+def test_statements_shared(tmp_path, custom_class):
+    db_file = str(tmp_path / 'test.db')
+    repo1 = SQLiteRepository(db_file, custom_class)
+    repo2 = SQLiteRepository(db_file, custom_class)
+    assert repo1.statements is repo2.statements
+    assert repo1._connect() is repo2._connect()
+    assert repo1.statements.select == 'SELECT * FROM custom WHERE pk = ?'
+    assert repo1.statements.insert == \
+        'INSERT INTO custom (name, date, test_float) VALUES (?, ?, ?)'
+
+
+def test_get_all_where_in_sql(traced_repo, custom_class):
+    repo = traced_repo()
+    objects = [custom_class(name=name) for name in ('a', 'b', 'a')]
+    for obj in objects:
+        repo.add(obj)
+    repo.traced.clear()
+    assert repo.get_all({'name': 'a', 'test_float': 1.2345}) == objects[::2]
+    assert repo.traced == [
+        "SELECT * FROM custom WHERE name = 'a' AND test_float = 1.2345"]
+    assert repo.get_all({'name': None}) == []
+    with pytest.raises(AttributeError):
+        repo.get_all({'unknown': 1})
+
+
+@dataclass
+class Event:
+    name: str = ''
+    moment: datetime.datetime | None = None
+    pk: int = 0
+
+
+def test_epoch_seconds(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), Event, epoch_seconds=True)
+    repo.create_table()
+    moment = datetime.datetime(2023, 3, 10, 12, 30)
+    obj = Event('a', moment)
+    repo.add(obj)
+    repo.add(Event('b'))
+    assert repo.execute('SELECT moment FROM event ORDER BY pk') == [
+        (1678451400,), (None,)]
+    assert repo.get(obj.pk) == obj
+    assert repo.get_all({'moment': '2023-03-10 12:30:00'}) == [obj]
+    obj.moment += datetime.timedelta(days=1)
+    repo.update(obj)
+    assert repo.get(obj.pk).moment == datetime.datetime(2023, 3, 11, 12, 30)
+    assert SQLiteRepository(repo.db_file, Event).epoch_seconds
+    plan = repo.execute('EXPLAIN QUERY PLAN SELECT * FROM event WHERE moment < ?',
+                        (repo.encode_value('moment', moment),))
+    assert 'event_moment_idx' in str(plan)
+
+
+def test_migrate_to_epoch(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), Event)
+    repo.create_table()
+    assert not repo.epoch_seconds
+    objects = [Event('a', datetime.datetime(2023, 3, 10, 12, 30)), Event('b'),
+               Event('c', datetime.datetime(1969, 12, 31, 23))]
+    for obj in objects:
+        repo.add(obj)
+    repo.delete(repo.add(Event('d')))
+    repo.ensure_index('event_name_idx', 'name')
+    assert repo.migrate_to_epoch() == 3
+    assert repo.get_all() == objects
+    migrated = SQLiteRepository(repo.db_file, Event)
+    assert migrated.epoch_seconds
+    assert migrated.get_all() == objects
+    indexes = {name for name, in repo.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'event_name_idx', 'event_moment_idx'} <= indexes
+    assert repo.add(Event('e')) == 5
+
+
+def test_get_all_between(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), Event, epoch_seconds=True)
+    repo.create_table()
+    objects = [Event(str(i), datetime.datetime(2023, 3, i + 1)) for i in range(4)]
+    assert repo.add_many(objects + [Event('x')]) == [1, 2, 3, 4, 5]
+    assert repo.get_all({'moment': Between(datetime.date(2023, 3, 2),
+                                           '2023-03-04')}) == objects[1:3]
+    assert repo.get_all({'moment': Between()}) == objects
+    assert repo.get_all({'name': Between('2'), 'moment': Between(None, '2023-03-04')}) \
+        == [objects[2]]
+
+
+def test_get_page(tmp_path, custom_class):
+    repo = SQLiteRepository(str(tmp_path / 'test.db'), custom_class)
+    repo.create_table()
+    repo.add_many(custom_class(name=str(i)) for i in range(5))
+    assert [o.pk for o in repo.get_page(2)] == [5, 4]
+    assert [o.pk for o in repo.get_page(2, before=4)] == [3, 2]
+    assert [o.pk for o in repo.get_page(10, before=2)] == [1]
+    assert repo.get_page(2, before=1) == []
+
+
+def test_import_without_fork():
+    # на Windows в модуле os нет register_at_fork
+    code = ('import os; del os.register_at_fork; '
+            'import bookkeeper.repository.sqlite_repository')
+    subprocess.run([sys.executable, '-c', code], check=True)
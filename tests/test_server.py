@@ -0,0 +1,211 @@
+import asyncio
+import json
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import Between
+from bookkeeper.server import HTTPError, Ledger, Service, decode, encode, parse_where
+
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = b'' if body is None else json.dumps(body).encode()
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\n'
+                 f'Content-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode()
+                 + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(payload)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = Ledger(str(tmp_path / 'test.db'), readers=2)
+    yield ledger
+    ledger.close()
+
+
+def serve(ledger, scenario):
+    """ Выполнить корутину scenario(port) при запущенном сервисе """
+    async def main():
+        server = await Service(ledger).start('127.0.0.1', 0)
+        async with server:
+            return await scenario(server.sockets[0].getsockname()[1])
+    return asyncio.run(main())
+
+
+def test_decode_encode():
+    exp = decode(Expense, {'amount': 100, 'category': 1,
+                           'expense_date': '2023-03-15 12:30:00', 'pk': 7})
+    assert exp.pk == 0 and exp.expense_date == datetime(2023, 3, 15, 12, 30)
+    assert encode(exp)['expense_date'] == '2023-03-15 12:30:00'
+    with pytest.raises(HTTPError):
+        decode(Expense, {'amount': 1, 'colour': 'red'})
+    with pytest.raises(HTTPError):
+        decode(Expense, [1, 2])
+
+
+def test_parse_where():
+    assert parse_where(Expense, {'category': '3', 'comment': 'null',
+                                 'amount': '10..'}) == {
+        'category': 3, 'comment': None, 'amount': Between(10, None)}
+    assert parse_where(Expense, {'expense_date': '2023-03-01..2023-04-01'}) == {
+        'expense_date': Between(datetime(2023, 3, 1), datetime(2023, 4, 1))}
+    with pytest.raises(HTTPError):
+        parse_where(Expense, {'colour': 'red'})
+
+
+def test_crud(ledger):
+    async def scenario(port):
+        status, body = await request(port, 'POST', '/categories', {'name': 'food'})
+        assert (status, body) == (201, {'pk': 1})
+        status, body = await request(port, 'POST', '/expenses', [
+            {'amount': 100, 'category': 1, 'expense_date': '2023-03-15'},
+            {'amount': 50, 'category': 1, 'comment': 'хлеб'}])
+        assert (status, body) == (201, {'pks': [1, 2]})
+        status, body = await request(port, 'GET', '/expenses/2')
+        assert status == 200 and body['comment'] == 'хлеб'
+        status, body = await request(port, 'PUT', '/expenses/1',
+                                     {'amount': 120, 'category': 1,
+                                      'expense_date': '2023-03-15'})
+        assert status == 200 and body['amount'] == 120
+        assert (await request(port, 'DELETE', '/categories/1'))[1] == {
+            'expenses': 2, 'categories': 0}
+        assert (await request(port, 'DELETE', '/expenses/2')) == (200, {})
+        return (await request(port, 'GET', '/expenses'))[1]
+
+    body = serve(ledger, scenario)
+    assert [(item['pk'], item['amount'], item['category'])
+            for item in body['items']] == [(1, 120, None)]
+    assert body['next'] is None
+
+
+def test_errors(ledger):
+    async def scenario(port):
+        return [await request(port, 'GET', '/expenses/1'),
+                await request(port, 'PUT', '/expenses/1', {'amount': 1, 'category': 1}),
+                await request(port, 'GET', '/nothing'),
+                await request(port, 'PATCH', '/expenses/1'),
+                await request(port, 'POST', '/expenses', {'colour': 'red'}),
+                await request(port, 'GET', '/expenses?limit=many'),
+                await request(port, 'GET', '/reports/spend')]
+
+    statuses = [status for status, _ in serve(ledger, scenario)]
+    assert statuses == [404, 404, 404, 405, 400, 400, 400]
+
+
+def test_pagination_and_filters(ledger):
+    ledger.repos['expenses'].add_many([Expense(k, k % 2, datetime(2023, 1, 1 + k))
+                                       for k in range(10)])
+
+    async def scenario(port):
+        pages, path = [], '/expenses?limit=4'
+        while path:
+            body = (await request(port, 'GET', path))[1]
+            pages.append([item['pk'] for item in body['items']])
+            path = body['next'] and f'/expenses?limit=4&before={body["next"]}'
+        odd = (await request(port, 'GET', '/expenses?category=1&limit=2&before=8'))[1]
+        dates = (await request(port, 'GET',
+                               '/expenses?expense_date=2023-01-03..2023-01-06'))[1]
+        return pages, odd, dates
+
+    pages, odd, dates = serve(ledger, scenario)
+    assert pages == [[10, 9, 8, 7], [6, 5, 4, 3], [2, 1]]
+    assert [item['pk'] for item in odd['items']] == [6, 4] and odd['next'] == 4
+    assert [item['amount'] for item in dates['items']] == [4, 3, 2]
+
+
+def test_concurrent_adds_share_commit(ledger):
+    async def scenario(port):
+        return await asyncio.gather(*(
+            request(port, 'POST', '/expenses', {'amount': k, 'category': 1})
+            for k in range(20)))
+
+    responses = serve(ledger, scenario)
+    assert sorted(body['pk'] for _, body in responses) == list(range(1, 21))
+    assert ledger.commits < 20
+    assert sorted(exp.amount for exp in ledger.repos['expenses'].get_all()) == list(
+        range(20))
+
+
+def test_failed_add_does_not_affect_others(ledger):
+    ledger.repos['expenses'].execute(
+        'CREATE TRIGGER fail BEFORE INSERT ON expense WHEN NEW.amount < 0 '
+        "BEGIN SELECT RAISE(ABORT, 'negative'); END")
+
+    async def scenario(port):
+        return await asyncio.gather(*(
+            request(port, 'POST', '/expenses', {'amount': amount, 'category': 1})
+            for amount in (1, -1, 2)))
+
+    statuses = sorted(status for status, _ in serve(ledger, scenario))
+    assert statuses == [201, 201, 500]
+    assert sorted(exp.amount for exp in ledger.repos['expenses'].get_all()) == [1, 2]
+
+
+def test_batch(ledger):
+    async def scenario(port):
+        return await request(port, 'POST', '/batch', [
+            {'method': 'POST', 'path': '/categories', 'body': {'name': 'food'}},
+            {'method': 'POST', 'path': '/expenses', 'body': {'amount': 5, 'category': 1}},
+            {'method': 'GET', 'path': '/expenses/1'},
+            {'method': 'GET', 'path': '/expenses/2'}])
+
+    status, body = serve(ledger, scenario)
+    assert status == 200
+    assert [item['status'] for item in body] == [201, 201, 200, 404]
+    assert body[2]['body']['amount'] == 5
+
+
+def test_reports(ledger):
+    ledger.repos['categories'].add_many([Category('food'), Category('meat', 1)])
+    ledger.repos['expenses'].add_many([Expense(100, 2, datetime(2023, 3, 15)),
+                                       Expense(30, 1, datetime(2023, 4, 2))])
+
+    async def scenario(port):
+        spend = await request(port, 'GET',
+                              '/reports/spend?start=2023-03-01&end=2023-05-01')
+        await request(port, 'POST', '/budgets',
+                      {'amount': 120, 'category': 1, 'length': 30,
+                       'start_date': '2023-01-01'})
+        return spend, await request(port, 'GET', '/budgets/status?day=2023-03-20')
+
+    (_, spend), (_, status) = serve(ledger, scenario)
+    assert spend == {'2023-03-01': {'0': 100, '1': 100, '2': 100},
+                     '2023-04-01': {'0': 30, '1': 30}}
+    assert [(item['category'], item['start'], item['spent'], item['exceeded'])
+            for item in status] == [(1, date(2023, 3, 1).isoformat(), 100, False)]
+
+
+def test_decode_rejects_wrong_types():
+    for data in ({'amount': '1', 'category': 1, 'expense_date': {'x': 1}},
+                 {'amount': True, 'category': 1},
+                 {'amount': 1, 'category': 1, 'comment': 5}):
+        with pytest.raises(HTTPError):
+            decode(Expense, data)
+    assert decode(Expense, {'amount': 1, 'category': None}).category is None
+
+
+def test_unexpected_error_resolves_batch(ledger, monkeypatch):
+    def fail(*args):
+        raise AttributeError('broken')
+    monkeypatch.setattr(ledger.repos['expenses'], '_add', fail)
+    monkeypatch.setattr(ledger.repos['expenses'], 'add_many', fail)
+
+    async def scenario(port):
+        return await asyncio.wait_for(asyncio.gather(
+            request(port, 'POST', '/expenses', {'amount': 1, 'category': 1}),
+            request(port, 'POST', '/categories', {'name': 'food'}),
+            request(port, 'POST', '/expenses',
+                    {'amount': 1, 'category': 1, 'expense_date': {'x': 1}})), 10)
+
+    statuses = [status for status, _ in serve(ledger, scenario)]
+    assert statuses == [500, 201, 400]
+    monkeypatch.setattr(ledger, '_add_batch', fail)
+    assert serve(ledger, lambda port: asyncio.wait_for(request(
+        port, 'POST', '/categories', {'name': 'food'}), 10))[0] == 500
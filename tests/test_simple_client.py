@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.simple_client import Client, main
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    cat_repo = SQLiteRepository(db_file, Category)
+    cat_repo.create_table()
+    SQLiteRepository(db_file, Expense).create_table()
+    Category.create_from_tree([('продукты', None), ('мясо', 'продукты')], cat_repo)
+    return db_file
+
+
+def test_batch(db_file):
+    client = Client(db_file, batch_size=2)
+    errors = io.StringIO()
+    lines = ['# комментарий\n', '100 мясо\n', '\n', '20 Продукты\n', '5 рыба\n',
+             '7 мясо\n', 'abc\n', '10\n']
+    assert client.run_batch(lines, errors) == 3
+    assert errors.getvalue().splitlines() == [
+        '5: категория рыба не найдена', '7: неизвестная команда: abc',
+        '8: ожидается "<сумма> <категория>": 10']
+    assert client.commands == 6
+    assert client.added == 3
+    expenses = client.exp_repo.get_all()
+    assert [(e.amount, e.category) for e in expenses] == [(100, 2), (20, 1), (7, 2)]
+
+
+def test_read_commands_see_pending(db_file):
+    out = io.StringIO()
+    client = Client(db_file, batch_size=100, out=out)
+    client.run_batch(['100 мясо', 'expenses'])
+    assert 'amount=100' in out.getvalue()
+
+
+def test_interactive_mode_adds_immediately(db_file):
+    out = io.StringIO()
+    client = Client(db_file, out=out)
+    client.execute('100 мясо')
+    assert client.exp_repo.get_all()[0].amount == 100
+    assert 'amount=100' in out.getvalue()
+
+
+def test_main(db_file, tmp_path, capsys):
+    commands = tmp_path / 'commands.txt'
+    commands.write_text('1 мясо\n' * 10, encoding='utf-8')
+    assert main(['--db', db_file, '--batch-size', '3', str(commands)]) == 0
+    assert '10 commands (10 expenses added, 0 errors)' in capsys.readouterr().err
+    commands.write_text('1 рыба\n', encoding='utf-8')
+    assert main(['--db', db_file, str(commands)]) == 1
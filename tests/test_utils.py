@@ -1,9 +1,11 @@
 import tempfile
+from datetime import date, datetime
 from textwrap import dedent
 
 import pytest
 
-from bookkeeper.utils import read_tree
+from bookkeeper.utils import (read_tree, to_timestamp, from_timestamp, as_date,
+                              as_datetime, to_epoch_seconds, from_epoch_seconds)
 
 
 def test_create_tree():
@@ -71,3 +73,35 @@ def test_with_file():
             ('child2', 'parent1'),
             ('parent2', None)
         ]
+
+
+def test_timestamp_roundtrip():
+    value = datetime(2023, 3, 12, 17, 6, 0, 123456)
+    assert from_timestamp(to_timestamp(value)) == value
+    assert to_timestamp(datetime(1970, 1, 2)) == 86400 * 10 ** 6
+    assert to_timestamp(datetime(1969, 12, 31)) < 0
+
+
+def test_epoch_seconds():
+    value = datetime(2023, 3, 12, 17, 6, 5)
+    assert from_epoch_seconds(to_epoch_seconds(value)) == value
+    assert to_epoch_seconds(datetime(1970, 1, 2, 0, 0, 1, 999999)) == 86401
+    assert to_epoch_seconds(date(1970, 1, 2)) == 86400
+    assert to_epoch_seconds('2023-03-12 17:06:05') == to_epoch_seconds(value)
+
+
+def test_as_date():
+    assert as_date(None) is None
+    assert as_date(date(2023, 3, 6)) == date(2023, 3, 6)
+    assert as_date(datetime(2023, 3, 6, 12)) == date(2023, 3, 6)
+    assert as_date('2023-03-06') == date(2023, 3, 6)
+    assert as_date('2023-03-06 00:00:00') == date(2023, 3, 6)
+
+
+def test_as_datetime():
+    moment = datetime(2023, 3, 15, 10, 30, 5)
+    assert as_datetime(moment) is moment
+    assert as_datetime(date(2023, 3, 15)) == datetime(2023, 3, 15)
+    assert as_datetime('2023-03-15 10:30:05') == moment
+    assert as_datetime('2023-03-15 10:30:05.250000') == moment.replace(microsecond=250000)
+    assert as_datetime(None) is None